@@ -1,8 +1,33 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context, send_file, send_from_directory, url_for, g, has_app_context, has_request_context
+from markupsafe import Markup, escape
 from flask_sqlalchemy import SQLAlchemy
-from datetime import date, datetime, time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram,
+                               CONTENT_TYPE_LATEST, REGISTRY, generate_latest, multiprocess)
+import psycopg
+from datetime import date, datetime, time, timedelta, timezone
 from decimal import Decimal
+import atexit
+import base64
+import csv
+import functools
+import random
+import re
+from collections import OrderedDict, deque
+import glob
+import hashlib
+import io
+import json
+import mimetypes
+import multiprocessing
+import queue
 import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import time as time_module
 
 # Inicialización de Flask
 app = Flask(__name__)
@@ -11,13 +36,17 @@ app.secret_key = os.environ.get('SECRET_KEY', 'tu-clave-secreta-muy-segura')
 # Configuración de la base de datos
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
+def normalizar_url_db(url):
+    """Convertir postgresql:// o postgres:// a postgresql+psycopg:// para psycopg3"""
+    if url.startswith('postgresql://'):
+        return url.replace('postgresql://', 'postgresql+psycopg://', 1)
+    if url.startswith('postgres://'):
+        return url.replace('postgres://', 'postgresql+psycopg://', 1)
+    return url
+
 if DATABASE_URL:
     # Producción - Render proporciona DATABASE_URL automáticamente
-    # Convertir postgresql:// a postgresql+psycopg:// para psycopg3
-    if DATABASE_URL.startswith('postgresql://'):
-        DATABASE_URL = DATABASE_URL.replace('postgresql://', 'postgresql+psycopg://', 1)
-    elif DATABASE_URL.startswith('postgres://'):
-        DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql+psycopg://', 1)
+    DATABASE_URL = normalizar_url_db(DATABASE_URL)
     app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 else:
     # Desarrollo - conectar directo a tu base en Render con psycopg3
@@ -25,8 +54,379 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Réplica opcional (streaming replication) para las rutas marcadas con @solo_lectura
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+if DATABASE_REPLICA_URL:
+    app.config['SQLALCHEMY_BINDS'] = {'replica': normalizar_url_db(DATABASE_REPLICA_URL)}
+
+# Retraso máximo aceptado de la réplica; con más, las lecturas van a la principal
+DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+# Cada cuánto se vuelve a medir el retraso, y cuánto se evita la réplica tras un fallo
+DB_REPLICA_CHECK_SECONDS = float(os.environ.get('DB_REPLICA_CHECK_SECONDS', 2))
+DB_REPLICA_RETRY_SECONDS = float(os.environ.get('DB_REPLICA_RETRY_SECONDS', 30))
+# Silencio máximo del primario hacia la réplica; sin escrituras el primario solo manda
+# keepalives cada wal_sender_timeout / 2 (30 s por defecto)
+DB_REPLICA_RECEIVER_TIMEOUT = float(os.environ.get('DB_REPLICA_RECEIVER_TIMEOUT', 60))
+
+# Filas que trae cada viaje del cursor de servidor en las exportaciones
+EXPORT_ITERSIZE = int(os.environ.get('EXPORT_ITERSIZE', 2000))
+
+# Segundos que se confía en la versión del catálogo si no hay listener activo
+CATALOG_VERSION_TTL = float(os.environ.get('CATALOG_VERSION_TTL', 2))
+# Con listener activo, cada cuántos segundos relee la versión de la BD; si no lo
+# confirma en el doble de tiempo se deja de confiar en él
+CATALOG_LISTENER_CHECK_SECONDS = float(os.environ.get('CATALOG_LISTENER_CHECK_SECONDS', 30))
+
+# Máximo de respuestas del catálogo (una por rango de fechas) guardadas por worker
+CATALOG_CACHE_MAX = int(os.environ.get('CATALOG_CACHE_MAX', 256))
+
+# Filas máximas por lote de /api/admin/stock/lote
+STOCK_LOTE_MAX = int(os.environ.get('STOCK_LOTE_MAX', 5000))
+
+# Conexiones SSE de /api/admin/stream por worker: cada una ocupa un hilo mientras está abierta
+ADMIN_STREAM_MAX = int(os.environ.get('ADMIN_STREAM_MAX', 4))
+# Segundos entre comentarios de keep-alive y duración máxima de una conexión (el navegador reconecta)
+ADMIN_STREAM_PING = float(os.environ.get('ADMIN_STREAM_PING', 15))
+ADMIN_STREAM_MAX_SECONDS = float(os.environ.get('ADMIN_STREAM_MAX_SECONDS', 600))
+
+# ===============================================
+# POOL DE CONEXIONES
+# ===============================================
+
+_pool_metricas = {
+    'checkouts': 0,
+    'espera_total': 0.0,
+    'espera_max': 0.0,
+    'overflow_eventos': 0,
+    'timeouts': 0
+}
+_pool_metricas_lock = threading.Lock()
+
+class MedidorQueuePool(QueuePool):
+    """QueuePool que mide la espera por conexión y las veces que entra en overflow"""
+    
+    def _do_get(self):
+        overflow_antes = self.overflow()
+        inicio = time_module.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except PoolTimeoutError:
+            with _pool_metricas_lock:
+                _pool_metricas['timeouts'] += 1
+            raise
+        espera = time_module.perf_counter() - inicio
+        
+        with _pool_metricas_lock:
+            _pool_metricas['checkouts'] += 1
+            _pool_metricas['espera_total'] += espera
+            _pool_metricas['espera_max'] = max(_pool_metricas['espera_max'], espera)
+            if self.overflow() > overflow_antes:
+                _pool_metricas['overflow_eventos'] += 1
+        return conexion
+
+# ===============================================
+# MÉTRICAS (PROMETHEUS)
+# ===============================================
+
+# Con varios workers de gunicorn, PROMETHEUS_MULTIPROC_DIR (definido en
+# gunicorn.conf.py) hace que cada proceso escriba sus valores a disco y /metrics
+# los sume todos.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+REQUEST_LATENCY = Histogram(
+    'alquifiestas_request_duration_seconds', 'Latencia de las peticiones HTTP',
+    ['route', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+REQUEST_COUNT = Counter(
+    'alquifiestas_requests_total', 'Peticiones HTTP atendidas',
+    ['route', 'method', 'status']
+)
+REQUEST_DB_QUERIES = Histogram(
+    'alquifiestas_request_db_queries', 'Consultas SQL ejecutadas por petición',
+    ['route'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+)
+REQUEST_DB_SECONDS = Histogram(
+    'alquifiestas_request_db_seconds', 'Tiempo en base de datos por petición',
+    ['route'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+DB_POOL_EN_USO = Gauge(
+    'alquifiestas_db_pool_checked_out', 'Conexiones del pool en uso',
+    multiprocess_mode='livesum'
+)
+DB_POOL_OVERFLOW = Gauge(
+    'alquifiestas_db_pool_overflow', 'Conexiones abiertas por encima de pool_size',
+    multiprocess_mode='livesum'
+)
+DB_LECTURAS = Counter(
+    'alquifiestas_db_lecturas_total', 'Peticiones de solo lectura según la base que las atendió',
+    ['destino']
+)
+
+# ===============================================
+# REGISTRO DE CONSULTAS LENTAS
+# ===============================================
+
+# Umbral en milisegundos (0 desactiva el registro)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 250))
+# Fracción de consultas lentas (solo lectura) a las que se les captura EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE', 0))
+SLOW_QUERY_BUFFER = int(os.environ.get('SLOW_QUERY_BUFFER', 200))
+# Parámetros con nombre (%(nombre)s) que se registran con su valor; el resto solo con su tipo
+SLOW_QUERY_PARAMS_VISIBLES = {
+    nombre.strip() for nombre in os.environ.get('SLOW_QUERY_PARAMS_VISIBLES', 'desde,hasta').split(',')
+    if nombre.strip()
+}
+
+_consultas_lentas = deque(maxlen=SLOW_QUERY_BUFFER)
+_consultas_lentas_lock = threading.Lock()
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_ESCRITURA_RE = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE|FOR UPDATE|FOR SHARE|NOTIFY|pg_notify|nextval|setval)\b', re.IGNORECASE)
+
+def normalizar_sql(query):
+    """Una sola línea, con los literales reemplazados por ?"""
+    texto = ' '.join(str(query).split())
+    return _LITERAL_RE.sub('?', texto)
+
+def redactar_parametro(valor):
+    """Reemplazar un valor por su tipo: teléfonos, documentos, ids y montos también son datos personales"""
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        return f'<str:{len(valor)}>'
+    if isinstance(valor, (list, tuple)):
+        return f'<lista:{len(valor)}>'
+    return f'<{type(valor).__name__}>'
+
+def redactar_parametros(params):
+    """Parámetros para el registro: solo los de SLOW_QUERY_PARAMS_VISIBLES conservan su valor"""
+    if isinstance(params, dict):
+        return {
+            nombre: (str(valor) if isinstance(valor, (date, time, Decimal)) else valor)
+            if nombre in SLOW_QUERY_PARAMS_VISIBLES else redactar_parametro(valor)
+            for nombre, valor in params.items()
+        }
+    if isinstance(params, (list, tuple)):
+        return [redactar_parametro(valor) for valor in params]
+    return redactar_parametro(params)
+
+def registrar_consulta_lenta(cursor, query, params, duracion):
+    route = get_route_label() if has_request_context() else None
+    entrada = {
+        'momento': datetime.now(timezone.utc).isoformat(),
+        'pid': os.getpid(),
+        'route': route,
+        'duracion_ms': round(duracion * 1000, 2),
+        'sql': normalizar_sql(query),
+        'params': redactar_parametros(params),
+        'explain': None
+    }
+    
+    # EXPLAIN ANALYZE vuelve a ejecutar la consulta: solo para lecturas y en una muestra
+    if (SLOW_QUERY_EXPLAIN_SAMPLE > 0 and random.random() < SLOW_QUERY_EXPLAIN_SAMPLE
+            and not _ESCRITURA_RE.search(str(query))):
+        try:
+            # Savepoint: si el EXPLAIN falla no debe abortar la transacción de la petición
+            with cursor.connection.transaction():
+                explain_cursor = psycopg.Cursor(cursor.connection)
+                explain_cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}", params)
+                entrada['explain'] = '\n'.join(row[0] for row in explain_cursor.fetchall())
+                explain_cursor.close()
+        except Exception as e:
+            entrada['explain'] = f'Error capturando EXPLAIN: {str(e)}'
+    
+    with _consultas_lentas_lock:
+        _consultas_lentas.append(entrada)
+    print(f"Consulta lenta ({entrada['duracion_ms']} ms) en {route}: {entrada['sql'][:500]}")
+
+class CursorMedido(psycopg.Cursor):
+    """Cursor que acumula el número de consultas y el tiempo en BD del contexto actual"""
+    
+    def execute(self, query, params=None, **kwargs):
+        inicio = time_module.perf_counter()
+        try:
+            resultado = super().execute(query, params, **kwargs)
+        finally:
+            duracion = time_module.perf_counter() - inicio
+            registrar_consulta(duracion)
+        
+        if SLOW_QUERY_MS > 0 and duracion * 1000 >= SLOW_QUERY_MS:
+            registrar_consulta_lenta(self, query, params, duracion)
+        return resultado
+    
+    def executemany(self, query, params_seq, **kwargs):
+        inicio = time_module.perf_counter()
+        try:
+            return super().executemany(query, params_seq, **kwargs)
+        finally:
+            registrar_consulta(time_module.perf_counter() - inicio)
+
+def registrar_consulta(duracion):
+    if has_app_context():
+        g.sql_consultas = g.get('sql_consultas', 0) + 1
+        g.sql_segundos = g.get('sql_segundos', 0.0) + duracion
+
+def get_route_label():
+    """Plantilla de la ruta (p. ej. /api/admin/stock/<int:articulo_id>) para no disparar la cardinalidad"""
+    return request.url_rule.rule if request.url_rule else 'sin_ruta'
+
+@app.before_request
+def iniciar_medicion():
+    g.inicio_peticion = time_module.perf_counter()
+    g.sql_consultas = 0
+    g.sql_segundos = 0.0
+
+@app.after_request
+def registrar_medicion(response):
+    inicio = g.get('inicio_peticion')
+    if inicio is None:
+        return response
+    
+    route = get_route_label()
+    REQUEST_LATENCY.labels(route, request.method).observe(time_module.perf_counter() - inicio)
+    REQUEST_COUNT.labels(route, request.method, str(response.status_code)).inc()
+    REQUEST_DB_QUERIES.labels(route).observe(g.get('sql_consultas', 0))
+    REQUEST_DB_SECONDS.labels(route).observe(g.get('sql_segundos', 0.0))
+    
+    pool = db.engine.pool
+    DB_POOL_EN_USO.set(pool.checkedout())
+    DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+    return response
+
+# Preparar en el servidor las consultas más frecuentes (desactivar detrás de PgBouncer en modo transacción)
+DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'poolclass': MedidorQueuePool,
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') != '0',
+    'connect_args': {
+        # Ejecuciones de una misma consulta antes de que psycopg la prepare sola;
+        # None desactiva también la preparación automática
+        'prepare_threshold': int(os.environ.get('DB_PREPARE_THRESHOLD', 5)) if DB_PREPARED_STATEMENTS else None,
+        'cursor_factory': CursorMedido
+    }
+}
+
 db = SQLAlchemy(app)
 
+def get_pool_metricas():
+    """Estado del pool y métricas acumuladas de este proceso"""
+    pool = db.engine.pool
+    with _pool_metricas_lock:
+        metricas = dict(_pool_metricas)
+    checkouts = metricas['checkouts']
+    return {
+        'pid': os.getpid(),
+        'pool_size': pool.size(),
+        'en_uso': pool.checkedout(),
+        'disponibles': pool.checkedin(),
+        'overflow': pool.overflow(),
+        'checkouts': checkouts,
+        'espera_promedio_ms': round(metricas['espera_total'] / checkouts * 1000, 3) if checkouts else 0.0,
+        'espera_max_ms': round(metricas['espera_max'] * 1000, 3),
+        'overflow_eventos': metricas['overflow_eventos'],
+        'timeouts': metricas['timeouts']
+    }
+
+# ===============================================
+# RÉPLICA DE LECTURA
+# ===============================================
+
+# Segundos de retraso de la réplica; 0 si ya aplicó todo lo recibido (la principal
+# sin escrituras no adelanta pg_last_xact_replay_timestamp) o si no es una réplica.
+# NULL si el receptor de WAL no está en streaming o no recibe nada del primario
+# hace más de %(silencio)s segundos: con el receptor caído lo recibido y lo aplicado
+# coinciden y la réplica parecería al día. El usuario de la réplica necesita
+# pg_read_all_stats para ver pg_stat_wal_receiver; sin él también da NULL.
+REPLICA_RETRASO_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN w.status IS DISTINCT FROM 'streaming' OR w.last_msg_receipt_time IS NULL THEN NULL
+        WHEN w.last_msg_receipt_time < now() - make_interval(secs => %(silencio)s) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    FROM (SELECT 1) AS uno
+    LEFT JOIN pg_stat_wal_receiver w ON TRUE
+"""
+
+_replica = {'retraso': 0.0, 'revisado': float('-inf'), 'caida_hasta': float('-inf'), 'ultimo_error': None}
+
+def solo_lectura(vista):
+    """Marcar una ruta como de solo lectura: sus consultas pueden ir a la réplica"""
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        g.solo_lectura = True
+        return vista(*args, **kwargs)
+    return envoltura
+
+def conectar_replica():
+    """Conexión a la réplica, o None si está caída, sin recibir WAL o atrasada más de DB_REPLICA_MAX_LAG"""
+    ahora = time_module.monotonic()
+    if ahora < _replica['caida_hasta']:
+        return None
+    
+    conexion = None
+    try:
+        conexion = db.engines['replica'].raw_connection()
+        if ahora - _replica['revisado'] >= DB_REPLICA_CHECK_SECONDS:
+            cursor = conexion.cursor()
+            cursor.execute(REPLICA_RETRASO_SQL, {'silencio': DB_REPLICA_RECEIVER_TIMEOUT})
+            retraso = cursor.fetchone()[0]
+            _replica['retraso'] = float(retraso) if retraso is not None else None
+            _replica['revisado'] = ahora
+    except Exception as e:
+        print(f"Réplica no disponible, se usa la base principal: {str(e)}")
+        _replica['caida_hasta'] = ahora + DB_REPLICA_RETRY_SECONDS
+        _replica['ultimo_error'] = str(e)
+        if conexion is not None:
+            conexion.invalidate()
+        return None
+    
+    if _replica['retraso'] is None or _replica['retraso'] > DB_REPLICA_MAX_LAG:
+        conexion.close()
+        return None
+    return conexion
+
+def get_conexion():
+    """Conexión psycopg de la petición: la réplica en rutas @solo_lectura si está
+    disponible y al día; en cualquier otro caso la sesión de la base principal"""
+    if DATABASE_REPLICA_URL and has_request_context() and g.get('solo_lectura'):
+        if 'conexion_replica' not in g:
+            g.conexion_replica = conectar_replica()
+            DB_LECTURAS.labels('replica' if g.conexion_replica is not None else 'principal').inc()
+        if g.conexion_replica is not None:
+            return g.conexion_replica
+    return db.session.connection().connection
+
+@app.teardown_request
+def liberar_conexion_replica(exc):
+    conexion = g.pop('conexion_replica', None)
+    if conexion is not None:
+        conexion.close()
+
+def get_estado_replica():
+    """Estado de la réplica visto por este proceso"""
+    if not DATABASE_REPLICA_URL:
+        return {'configurada': False}
+    ahora = time_module.monotonic()
+    return {
+        'configurada': True,
+        'disponible': ahora >= _replica['caida_hasta'],
+        'recibiendo_wal': _replica['retraso'] is not None,
+        'retraso_s': round(_replica['retraso'], 3) if _replica['retraso'] is not None else None,
+        'retraso_max_s': DB_REPLICA_MAX_LAG,
+        'revisado_hace_s': round(ahora - _replica['revisado'], 1) if _replica['revisado'] > float('-inf') else None,
+        'ultimo_error': _replica['ultimo_error']
+    }
+
 # ===============================================
 # FUNCIONES AUXILIARES PARA BASE DE DATOS
 # ===============================================
@@ -47,28 +447,134 @@ def serialize_database_row(row_dict):
             row_dict[key] = float(value)
     return row_dict
 
+# Conversión por tipo de columna (OID de PostgreSQL) para el serializador rápido
+_CONVERSORES_OID = {
+    1082: date.isoformat,                       # date
+    1083: lambda v: v.strftime('%H:%M:%S'),     # time
+    1266: lambda v: v.strftime('%H:%M:%S'),     # timetz
+    1114: datetime.isoformat,                   # timestamp
+    1184: datetime.isoformat,                   # timestamptz
+    1700: float,                                # numeric
+}
+
+def filas_json(cursor):
+    """Row factory de psycopg que devuelve dicts ya listos para JSON.
+    
+    Lee cursor.description una sola vez por consulta y arma el plan de
+    conversión por columna, en lugar de revisar con isinstance cada valor.
+    """
+    description = cursor.description
+    if description is None:
+        return tuple
+    
+    columns = [desc.name for desc in description]
+    plan = [(i, _CONVERSORES_OID[desc.type_code]) for i, desc in enumerate(description)
+            if desc.type_code in _CONVERSORES_OID]
+    
+    if not plan:
+        return lambda values: dict(zip(columns, values))
+    
+    def fila(values):
+        values = list(values)
+        for i, convertir in plan:
+            if values[i] is not None:
+                values[i] = convertir(values[i])
+        return dict(zip(columns, values))
+    
+    return fila
+
+def cursor_json(connection=None):
+    """Cursor cuyas filas son dicts serializables (ver filas_json)"""
+    if connection is None:
+        connection = get_conexion()
+    return connection.cursor(row_factory=filas_json)
+
+def respuesta_json(payload, status=200):
+    """Serializar directamente a bytes JSON, sin el recorrido extra de jsonify"""
+    body = json.dumps(payload, separators=(',', ':'), default=str)
+    return Response(body, status=status, mimetype='application/json')
+
+# ===============================================
+# ÚLTIMO LOGIN DIFERIDO
+# ===============================================
+
+# El login no escribe en users: anota la hora en memoria y un hilo por worker
+# la guarda por lotes, sin bloquear la fila ni esperar un commit en la petición.
+LAST_LOGIN_FLUSH_SECONDS = float(os.environ.get('LAST_LOGIN_FLUSH_SECONDS', 5))
+
+_last_login = {'pendientes': {}, 'pid': None}
+_last_login_lock = threading.Lock()
+
+def registrar_last_login(user_id):
+    """Anotar un login para guardarlo en el siguiente lote"""
+    iniciar_escritor_last_login()
+    with _last_login_lock:
+        _last_login['pendientes'][user_id] = datetime.now(timezone.utc)
+
+def guardar_last_login():
+    """Escribir en una sola sentencia todos los logins pendientes"""
+    with _last_login_lock:
+        pendientes = _last_login['pendientes']
+        _last_login['pendientes'] = {}
+    
+    if not pendientes:
+        return 0
+    
+    with app.app_context():
+        try:
+            cursor = db.session.connection().connection.cursor()
+            cursor.execute("""
+                UPDATE users u
+                SET last_login = v.momento
+                FROM unnest(%s::int[], %s::timestamptz[]) AS v(id, momento)
+                WHERE u.id = v.id
+                AND (u.last_login IS NULL OR u.last_login < v.momento)
+            """, (list(pendientes.keys()), list(pendientes.values())))
+            db.session.commit()
+            return len(pendientes)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error guardando last_login: {str(e)}")
+            # Devolver los pendientes para el siguiente intento sin pisar logins más nuevos
+            with _last_login_lock:
+                for user_id, momento in pendientes.items():
+                    _last_login['pendientes'].setdefault(user_id, momento)
+            return 0
+
+def _escribir_last_login():
+    while True:
+        time_module.sleep(LAST_LOGIN_FLUSH_SECONDS)
+        guardar_last_login()
+
+def iniciar_escritor_last_login():
+    """Arrancar el hilo escritor una vez por proceso (también después de un fork)"""
+    with _last_login_lock:
+        if _last_login['pid'] == os.getpid():
+            return
+        _last_login['pid'] = os.getpid()
+        _last_login['pendientes'] = {}
+    threading.Thread(target=_escribir_last_login, name='last-login-writer', daemon=True).start()
+
+atexit.register(guardar_last_login)
+
 def authenticate_user(username, password):
-    """Función para autenticar usuario"""
+    """Autenticar usuario y resolver su id_cliente en la misma consulta"""
     try:
         cursor = db.session.connection().connection.cursor()
         cursor.execute("""
-            SELECT id, username, email, full_name, is_admin, is_active
-            FROM users 
-            WHERE username = %s AND password = %s AND is_active = true
-        """, (username, password))
+            SELECT u.id, u.username, u.email, u.full_name, u.is_admin, u.is_active, c.id_cliente
+            FROM users u
+            LEFT JOIN clientes c ON c.user_id = u.id
+            WHERE u.username = %s AND u.password = %s AND u.is_active = true
+        """, (username, password), prepare=DB_PREPARED_STATEMENTS)
         
         result = cursor.fetchone()
         if result:
-            columns = ['id', 'username', 'email', 'full_name', 'is_admin', 'is_active']
+            columns = ['id', 'username', 'email', 'full_name', 'is_admin', 'is_active', 'id_cliente']
             user_data = dict(zip(columns, result))
             
-            # Actualizar último login
-            cursor.execute("""
-                UPDATE users 
-                SET last_login = CURRENT_TIMESTAMP 
-                WHERE id = %s
-            """, (user_data['id'],))
-            db.session.commit()
+            # Actualizar último login (se guarda por lotes en segundo plano)
+            registrar_last_login(user_data['id'])
             
             return user_data
         return None
@@ -107,6 +613,418 @@ def create_user(username, password, email, full_name=None, is_admin=False):
         print(f"Error en create_user: {str(e)}")
         return None
 
+def cargar_detalles_eventos(cursor, eventos):
+    """Cargar los detalles de varios eventos en una sola consulta"""
+    if not eventos:
+        return eventos
+    
+    detalle_cursor = cursor_json(cursor.connection)
+    detalle_cursor.execute("""
+        SELECT de.*, a.nombre_articulo, a.tipo
+        FROM detalle_evento de
+        JOIN articulos a ON de.id_articulo = a.id_articulo
+        WHERE de.id_evento = ANY(%s)
+    """, ([evento['id_evento'] for evento in eventos],))
+    
+    detalles_por_evento = {}
+    
+    for detalle in detalle_cursor.fetchall():
+        detalles_por_evento.setdefault(detalle['id_evento'], []).append(detalle)
+    
+    for evento in eventos:
+        evento['detalles'] = detalles_por_evento.get(evento['id_evento'], [])
+    
+    return eventos
+
+# Paginación por cursor (keyset)
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 500
+
+def encode_cursor(*valores):
+    """Codificar la clave de orden de la última fila como cursor opaco"""
+    valores = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in valores]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+def decode_cursor(cursor_str):
+    """Decodificar un cursor generado por encode_cursor"""
+    if not cursor_str:
+        return None
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor_str.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Cursor inválido')
+    if not isinstance(valores, list) or len(valores) != 2:
+        raise ValueError('Cursor inválido')
+    # Clave (fecha o timestamp ISO, id entero): cualquier otra cosa fallaría en la consulta
+    fecha, id_fila = valores
+    if not isinstance(fecha, str) or not isinstance(id_fila, int) or isinstance(id_fila, bool):
+        raise ValueError('Cursor inválido')
+    try:
+        datetime.fromisoformat(fecha)
+    except ValueError:
+        raise ValueError('Cursor inválido')
+    return valores
+
+def parse_fecha_filtro(args, nombre):
+    """Leer un filtro de fecha AAAA-MM-DD opcional; None si no viene"""
+    valor = args.get(nombre)
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise ValueError(f'{nombre} inválida, use el formato AAAA-MM-DD')
+
+def get_page_limit():
+    """Obtener el tamaño de página solicitado dentro de los límites permitidos"""
+    limit = request.args.get('limit', PAGE_SIZE_DEFAULT, type=int)
+    return max(1, min(limit or PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX))
+
+def build_page(rows, limit, key_func):
+    """Recortar la página y calcular next_cursor (se consulta limit + 1 filas)"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(*key_func(rows[-1])) if has_more and rows else None
+    return rows, next_cursor
+
+# Sincronización incremental (?since=)
+# eventos, articulos y reservas_articulo guardan en "cambio" el id de la transacción
+# que escribió cada fila y los borrados quedan en registros_borrados (migración 0008).
+# El cursor es el xmin de un snapshot tomado antes de leer: lo escrito por
+# transacciones anteriores ya era visible, y lo que confirme después tiene un id
+# mayor o igual, así que la siguiente lectura lo incluye (a lo sumo repetido).
+SYNC_CURSOR_SQL = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text"
+
+# Columnas que devuelve la API de eventos y articulos: "cambio" es interno de la sincronización
+COLUMNAS_EVENTO = "e.id_evento, e.id_cliente, e.fecha_evento, e.hora_inicio, e.hora_fin, e.estado, e.monto_total"
+COLUMNAS_ARTICULO = "a.id_articulo, a.nombre_articulo, a.tipo, a.cantidad_total, a.precio_unitario"
+
+# registros_borrados conserva SYNC_RETENCION_DIAS; la poda (migración 0009) deja en
+# sincronizacion_horizonte el mayor cambio podado y corre como mucho una vez cada
+# SYNC_PODA_SEGUNDOS por proceso, o con 'flask --app app podar-sincronizacion'.
+SYNC_RETENCION_DIAS = float(os.environ.get('SYNC_RETENCION_DIAS', 30))
+SYNC_PODA_SEGUNDOS = 3600
+_sync_poda = {'ultima': 0.0}
+
+def parse_since(args):
+    """Leer el cursor ?since= que devolvió una lectura anterior como sync_cursor"""
+    since = args.get('since')
+    if not since:
+        return None
+    if not since.isdigit():
+        raise ValueError('Cursor de sincronización inválido')
+    return since
+
+# Cursor de sincronización y versión del catálogo en el mismo snapshot (ver get_articulos)
+SYNC_CURSOR_CATALOGO_SQL = """
+    SELECT pg_snapshot_xmin(pg_current_snapshot())::text, version
+    FROM catalogo_version
+    WHERE id = 1
+"""
+
+def sync_cursor(connection):
+    """Cursor de sincronización para devolver junto con la lectura que sigue"""
+    return connection.execute(SYNC_CURSOR_SQL).fetchone()[0]
+
+def podar_registros_borrados(forzar=False):
+    """Borrar los registros_borrados más viejos que la retención y avanzar el horizonte.
+    
+    Usa una conexión propia a la base principal (las lecturas pueden ir a la réplica).
+    """
+    ahora = time_module.time()
+    if not forzar and ahora - _sync_poda['ultima'] < SYNC_PODA_SEGUNDOS:
+        return 0
+    _sync_poda['ultima'] = ahora
+    
+    try:
+        with psycopg.connect(get_raw_database_url()) as conexion:
+            fila = conexion.execute("""
+                WITH podados AS (
+                    DELETE FROM registros_borrados
+                    WHERE borrado_en < LOCALTIMESTAMP - %s * INTERVAL '1 day'
+                    RETURNING cambio
+                ), horizonte AS (
+                    UPDATE sincronizacion_horizonte
+                    SET cambio = GREATEST(cambio, (SELECT cambio FROM podados ORDER BY cambio DESC LIMIT 1)),
+                        actualizado_en = LOCALTIMESTAMP
+                    WHERE EXISTS (SELECT 1 FROM podados)
+                )
+                SELECT COUNT(*) FROM podados
+            """, (SYNC_RETENCION_DIAS,)).fetchone()
+        return fila[0]
+    except Exception as e:
+        print(f"Error podando registros borrados: {str(e)}")
+        return 0
+
+def cursor_vencido(connection, since):
+    """True si se podaron borrados posteriores al cursor: el cliente debe recargar todo"""
+    podar_registros_borrados()
+    fila = connection.execute(
+        "SELECT %s::xid8 <= cambio FROM sincronizacion_horizonte", (since,)
+    ).fetchone()
+    return bool(fila and fila[0])
+
+def respuesta_resincronizar():
+    return jsonify({
+        'success': False,
+        'resincronizar': True,
+        'message': 'Cursor de sincronización vencido: se requiere una recarga completa'
+    }), 410
+
+def ids_borrados(connection, tabla, since, id_cliente=None):
+    """Ids borrados de una tabla desde el cursor (solo los del cliente si se indica)"""
+    filas = connection.execute("""
+        SELECT DISTINCT id FROM registros_borrados
+        WHERE tabla = %s AND cambio >= %s::xid8
+          AND (%s::int IS NULL OR id_cliente = %s)
+    """, (tabla, since, id_cliente, id_cliente)).fetchall()
+    return [fila[0] for fila in filas]
+
+# ===============================================
+# CACHÉ DEL CATÁLOGO (SERVICIOS Y ARTÍCULOS)
+# ===============================================
+
+# Cada worker guarda las respuestas ya serializadas junto con la versión del
+# catálogo con la que se generaron. La versión vive en la tabla catalogo_version;
+# cada escritura la incrementa y emite NOTIFY catalogo para los demás workers.
+# Las respuestas se desalojan por LRU al llegar a CATALOG_CACHE_MAX rangos de fechas.
+_catalogo = {'version': None, 'verificado': 0.0, 'escuchando': False, 'latido': 0.0, 'pid': None,
+             'respuestas': OrderedDict()}
+_catalogo_lock = threading.Lock()
+
+# Keepalives TCP de las conexiones LISTEN: una conexión a medio cerrar (failover,
+# NAT que la descarta) no da error por sí sola y los NOTIFY se perderían en silencio
+LISTENER_KEEPALIVES = {'keepalives': 1, 'keepalives_idle': 30, 'keepalives_interval': 10, 'keepalives_count': 3}
+
+def get_raw_database_url():
+    """URL de conexión para psycopg sin el prefijo de SQLAlchemy"""
+    return app.config['SQLALCHEMY_DATABASE_URI'].replace('postgresql+psycopg://', 'postgresql://', 1)
+
+def _actualizar_version_catalogo(version):
+    with _catalogo_lock:
+        if _catalogo['version'] is None or version > _catalogo['version']:
+            _catalogo['version'] = version
+        _catalogo['verificado'] = time_module.monotonic()
+
+def _escuchar_catalogo():
+    """Hilo que recibe NOTIFY catalogo y mantiene la versión local al día"""
+    import psycopg
+    
+    while True:
+        try:
+            with psycopg.connect(get_raw_database_url(), autocommit=True, **LISTENER_KEEPALIVES) as conn:
+                conn.execute("LISTEN catalogo")
+                while True:
+                    # Leer la versión después de LISTEN para no perder cambios intermedios, y
+                    # releerla periódicamente: cubre NOTIFY perdidos y prueba que la conexión vive
+                    version = conn.execute("SELECT version FROM catalogo_version WHERE id = 1").fetchone()[0]
+                    _actualizar_version_catalogo(version)
+                    _catalogo['latido'] = time_module.monotonic()
+                    _catalogo['escuchando'] = True
+                    
+                    for notify in conn.notifies(timeout=CATALOG_LISTENER_CHECK_SECONDS):
+                        _actualizar_version_catalogo(int(notify.payload))
+        except Exception as e:
+            print(f"Error en listener del catálogo: {str(e)}")
+        finally:
+            _catalogo['escuchando'] = False
+        time_module.sleep(5)
+
+def iniciar_listener_catalogo():
+    """Arrancar el listener una vez por proceso (también después de un fork)"""
+    with _catalogo_lock:
+        if _catalogo['pid'] == os.getpid():
+            return
+        _catalogo['pid'] = os.getpid()
+        _catalogo['escuchando'] = False
+    threading.Thread(target=_escuchar_catalogo, name='catalogo-listener', daemon=True).start()
+
+def get_catalog_version():
+    """Versión vigente del catálogo; solo consulta la BD si el listener no está activo
+    o no confirmó la versión en los últimos 2 * CATALOG_LISTENER_CHECK_SECONDS"""
+    iniciar_listener_catalogo()
+    
+    with _catalogo_lock:
+        version = _catalogo['version']
+        ahora = time_module.monotonic()
+        vigente = ahora - _catalogo['verificado'] < CATALOG_VERSION_TTL
+        escuchando = (_catalogo['escuchando'] and
+                      ahora - _catalogo['latido'] < 2 * CATALOG_LISTENER_CHECK_SECONDS)
+        if version is not None and (escuchando or vigente):
+            return version
+    
+    cursor = db.session.connection().connection.cursor()
+    cursor.execute("SELECT version FROM catalogo_version WHERE id = 1")
+    version = cursor.fetchone()[0]
+    _actualizar_version_catalogo(version)
+    return version
+
+def invalidar_catalogo(cursor):
+    """Incrementar la versión del catálogo dentro de la transacción en curso.
+    
+    El NOTIFY se entrega a los demás workers al hacer commit; quien llama debe
+    pasar el valor devuelto a catalogo_confirmado() después del commit.
+    """
+    cursor.execute("""
+        UPDATE catalogo_version SET version = version + 1
+        WHERE id = 1
+        RETURNING version
+    """)
+    version = cursor.fetchone()[0]
+    cursor.execute("SELECT pg_notify('catalogo', %s)", (str(version),))
+    return version
+
+def catalogo_confirmado(version):
+    """Aplicar localmente una nueva versión ya confirmada en la BD"""
+    _actualizar_version_catalogo(version)
+
+def respuesta_catalogo(nombre, construir, version=None):
+    """Servir una respuesta del catálogo desde caché con ETag fuerte y 304.
+    Sin version se usa get_catalog_version()."""
+    if version is None:
+        version = get_catalog_version()
+    
+    with _catalogo_lock:
+        entrada = _catalogo['respuestas'].get(nombre)
+        if entrada:
+            _catalogo['respuestas'].move_to_end(nombre)
+    
+    if not entrada or entrada[0] != version:
+        body = construir().get_data()
+        etag = f"{nombre}-{version}-{hashlib.sha1(body).hexdigest()[:16]}"
+        entrada = (version, etag, body)
+        with _catalogo_lock:
+            _catalogo['respuestas'][nombre] = entrada
+            _catalogo['respuestas'].move_to_end(nombre)
+            while len(_catalogo['respuestas']) > CATALOG_CACHE_MAX:
+                _catalogo['respuestas'].popitem(last=False)
+    
+    response = Response(entrada[2], mimetype='application/json')
+    response.set_etag(entrada[1])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# ===============================================
+# AVISOS EN VIVO PARA ADMINISTRADORES
+# ===============================================
+
+# Las escrituras emiten NOTIFY admin con {"tipo", "datos"} dentro de su transacción.
+# Un único hilo por worker hace LISTEN admin y reparte cada aviso a las colas de
+# las conexiones SSE abiertas; las estadísticas se recalculan una vez por ráfaga
+# de avisos, no una vez por navegador.
+_stream = {'pid': None, 'colas': set(), 'escuchando': False}
+_stream_lock = threading.Lock()
+
+# Tipos de aviso que cambian las estadísticas del panel
+AVISOS_CON_STATS = {'evento_creado', 'evento_actualizado', 'stock', 'stock_lote'}
+
+def notificar_admin(cursor, tipo, datos):
+    """Encolar un aviso para /api/admin/stream; se entrega al confirmar la transacción"""
+    cursor.execute("SELECT pg_notify('admin', %s)", (json.dumps({'tipo': tipo, 'datos': datos}, default=str),))
+
+def publicar_stream(tipo, datos):
+    """Entregar un aviso a todas las conexiones SSE de este worker"""
+    with _stream_lock:
+        colas = list(_stream['colas'])
+    for cola in colas:
+        try:
+            cola.put_nowait((tipo, datos))
+        except queue.Full:
+            # Navegador que no consume: se vacía su cola y se deja la marca de cierre (None);
+            # generar() termina, el EventSource reconecta y el panel recarga todo
+            with _stream_lock:
+                _stream['colas'].discard(cola)
+            try:
+                while True:
+                    cola.get_nowait()
+            except queue.Empty:
+                pass
+            cola.put_nowait(None)
+
+def _escuchar_admin():
+    """Hilo que recibe NOTIFY admin y lo reparte a las conexiones SSE del worker"""
+    import psycopg
+    
+    while True:
+        try:
+            with psycopg.connect(get_raw_database_url(), autocommit=True, **LISTENER_KEEPALIVES) as conn:
+                conn.execute("LISTEN admin")
+                if _stream['escuchando'] is None:
+                    # Se perdió la conexión: los avisos intermedios no llegaron
+                    publicar_stream('resincronizar', {})
+                _stream['escuchando'] = True
+                
+                while True:
+                    # Agrupar los avisos de cada segundo para recalcular las estadísticas una sola vez
+                    recalcular = False
+                    for notify in conn.notifies(timeout=1.0):
+                        aviso = json.loads(notify.payload)
+                        publicar_stream(aviso['tipo'], aviso['datos'])
+                        recalcular = recalcular or aviso['tipo'] in AVISOS_CON_STATS
+                    if recalcular and _stream['colas']:
+                        publicar_stream('stats', consultar_stats(conn.cursor()))
+        except Exception as e:
+            print(f"Error en listener de avisos admin: {str(e)}")
+        _stream['escuchando'] = None
+        time_module.sleep(5)
+
+def suscribir_stream():
+    """Registrar una conexión SSE; arranca el listener del worker si hace falta.
+    Devuelve None si el worker ya tiene ADMIN_STREAM_MAX conexiones."""
+    with _stream_lock:
+        if _stream['pid'] != os.getpid():
+            _stream['pid'] = os.getpid()
+            _stream['colas'] = set()
+            _stream['escuchando'] = False
+            threading.Thread(target=_escuchar_admin, name='admin-listener', daemon=True).start()
+        if len(_stream['colas']) >= ADMIN_STREAM_MAX:
+            return None
+        cola = queue.Queue(maxsize=100)
+        _stream['colas'].add(cola)
+        return cola
+
+def desuscribir_stream(cola):
+    with _stream_lock:
+        _stream['colas'].discard(cola)
+
+# ===============================================
+# DISPONIBILIDAD DE ARTÍCULOS POR FECHA
+# ===============================================
+
+# cantidad_total es el inventario propio de cada artículo. Lo apartado por cada
+# evento vive en reservas_articulo con su rango de fechas, de modo que una silla
+# reservada en diciembre sigue disponible en noviembre.
+# Unidades ocupadas por artículo: el máximo diario dentro de [desde, hasta].
+OCUPACION_ARTICULOS_SQL = """
+    SELECT o.id_articulo, MAX(o.usado) AS usado
+    FROM (
+        SELECT r.id_articulo, d.dia, SUM(r.cantidad) AS usado
+        FROM reservas_articulo r
+        CROSS JOIN LATERAL generate_series(
+            GREATEST(lower(r.periodo), %(desde)s::date),
+            LEAST(upper(r.periodo) - 1, %(hasta)s::date),
+            interval '1 day'
+        ) AS d(dia)
+        WHERE r.periodo && daterange(%(desde)s::date, %(hasta)s::date, '[]')
+          AND (%(articulos)s::int[] IS NULL OR r.id_articulo = ANY(%(articulos)s::int[]))
+        GROUP BY r.id_articulo, d.dia
+    ) o
+    GROUP BY o.id_articulo
+"""
+
+def parse_rango_fechas(args):
+    """Leer fecha_desde/fecha_hasta (o fecha) de la petición; por defecto hoy"""
+    desde = args.get('fecha_desde') or args.get('fecha')
+    hasta = args.get('fecha_hasta') or desde
+    try:
+        desde = date.fromisoformat(desde) if desde else date.today()
+        hasta = date.fromisoformat(hasta) if hasta else desde
+    except ValueError:
+        raise ValueError('Fecha inválida, use el formato AAAA-MM-DD')
+    if hasta < desde:
+        raise ValueError('fecha_hasta no puede ser anterior a fecha_desde')
+    return desde, hasta
+
 def get_user_info(user_id):
     """Obtener información completa del usuario"""
     try:
@@ -131,6 +1049,160 @@ def get_user_info(user_id):
         print(f"Error obteniendo info usuario: {str(e)}")
         return None
 
+# Ocupación por día: eventos desde eventos_resumen_diario (lo mantiene el trigger de
+# eventos, lectura por rango de su clave primaria) y días bloqueados desde fechas_bloqueadas
+OCUPACION_DIARIA_SQL = """
+    WITH resumen AS (
+        SELECT fecha,
+               COALESCE(SUM(total_eventos) FILTER (WHERE estado IN ('reservado', 'confirmado')), 0) AS eventos,
+               COALESCE(SUM(total_eventos) FILTER (WHERE estado = 'reservado'), 0) AS reservados,
+               COALESCE(SUM(total_eventos) FILTER (WHERE estado = 'confirmado'), 0) AS confirmados,
+               COALESCE(SUM(total_eventos) FILTER (WHERE estado = 'completado'), 0) AS completados,
+               COALESCE(SUM(monto_total), 0) AS monto_total
+        FROM eventos_resumen_diario
+        WHERE fecha BETWEEN %(desde)s AND %(hasta)s
+          AND total_eventos > 0
+        GROUP BY fecha
+    ),
+    bloqueos AS (
+        SELECT DISTINCT d.dia::date AS fecha
+        FROM fechas_bloqueadas b
+        CROSS JOIN LATERAL generate_series(
+            GREATEST(lower(b.periodo), %(desde)s::date),
+            LEAST(upper(b.periodo) - 1, %(hasta)s::date),
+            interval '1 day'
+        ) AS d(dia)
+        WHERE b.periodo && daterange(%(desde)s::date, %(hasta)s::date, '[]')
+          AND (b.dia_semana IS NULL OR b.dia_semana = EXTRACT(DOW FROM d.dia))
+    )
+    SELECT COALESCE(r.fecha, b.fecha) AS fecha,
+           COALESCE(r.eventos, 0) AS eventos,
+           COALESCE(r.reservados, 0) AS reservados,
+           COALESCE(r.confirmados, 0) AS confirmados,
+           COALESCE(r.completados, 0) AS completados,
+           COALESCE(r.monto_total, 0) AS monto_total,
+           b.fecha IS NOT NULL AS bloqueado
+    FROM resumen r
+    FULL JOIN bloqueos b ON b.fecha = r.fecha
+    ORDER BY 1
+"""
+
+# ¿Está bloqueada la fecha? Búsqueda por el índice GiST de la restricción de exclusión
+FECHA_BLOQUEADA_SQL = """
+    SELECT COALESCE(motivo, '')
+    FROM fechas_bloqueadas
+    WHERE periodo @> %(fecha)s::date
+      AND (dia_semana IS NULL OR dia_semana = EXTRACT(DOW FROM %(fecha)s::date))
+    LIMIT 1
+"""
+
+def fecha_bloqueada(cursor, fecha):
+    """Devolver el motivo si la fecha está bloqueada ('' sin motivo), o None si está libre"""
+    cursor.execute(FECHA_BLOQUEADA_SQL, {'fecha': fecha}, prepare=DB_PREPARED_STATEMENTS)
+    fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+OCUPACION_MAX_DIAS = 366
+
+def parse_periodo_ocupacion(args):
+    """Leer ?mes=AAAA-MM o fecha_desde/fecha_hasta (máximo un año)"""
+    mes = args.get('mes')
+    if mes:
+        try:
+            desde = datetime.strptime(mes, '%Y-%m').date()
+        except ValueError:
+            raise ValueError('Mes inválido, use el formato AAAA-MM')
+        siguiente = date(desde.year + desde.month // 12, desde.month % 12 + 1, 1)
+        return desde, siguiente - timedelta(days=1)
+    
+    desde, hasta = parse_rango_fechas(args)
+    if (hasta - desde).days >= OCUPACION_MAX_DIAS:
+        raise ValueError(f'El rango no puede superar {OCUPACION_MAX_DIAS} días')
+    return desde, hasta
+
+def consultar_ocupacion(desde, hasta):
+    """Días con eventos o bloqueados entre desde y hasta, listos para JSON"""
+    cursor = cursor_json()
+    cursor.execute(OCUPACION_DIARIA_SQL, {'desde': desde, 'hasta': hasta}, prepare=DB_PREPARED_STATEMENTS)
+    return cursor.fetchall()
+
+# ===============================================
+# RECURSOS ESTÁTICOS
+# ===============================================
+
+# Salida de scripts/build_assets.py: archivos con hash en el nombre y manifest.json
+ASSETS_DIR = os.path.join(app.static_folder, 'dist')
+ASSETS_MAX_AGE = 365 * 24 * 3600
+
+_assets = {'manifest': {}, 'mtime': None}
+
+def get_assets_manifest():
+    """Manifest de recursos generados; se recarga si cambia el archivo. Vacío si no hay build"""
+    ruta = os.path.join(ASSETS_DIR, 'manifest.json')
+    try:
+        mtime = os.path.getmtime(ruta)
+    except OSError:
+        return {}
+    if _assets['mtime'] != mtime:
+        with open(ruta, encoding='utf-8') as archivo:
+            _assets['manifest'] = json.load(archivo)
+        _assets['mtime'] = mtime
+    return _assets['manifest']
+
+def asset_url(nombre):
+    """URL del recurso con huella; sin build, el archivo original de static/"""
+    entrada = get_assets_manifest().get(nombre)
+    if entrada:
+        return url_for('servir_asset', filename=entrada['src'])
+    return url_for('static', filename=nombre)
+
+def imagen_responsive(nombre, alt='', sizes='100vw', **atributos):
+    """<picture> con variantes WebP y del formato original para srcset.
+    
+    Los atributos extra pasan al <img> (class_ para class, guiones bajos como guiones).
+    El <picture> usa display:contents para no alterar el CSS que apunta al <img>.
+    """
+    entrada = get_assets_manifest().get(nombre)
+    extras = ''.join(
+        f' {clave.rstrip("_").replace("_", "-")}="{escape(valor)}"' for clave, valor in atributos.items()
+    )
+    if not entrada or 'srcset' not in entrada:
+        return Markup(f'<img src="{escape(asset_url(nombre))}" alt="{escape(alt)}"{extras}>')
+    
+    def srcset(variantes):
+        return ', '.join(f"{url_for('servir_asset', filename=src)} {ancho}w" for src, ancho in variantes)
+    
+    return Markup(
+        f'<picture style="display:contents">'
+        f'<source type="image/webp" srcset="{escape(srcset(entrada["srcset"]["webp"]))}" sizes="{escape(sizes)}">'
+        f'<img src="{escape(url_for("servir_asset", filename=entrada["src"]))}" '
+        f'srcset="{escape(srcset(entrada["srcset"]["fallback"]))}" sizes="{escape(sizes)}" '
+        f'width="{entrada["width"]}" height="{entrada["height"]}" alt="{escape(alt)}"{extras}>'
+        f'</picture>'
+    )
+
+app.jinja_env.globals.update(asset_url=asset_url, imagen_responsive=imagen_responsive)
+
+@app.route('/assets/<path:filename>')
+def servir_asset(filename):
+    """Servir recursos con huella como inmutables, en gzip si el cliente lo acepta"""
+    comprimido = (
+        'gzip' in request.accept_encodings
+        and os.path.isfile(os.path.join(ASSETS_DIR, filename + '.gz'))
+    )
+    response = send_from_directory(
+        ASSETS_DIR,
+        filename + '.gz' if comprimido else filename,
+        mimetype=mimetypes.guess_type(filename)[0],
+        max_age=ASSETS_MAX_AGE,
+    )
+    if comprimido:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    # El nombre cambia con el contenido: el navegador no necesita revalidar nunca
+    response.headers['Cache-Control'] = f'public, max-age={ASSETS_MAX_AGE}, immutable'
+    return response
+
 # ===============================================
 # RUTAS BÁSICAS
 # ===============================================
@@ -164,14 +1236,10 @@ def login():
             session['user_name'] = user_data['full_name']
             session['is_admin'] = user_data['is_admin']
             
-            # Verificar si es cliente
-            cursor = db.session.connection().connection.cursor()
-            cursor.execute("SELECT id_cliente FROM clientes WHERE user_id = %s", (user_data['id'],))
-            cliente = cursor.fetchone()
-            
-            session['is_client'] = cliente is not None
-            if cliente:
-                session['cliente_id'] = cliente[0]
+            # Verificar si es cliente (resuelto en authenticate_user)
+            session['is_client'] = user_data['id_cliente'] is not None
+            if user_data['id_cliente'] is not None:
+                session['cliente_id'] = user_data['id_cliente']
             
             return jsonify({
                 'success': True,
@@ -328,9 +1396,9 @@ def get_cliente_info():
 
 @app.route('/api/servicios', methods=['GET'])
 def get_servicios():
-    try:
+    def construir():
         cursor = db.session.connection().connection.cursor()
-        cursor.execute("SELECT * FROM servicios ORDER BY nombre_servicio")
+        cursor.execute("SELECT * FROM servicios ORDER BY nombre_servicio", prepare=DB_PREPARED_STATEMENTS)
         
         columns = [desc[0] for desc in cursor.description]
         servicios = []
@@ -343,6 +1411,9 @@ def get_servicios():
             'success': True,
             'servicios': servicios
         })
+    
+    try:
+        return respuesta_catalogo('servicios', construir)
         
     except Exception as e:
         print(f"Error obteniendo servicios: {str(e)}")
@@ -354,8 +1425,23 @@ def get_servicios():
 @app.route('/api/articulos', methods=['GET'])
 def get_articulos():
     try:
+        desde, hasta = parse_rango_fechas(request.args)
+        since = parse_since(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if since is not None:
+        return get_articulos_cambios(desde, hasta, since)
+    
+    def construir():
         cursor = db.session.connection().connection.cursor()
-        cursor.execute("SELECT * FROM articulos WHERE cantidad_total > 0 ORDER BY nombre_articulo")
+        cursor.execute(f"""
+            SELECT {COLUMNAS_ARTICULO}, a.cantidad_total - COALESCE(o.usado, 0) AS disponible
+            FROM articulos a
+            LEFT JOIN ({OCUPACION_ARTICULOS_SQL}) o ON o.id_articulo = a.id_articulo
+            WHERE a.cantidad_total - COALESCE(o.usado, 0) > 0
+            ORDER BY a.nombre_articulo
+        """, {'desde': desde, 'hasta': hasta, 'articulos': None}, prepare=DB_PREPARED_STATEMENTS)
         
         columns = [desc[0] for desc in cursor.description]
         articulos = []
@@ -366,8 +1452,23 @@ def get_articulos():
         
         return jsonify({
             'success': True,
+            'fecha_desde': desde.isoformat(),
+            'fecha_hasta': hasta.isoformat(),
             'articulos': articulos
         })
+    
+    try:
+        # El cursor no va en el cuerpo cacheado (quedaría congelado, y un 304 reusa el
+        # cuerpo viejo): se calcula por petición y va en X-Sync-Cursor. Se toma en el
+        # mismo snapshot que la versión del catálogo; si la respuesta en caché es de
+        # esa versión, ninguna escritura de artículos o reservas confirmó después de
+        # armarla, y lo que siga en curso tendrá un cambio >= cursor.
+        connection = db.session.connection().connection
+        nuevo_cursor, version = connection.execute(SYNC_CURSOR_CATALOGO_SQL).fetchone()
+        catalogo_confirmado(version)
+        response = respuesta_catalogo(f'articulos:{desde}:{hasta}', construir, version)
+        response.headers['X-Sync-Cursor'] = nuevo_cursor
+        return response
         
     except Exception as e:
         print(f"Error obteniendo artículos: {str(e)}")
@@ -376,6 +1477,91 @@ def get_articulos():
             'message': 'Error obteniendo artículos'
         }), 500
 
+def get_articulos_cambios(desde, hasta, since):
+    """Artículos cuya disponibilidad en el rango cambió desde el cursor.
+    
+    Cuentan los cambios del artículo y las reservas creadas o liberadas que tocan
+    el rango; los que ya no tienen disponibilidad o se borraron van en 'eliminados'.
+    """
+    try:
+        connection = db.session.connection().connection
+        if cursor_vencido(connection, since):
+            return respuesta_resincronizar()
+        nuevo_cursor = sync_cursor(connection)
+        parametros = {'desde': desde, 'hasta': hasta, 'since': since}
+        
+        cambiados = [fila[0] for fila in connection.execute("""
+            SELECT id_articulo FROM articulos WHERE cambio >= %(since)s::xid8
+            UNION
+            SELECT id_articulo FROM reservas_articulo
+            WHERE cambio >= %(since)s::xid8 AND periodo && daterange(%(desde)s::date, %(hasta)s::date, '[]')
+            UNION
+            SELECT id FROM registros_borrados
+            WHERE tabla = 'reservas_articulo' AND cambio >= %(since)s::xid8
+              AND periodo && daterange(%(desde)s::date, %(hasta)s::date, '[]')
+        """, parametros).fetchall()]
+        
+        articulos = []
+        if cambiados:
+            cursor = cursor_json(connection)
+            cursor.execute(f"""
+                SELECT {COLUMNAS_ARTICULO}, a.cantidad_total - COALESCE(o.usado, 0) AS disponible
+                FROM articulos a
+                LEFT JOIN ({OCUPACION_ARTICULOS_SQL}) o ON o.id_articulo = a.id_articulo
+                WHERE a.id_articulo = ANY(%(articulos)s)
+                ORDER BY a.nombre_articulo
+            """, {**parametros, 'articulos': cambiados})
+            articulos = cursor.fetchall()
+        
+        eliminados = set(ids_borrados(connection, 'articulos', since))
+        eliminados.update(a['id_articulo'] for a in articulos if a['disponible'] <= 0)
+        
+        return respuesta_json({
+            'success': True,
+            'fecha_desde': desde.isoformat(),
+            'fecha_hasta': hasta.isoformat(),
+            'articulos': [a for a in articulos if a['disponible'] > 0],
+            'eliminados': sorted(eliminados),
+            'sync_cursor': nuevo_cursor
+        })
+        
+    except Exception as e:
+        print(f"Error obteniendo cambios de artículos: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Error obteniendo artículos'
+        }), 500
+
+@app.route('/api/ocupacion', methods=['GET'])
+def get_ocupacion():
+    """Ocupación del calendario por mes o rango; los clientes solo ven si el día está ocupado o bloqueado"""
+    if 'user' not in session:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
+    try:
+        desde, hasta = parse_periodo_ocupacion(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        dias = consultar_ocupacion(desde, hasta)
+        if not session.get('is_admin'):
+            dias = [
+                {'fecha': dia['fecha'], 'ocupada': dia['eventos'] > 0, 'bloqueado': dia['bloqueado']}
+                for dia in dias
+            ]
+        
+        return respuesta_json({
+            'success': True,
+            'fecha_desde': desde.isoformat(),
+            'fecha_hasta': hasta.isoformat(),
+            'dias': dias
+        })
+        
+    except Exception as e:
+        print(f"Error obteniendo ocupación: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error obteniendo ocupación'}), 500
+
 @app.route('/api/eventos', methods=['POST'])
 def create_evento():
     if 'user' not in session or not session.get('is_client'):
@@ -384,6 +1570,12 @@ def create_evento():
     try:
         data = request.get_json()
         
+        # Validar el carrito antes de escribir: una cantidad inválida llegaría al CHECK como error 500
+        try:
+            servicios = validar_servicios_evento(data.get('servicios', []))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
         # Obtener cliente ID
         cursor = db.session.connection().connection.cursor()
         cursor.execute("SELECT id_cliente FROM clientes WHERE user_id = %s", (session.get('user_id'),))
@@ -394,35 +1586,18 @@ def create_evento():
         
         cliente_id = result[0]
         
-        # PRIMERO: Verificar y apartar stock ANTES de crear el evento
-        servicios = data.get('servicios', [])
-        for servicio in servicios:
-            if servicio.get('tipo') == 'articulo':
-                # Verificar stock disponible
-                cursor.execute("""
-                    SELECT cantidad_total FROM articulos 
-                    WHERE id_articulo = %s
-                """, (servicio.get('id_articulo'),))
-                
-                stock_actual = cursor.fetchone()
-                if not stock_actual or stock_actual[0] < servicio.get('cantidad', 1):
-                    return jsonify({
-                        'success': False,
-                        'message': f'Stock insuficiente para {servicio.get("nombre")}. Disponible: {stock_actual[0] if stock_actual else 0}'
-                    }), 400
-                
-                # Apartar stock (reducir cantidad disponible)
-                cursor.execute("""
-                    UPDATE articulos 
-                    SET cantidad_total = cantidad_total - %s
-                    WHERE id_articulo = %s
-                """, (servicio.get('cantidad', 1), servicio.get('id_articulo')))
+        motivo = fecha_bloqueada(cursor, data.get('fecha_evento'))
+        if motivo is not None:
+            return jsonify({
+                'success': False,
+                'message': f"La fecha {data.get('fecha_evento')} no está disponible" + (f": {motivo}" if motivo else '')
+            }), 400
         
-        # SEGUNDO: Crear evento
+        # PRIMERO: Crear evento
         cursor.execute("""
             INSERT INTO eventos (id_cliente, fecha_evento, hora_inicio, hora_fin, estado, monto_total)
             VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id_evento
+            RETURNING id_evento, fecha_evento
         """, (
             cliente_id,
             data.get('fecha_evento'),
@@ -432,21 +1607,37 @@ def create_evento():
             data.get('monto_total', 0)
         ))
         
-        evento_id = cursor.fetchone()[0]
+        evento_id, fecha_evento = cursor.fetchone()
         
-        # TERCERO: Agregar detalles del evento
-        for servicio in servicios:
-            cursor.execute("""
-                INSERT INTO detalle_evento (id_evento, id_articulo, cantidad, precio_unitario)
-                VALUES (%s, %s, %s, %s)
-            """, (
-                evento_id,
-                servicio.get('id_articulo'),
-                servicio.get('cantidad', 1),
-                servicio.get('precio_unitario')
-            ))
+        # SEGUNDO: Apartar stock para la fecha del evento (se revierte todo si falta)
+        faltantes = apartar_stock_evento(cursor, servicios, evento_id, fecha_evento, fecha_evento)
+        if faltantes:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': 'Stock insuficiente para ' + ', '.join(
+                    f"{f['nombre']}. Disponible: {f['disponible']}" for f in faltantes
+                ),
+                'faltantes': faltantes
+            }), 400
+        
+        # TERCERO: Agregar detalles del evento (una sola inserción)
+        cursor.execute("""
+            INSERT INTO detalle_evento (id_evento, id_articulo, cantidad, precio_unitario)
+            SELECT %s, d.id_articulo, d.cantidad, d.precio_unitario
+            FROM unnest(%s::int[], %s::int[], %s::numeric[]) AS d(id_articulo, cantidad, precio_unitario)
+        """, (
+            evento_id,
+            [servicio.get('id_articulo') for servicio in servicios],
+            [servicio.get('cantidad', 1) for servicio in servicios],
+            [servicio.get('precio_unitario') for servicio in servicios]
+        ))
         
+        version_catalogo = invalidar_catalogo(cursor)
+        # Solo el id: NOTIFY admite 8000 bytes y el panel pide la fila a /api/admin/eventos
+        notificar_admin(cursor, 'evento_creado', {'id_evento': evento_id})
         db.session.commit()
+        catalogo_confirmado(version_catalogo)
         
         return jsonify({
             'success': True,
@@ -468,47 +1659,42 @@ def get_mis_eventos():
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
     try:
-        cursor = db.session.connection().connection.cursor()
+        since = parse_since(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        cursor = cursor_json()
+        if since and cursor_vencido(cursor.connection, since):
+            return respuesta_resincronizar()
+        nuevo_cursor = sync_cursor(cursor.connection)
         # Corregido: JOIN con users para obtener el email
-        cursor.execute("""
-            SELECT e.*, c.nombre as cliente_nombre, c.telefono, u.email
+        cursor.execute(f"""
+            SELECT {COLUMNAS_EVENTO}, c.nombre as cliente_nombre, c.telefono, u.email
             FROM eventos e
             JOIN clientes c ON e.id_cliente = c.id_cliente
             JOIN users u ON c.user_id = u.id
-            WHERE c.user_id = %s
+            WHERE c.user_id = %s {'AND e.cambio >= %s::xid8' if since else ''}
             ORDER BY e.fecha_evento DESC
-        """, (session.get('user_id'),))
+        """, (session.get('user_id'), since) if since else (session.get('user_id'),))
         
-        columns = [desc[0] for desc in cursor.description]
-        eventos = []
+        eventos = cursor.fetchall()
         
-        for row in cursor.fetchall():
-            evento = dict(zip(columns, row))
-            evento = serialize_database_row(evento)
-            
-            # Obtener detalles del evento
-            cursor.execute("""
-                SELECT de.*, a.nombre_articulo, a.tipo
-                FROM detalle_evento de
-                JOIN articulos a ON de.id_articulo = a.id_articulo
-                WHERE de.id_evento = %s
-            """, (evento['id_evento'],))
-            
-            detalle_columns = [desc[0] for desc in cursor.description]
-            detalles = []
-            
-            for detalle_row in cursor.fetchall():
-                detalle = dict(zip(detalle_columns, detalle_row))
-                detalle = serialize_database_row(detalle)
-                detalles.append(detalle)
-            
-            evento['detalles'] = detalles
-            eventos.append(evento)
+        # Obtener detalles de todos los eventos en una sola consulta
+        cargar_detalles_eventos(cursor, eventos)
         
-        return jsonify({
+        respuesta = {
             'success': True,
-            'eventos': eventos
-        })
+            'eventos': eventos,
+            'sync_cursor': nuevo_cursor
+        }
+        if since:
+            cliente = cursor.connection.execute(
+                "SELECT id_cliente FROM clientes WHERE user_id = %s", (session.get('user_id'),)
+            ).fetchone()
+            respuesta['eliminados'] = ids_borrados(cursor.connection, 'eventos', since, cliente[0]) if cliente else []
+        
+        return respuesta_json(respuesta)
         
     except Exception as e:
         print(f"Error obteniendo eventos: {str(e)}")
@@ -559,6 +1745,11 @@ def procesar_pago():
             WHERE id_evento = %s
         """, (data.get('id_evento'),))
         
+        notificar_admin(cursor, 'evento_actualizado', {
+            'id_evento': resultado[0],
+            'estado': 'confirmado',
+            'pago': {'id_pago': pago_id, 'monto': data.get('monto')}
+        })
         db.session.commit()
         
         return jsonify({
@@ -575,148 +1766,262 @@ def procesar_pago():
             'message': 'Error procesando pago'
         }), 500
 
+# ===============================================
+# COMPROBANTES PDF
+# ===============================================
+
+# Los PDF generados se guardan en disco con nombre evento_<id>_<huella>.pdf
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'alquifiestas_pdf'))
+
+# Subir al cambiar el diseño del comprobante para descartar los PDF anteriores
+PDF_LAYOUT_VERSION = 1
+
+# Límites del directorio de caché: edad (días sin descargarse) y tamaño total (MB).
+# La poda corre como mucho una vez cada PDF_CACHE_PODA_SEGUNDOS por proceso.
+PDF_CACHE_MAX_DIAS = float(os.environ.get('PDF_CACHE_MAX_DIAS', 30))
+PDF_CACHE_MAX_MB = float(os.environ.get('PDF_CACHE_MAX_MB', 500))
+PDF_CACHE_PODA_SEGUNDOS = 300
+_pdf_poda = {'ultima': 0.0}
+
+# Expresión sobre e/c/u que resume el evento, los datos del cliente, los detalles y los pagos
+HUELLA_EVENTO_SQL = """
+    md5(concat_ws('|',
+        row(e.*)::text,
+        row(c.nombre, c.telefono, u.email)::text,
+        (SELECT string_agg(d::text, ',' ORDER BY d::text)
+         FROM (
+             SELECT de.*, a.nombre_articulo, a.tipo
+             FROM detalle_evento de
+             JOIN articulos a ON de.id_articulo = a.id_articulo
+             WHERE de.id_evento = e.id_evento
+         ) d),
+        (SELECT string_agg(p::text, ',' ORDER BY p::text)
+         FROM pagos p
+         WHERE p.id_evento = e.id_evento)
+    ))
+"""
+
+def ruta_pdf_cache(evento_id, huella):
+    """Ruta del PDF en caché para una versión concreta del evento"""
+    return os.path.join(PDF_CACHE_DIR, f'evento_{evento_id}_v{PDF_LAYOUT_VERSION}_{huella}.pdf')
+
+def abrir_pdf_cache(ruta):
+    """Abrir el PDF en caché o devolver None si no existe.
+    
+    Se sirve desde el descriptor abierto: si la poda borra el archivo mientras
+    se envía, el envío termina igual.
+    """
+    try:
+        archivo = open(ruta, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        # La edad para la poda cuenta desde la última descarga
+        os.utime(ruta)
+    except OSError:
+        pass
+    return archivo
+
+def guardar_pdf_cache(ruta, pdf_data):
+    """Guardar el PDF de forma atómica; las versiones viejas las retira la poda"""
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    
+    fd, temporal = tempfile.mkstemp(dir=PDF_CACHE_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as archivo:
+        archivo.write(pdf_data)
+    os.replace(temporal, ruta)
+    podar_pdf_cache()
+
+def podar_pdf_cache():
+    """Borrar los PDF sin descargas en PDF_CACHE_MAX_DIAS y, si el directorio
+    supera PDF_CACHE_MAX_MB, los de uso más antiguo hasta quedar por debajo"""
+    ahora = time_module.time()
+    if ahora - _pdf_poda['ultima'] < PDF_CACHE_PODA_SEGUNDOS:
+        return
+    _pdf_poda['ultima'] = ahora
+    
+    archivos = []
+    for ruta in glob.glob(os.path.join(PDF_CACHE_DIR, '*.pdf')):
+        try:
+            info = os.stat(ruta)
+        except OSError:
+            continue
+        archivos.append((info.st_mtime, info.st_size, ruta))
+    
+    archivos.sort()
+    total = sum(tamano for _, tamano, _ in archivos)
+    limite = PDF_CACHE_MAX_MB * 1024 * 1024
+    for modificado, tamano, ruta in archivos:
+        if ahora - modificado < PDF_CACHE_MAX_DIAS * 86400 and total <= limite:
+            break
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+        total -= tamano
+
+def construir_pdf_evento(evento_data, detalles):
+    """Generar el comprobante PDF de un evento y devolver sus bytes"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+    from io import BytesIO
+    
+    # Generar PDF
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=1*inch)
+    styles = getSampleStyleSheet()
+    story = []
+    
+    # Título
+    title = Paragraph("Comprobante de Evento - La Calzada", styles['Title'])
+    story.append(title)
+    story.append(Spacer(1, 20))
+    
+    # Información del evento
+    evento_info = [
+        ['ID Evento:', str(evento_data['id_evento'])],
+        ['Cliente:', evento_data['nombre']],
+        ['Teléfono:', evento_data['telefono']],
+        ['Email:', evento_data['email']],
+        ['Fecha:', str(evento_data['fecha_evento'])],
+        ['Hora:', f"{evento_data['hora_inicio']} - {evento_data['hora_fin']}"],
+        ['Estado:', evento_data['estado'].upper()],
+    ]
+    
+    evento_table = Table(evento_info, colWidths=[2*inch, 4*inch])
+    evento_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+    ]))
+    story.append(evento_table)
+    story.append(Spacer(1, 20))
+    
+    # Detalles de servicios/artículos
+    if detalles:
+        story.append(Paragraph("Servicios y Artículos", styles['Heading2']))
+        
+        detalle_data = [['Artículo/Servicio', 'Cantidad', 'Precio Unit.', 'Subtotal']]
+        for detalle in detalles:
+            subtotal = float(detalle['cantidad']) * float(detalle['precio_unitario'])
+            detalle_data.append([
+                detalle['nombre_articulo'],
+                str(detalle['cantidad']),
+                f"Q{float(detalle['precio_unitario']):.2f}",
+                f"Q{subtotal:.2f}"
+            ])
+        
+        detalle_table = Table(detalle_data, colWidths=[3*inch, 1*inch, 1.5*inch, 1.5*inch])
+        detalle_table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ]))
+        story.append(detalle_table)
+        story.append(Spacer(1, 20))
+    
+    # Total
+    total_data = [['TOTAL:', f"Q{float(evento_data['monto_total']):.2f}"]]
+    total_table = Table(total_data, colWidths=[5*inch, 2*inch])
+    total_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 14),
+        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+        ('GRID', (0, 0), (-1, -1), 2, colors.black),
+        ('BACKGROUND', (0, 0), (-1, -1), colors.lightblue),
+    ]))
+    story.append(total_table)
+    
+    # Pie de página
+    story.append(Spacer(1, 30))
+    footer = Paragraph(f"Generado el {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", styles['Normal'])
+    story.append(footer)
+    
+    # Construir PDF
+    doc.build(story)
+    
+    buffer.seek(0)
+    pdf_data = buffer.getvalue()
+    buffer.close()
+    
+    return pdf_data
+
 @app.route('/api/generar_pdf/<int:evento_id>')
 def generar_pdf_evento(evento_id):
     if 'user' not in session or not session.get('is_client'):
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
     try:
-        from reportlab.lib.pagesizes import letter
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-        from reportlab.lib.styles import getSampleStyleSheet
-        from reportlab.lib import colors
-        from reportlab.lib.units import inch
-        from io import BytesIO
-        import os
-        
         cursor = db.session.connection().connection.cursor()
         
-        # Obtener datos del evento
-        cursor.execute("""
-            SELECT e.*, c.nombre, c.telefono, u.email
+        # Huella del evento: cambia con el evento, sus detalles o sus pagos
+        cursor.execute(f"""
+            SELECT {HUELLA_EVENTO_SQL}
             FROM eventos e
             JOIN clientes c ON e.id_cliente = c.id_cliente
             JOIN users u ON c.user_id = u.id
             WHERE e.id_evento = %s AND c.user_id = %s
         """, (evento_id, session.get('user_id')))
         
-        columns = [desc[0] for desc in cursor.description]
-        evento_row = cursor.fetchone()
+        huella = cursor.fetchone()
         
-        if not evento_row:
+        if not huella:
             return jsonify({'success': False, 'message': 'Evento no encontrado'}), 404
         
-        evento_data = dict(zip(columns, evento_row))
-        evento_data = serialize_database_row(evento_data)
-        
-        # Obtener detalles del evento
-        cursor.execute("""
-            SELECT de.*, a.nombre_articulo, a.tipo
-            FROM detalle_evento de
-            JOIN articulos a ON de.id_articulo = a.id_articulo
-            WHERE de.id_evento = %s
-        """, (evento_id,))
-        
-        detalle_columns = [desc[0] for desc in cursor.description]
-        detalles = []
-        for row in cursor.fetchall():
-            detalle = dict(zip(detalle_columns, row))
-            detalle = serialize_database_row(detalle)
-            detalles.append(detalle)
-        
-        # Generar PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=1*inch)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Título
-        title = Paragraph("Comprobante de Evento - La Calzada", styles['Title'])
-        story.append(title)
-        story.append(Spacer(1, 20))
-        
-        # Información del evento
-        evento_info = [
-            ['ID Evento:', str(evento_data['id_evento'])],
-            ['Cliente:', evento_data['nombre']],
-            ['Teléfono:', evento_data['telefono']],
-            ['Email:', evento_data['email']],
-            ['Fecha:', str(evento_data['fecha_evento'])],
-            ['Hora:', f"{evento_data['hora_inicio']} - {evento_data['hora_fin']}"],
-            ['Estado:', evento_data['estado'].upper()],
-        ]
-        
-        evento_table = Table(evento_info, colWidths=[2*inch, 4*inch])
-        evento_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ]))
-        story.append(evento_table)
-        story.append(Spacer(1, 20))
-        
-        # Detalles de servicios/artículos
-        if detalles:
-            story.append(Paragraph("Servicios y Artículos", styles['Heading2']))
+        download_name = f'evento_{evento_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+        ruta = ruta_pdf_cache(evento_id, huella[0])
+        archivo = abrir_pdf_cache(ruta)
+        
+        if archivo is None:
+            # Obtener datos del evento
+            cursor.execute(f"""
+                SELECT {COLUMNAS_EVENTO}, c.nombre, c.telefono, u.email
+                FROM eventos e
+                JOIN clientes c ON e.id_cliente = c.id_cliente
+                JOIN users u ON c.user_id = u.id
+                WHERE e.id_evento = %s AND c.user_id = %s
+            """, (evento_id, session.get('user_id')))
             
-            detalle_data = [['Artículo/Servicio', 'Cantidad', 'Precio Unit.', 'Subtotal']]
-            for detalle in detalles:
-                subtotal = float(detalle['cantidad']) * float(detalle['precio_unitario'])
-                detalle_data.append([
-                    detalle['nombre_articulo'],
-                    str(detalle['cantidad']),
-                    f"Q{float(detalle['precio_unitario']):.2f}",
-                    f"Q{subtotal:.2f}"
-                ])
+            columns = [desc[0] for desc in cursor.description]
+            evento_row = cursor.fetchone()
             
-            detalle_table = Table(detalle_data, colWidths=[3*inch, 1*inch, 1.5*inch, 1.5*inch])
-            detalle_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ]))
-            story.append(detalle_table)
-            story.append(Spacer(1, 20))
-        
-        # Total
-        total_data = [['TOTAL:', f"Q{float(evento_data['monto_total']):.2f}"]]
-        total_table = Table(total_data, colWidths=[5*inch, 2*inch])
-        total_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 14),
-            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-            ('GRID', (0, 0), (-1, -1), 2, colors.black),
-            ('BACKGROUND', (0, 0), (-1, -1), colors.lightblue),
-        ]))
-        story.append(total_table)
-        
-        # Pie de página
-        story.append(Spacer(1, 30))
-        footer = Paragraph(f"Generado el {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", styles['Normal'])
-        story.append(footer)
-        
-        # Construir PDF
-        doc.build(story)
-        
-        # Preparar respuesta
-        buffer.seek(0)
-        pdf_data = buffer.getvalue()
-        buffer.close()
-        
-        # Crear respuesta con el PDF
-        from flask import make_response
-        response = make_response(pdf_data)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename=evento_{evento_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+            if not evento_row:
+                return jsonify({'success': False, 'message': 'Evento no encontrado'}), 404
+            
+            evento_data = dict(zip(columns, evento_row))
+            evento_data = serialize_database_row(evento_data)
+            
+            # Obtener detalles del evento
+            cursor.execute("""
+                SELECT de.*, a.nombre_articulo, a.tipo
+                FROM detalle_evento de
+                JOIN articulos a ON de.id_articulo = a.id_articulo
+                WHERE de.id_evento = %s
+            """, (evento_id,))
+            
+            detalle_columns = [desc[0] for desc in cursor.description]
+            detalles = []
+            for row in cursor.fetchall():
+                detalle = dict(zip(detalle_columns, row))
+                detalle = serialize_database_row(detalle)
+                detalles.append(detalle)
+            
+            pdf_data = construir_pdf_evento(evento_data, detalles)
+            guardar_pdf_cache(ruta, pdf_data)
+            archivo = io.BytesIO(pdf_data)
         
-        return response
+        # Repetir la descarga es solo leer el archivo (sendfile cuando el servidor lo soporta)
+        return send_file(archivo, mimetype='application/pdf', as_attachment=True, download_name=download_name)
         
     except ImportError:
         return jsonify({
@@ -731,25 +2036,95 @@ def generar_pdf_evento(evento_id):
             'message': f'Error generando PDF: {str(e)}'
         }), 500
 
+# Procesos para generar comprobantes en lote (uno por núcleo por defecto)
+# Procesos de render por worker de gunicorn: el total es WEB_CONCURRENCY × PDF_WORKERS
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', 2))
+PDF_BULK_MAX = int(os.environ.get('PDF_BULK_MAX', 2000))
+
+_pdf_pool = {'pid': None, 'executor': None}
+_pdf_pool_lock = threading.Lock()
+
+def get_pdf_executor():
+    """Pool de procesos para PDF, creado una vez por proceso worker.
+    
+    Los procesos salen de un forkserver (o spawn) y no de un fork del worker: el
+    worker tiene hilos y sockets abiertos, y un fork podría heredar locks tomados.
+    """
+    with _pdf_pool_lock:
+        if _pdf_pool['pid'] != os.getpid():
+            metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pdf_pool['executor'] = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context(metodo)
+            )
+            _pdf_pool['pid'] = os.getpid()
+        return _pdf_pool['executor']
+
+class _ZipStream:
+    """Destino no seekable para zipfile que entrega lo escrito por partes"""
+    
+    def __init__(self):
+        self.partes = []
+    
+    def write(self, data):
+        self.partes.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def vaciar(self):
+        data = b''.join(self.partes)
+        self.partes = []
+        return data
+
 # ===============================================
 # RUTAS PARA ADMINISTRACIÓN
 # ===============================================
 
 @app.route('/api/users')
+@solo_lectura
 def get_users():
     if 'user' not in session or not session.get('is_admin'):
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
     
     try:
-        cursor = db.session.connection().connection.cursor()
-        cursor.execute("""
+        limit = get_page_limit()
+        cursor_valores = decode_cursor(request.args.get('cursor'))
+        fecha_desde = parse_fecha_filtro(request.args, 'fecha_desde')
+        fecha_hasta = parse_fecha_filtro(request.args, 'fecha_hasta')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        condiciones = []
+        params = []
+        
+        # Orden y filtros sobre (created_at, id): los resuelve idx_users_created_at_id
+        if cursor_valores:
+            condiciones.append("(u.created_at, u.id) < (%s, %s)")
+            params.extend(cursor_valores)
+        if fecha_desde:
+            condiciones.append("u.created_at >= %s")
+            params.append(fecha_desde)
+        if fecha_hasta:
+            condiciones.append("u.created_at < %s::date + 1")
+            params.append(fecha_hasta)
+        
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        params.append(limit + 1)
+        
+        cursor = get_conexion().cursor()
+        cursor.execute(f"""
             SELECT u.id, u.username, u.email, u.full_name, u.is_admin, u.is_active, u.created_at,
                    c.nombre as cliente_nombre, a.nombre as admin_nombre
             FROM users u
             LEFT JOIN clientes c ON u.id = c.user_id
             LEFT JOIN administradores a ON u.id = a.user_id
-            ORDER BY u.created_at DESC
-        """)
+            {where}
+            ORDER BY u.created_at DESC, u.id DESC
+            LIMIT %s
+        """, params)
         
         columns = [desc[0] for desc in cursor.description]
         users_list = []
@@ -758,9 +2133,12 @@ def get_users():
             user_data = dict(zip(columns, row))
             users_list.append(user_data)
         
+        users_list, next_cursor = build_page(users_list, limit, lambda u: (u['created_at'], u['id']))
+        
         return jsonify({
             'success': True,
-            'users': users_list
+            'users': users_list,
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
@@ -789,108 +2167,230 @@ def admin_dashboard():
     return render_template('admin_dashboard.html')
 
 # ESTADÍSTICAS GENERALES PARA ADMIN
+# Origen de los totales de eventos: 'resumen' (tabla diaria) o 'eventos' (un solo recorrido)
+STATS_FUENTE = os.environ.get('STATS_FUENTE', 'resumen')
+
+# Un solo recorrido: se agrupa por estado y luego se combinan los grupos
+STATS_EVENTOS_SQL = """
+    SELECT COALESCE(SUM(total), 0),
+           COALESCE(SUM(total_mes), 0),
+           COALESCE(SUM(ingresos) FILTER (WHERE estado IN ('confirmado', 'completado')), 0),
+           jsonb_object_agg(estado, total) FILTER (WHERE estado IS NOT NULL)
+    FROM (
+        SELECT estado,
+               COUNT(*) AS total,
+               COUNT(*) FILTER (
+                   WHERE fecha_evento >= date_trunc('month', CURRENT_DATE)::date
+                   AND fecha_evento < (date_trunc('month', CURRENT_DATE) + interval '1 month')::date
+               ) AS total_mes,
+               SUM(monto_total) AS ingresos
+        FROM eventos
+        GROUP BY estado
+    ) por_estado
+"""
+
+# Misma forma de resultado, leyendo el resumen diario mantenido por trigger
+STATS_RESUMEN_SQL = """
+    SELECT COALESCE(SUM(total), 0),
+           COALESCE(SUM(total_mes), 0),
+           COALESCE(SUM(ingresos) FILTER (WHERE estado IN ('confirmado', 'completado')), 0),
+           jsonb_object_agg(estado, total) FILTER (WHERE total > 0)
+    FROM (
+        SELECT estado,
+               SUM(total_eventos) AS total,
+               COALESCE(SUM(total_eventos) FILTER (
+                   WHERE fecha >= date_trunc('month', CURRENT_DATE)::date
+                   AND fecha < (date_trunc('month', CURRENT_DATE) + interval '1 month')::date
+               ), 0) AS total_mes,
+               SUM(monto_total) AS ingresos
+        FROM eventos_resumen_diario
+        GROUP BY estado
+    ) por_estado
+"""
+
+def consultar_stats(cursor):
+    """Estadísticas del panel: totales de eventos (total, mes actual, ingresos, por estado) en una sola consulta"""
+    cursor.execute(f"""
+        SELECT (SELECT COUNT(*) FROM clientes),
+               (SELECT COUNT(*)
+                FROM articulos a
+                LEFT JOIN ({OCUPACION_ARTICULOS_SQL}) o ON o.id_articulo = a.id_articulo
+                WHERE a.cantidad_total - COALESCE(o.usado, 0) < 10),
+               s.*
+        FROM ({STATS_EVENTOS_SQL if STATS_FUENTE == 'eventos' else STATS_RESUMEN_SQL}) s
+    """, {'desde': date.today(), 'hasta': date.today(), 'articulos': None})
+    (total_clientes, articulos_stock_bajo, total_eventos,
+     eventos_mes, total_ingresos, eventos_por_estado) = cursor.fetchone()
+    
+    return {
+        'total_clientes': total_clientes,
+        'total_eventos': int(total_eventos),
+        'eventos_mes': int(eventos_mes),
+        'total_ingresos': float(total_ingresos),
+        'eventos_por_estado': {estado: int(total) for estado, total in (eventos_por_estado or {}).items()},
+        'articulos_stock_bajo': articulos_stock_bajo
+    }
+
 @app.route('/api/admin/stats', methods=['GET'])
+@solo_lectura
 def get_admin_stats():
     if 'user' not in session or not session.get('is_admin'):
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
     
     try:
-        cursor = db.session.connection().connection.cursor()
-        
-        # Total clientes
-        cursor.execute("SELECT COUNT(*) FROM clientes")
-        total_clientes = cursor.fetchone()[0]
-        
-        # Total eventos
-        cursor.execute("SELECT COUNT(*) FROM eventos")
-        total_eventos = cursor.fetchone()[0]
-        
-        # Eventos por estado
-        cursor.execute("""
-            SELECT estado, COUNT(*) 
-            FROM eventos 
-            GROUP BY estado
-        """)
-        eventos_por_estado = dict(cursor.fetchall())
-        
-        # Eventos del mes actual
-        cursor.execute("""
-            SELECT COUNT(*) FROM eventos 
-            WHERE EXTRACT(MONTH FROM fecha_evento) = EXTRACT(MONTH FROM CURRENT_DATE)
-            AND EXTRACT(YEAR FROM fecha_evento) = EXTRACT(YEAR FROM CURRENT_DATE)
-        """)
-        eventos_mes = cursor.fetchone()[0]
-        
-        # Total ingresos
-        cursor.execute("SELECT SUM(monto_total) FROM eventos WHERE estado IN ('confirmado', 'completado')")
-        total_ingresos = cursor.fetchone()[0] or 0
-        
-        # Artículos con stock bajo
-        cursor.execute("SELECT COUNT(*) FROM articulos WHERE cantidad_total < 10")
-        articulos_stock_bajo = cursor.fetchone()[0]
-        
         return jsonify({
             'success': True,
-            'stats': {
-                'total_clientes': total_clientes,
-                'total_eventos': total_eventos,
-                'eventos_mes': eventos_mes,
-                'total_ingresos': float(total_ingresos),
-                'eventos_por_estado': eventos_por_estado,
-                'articulos_stock_bajo': articulos_stock_bajo
-            }
+            'stats': consultar_stats(get_conexion().cursor())
         })
         
     except Exception as e:
         print(f"Error obteniendo estadísticas admin: {str(e)}")
         return jsonify({'success': False, 'message': 'Error en el servidor'}), 500
 
+# AVISOS EN VIVO (SERVER-SENT EVENTS)
+@app.route('/api/admin/stream', methods=['GET'])
+def admin_stream():
+    """Stream SSE con avisos de eventos creados, pagos, stock y embodegados.
+    
+    No usa la base de datos: las conexiones comparten el listener del worker.
+    """
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+    
+    cola = suscribir_stream()
+    if cola is None:
+        return jsonify({'success': False, 'message': 'Demasiadas conexiones en vivo'}), 503
+    
+    def generar():
+        limite = time_module.monotonic() + ADMIN_STREAM_MAX_SECONDS
+        try:
+            yield 'retry: 5000\n\n'
+            while time_module.monotonic() < limite:
+                try:
+                    aviso = cola.get(timeout=ADMIN_STREAM_PING)
+                except queue.Empty:
+                    # Comentario keep-alive; también detecta navegadores desconectados
+                    yield ': ping\n\n'
+                    continue
+                if aviso is None:
+                    # Cola desbordada: cerrar para que el navegador reconecte y se resincronice
+                    return
+                tipo, datos = aviso
+                yield f"event: {tipo}\ndata: {json.dumps(datos, separators=(',', ':'), default=str)}\n\n"
+        finally:
+            desuscribir_stream(cola)
+    
+    response = Response(generar(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def sql_pagina_eventos(where):
+    """Página de /api/admin/eventos en orden (fecha_evento, id_evento) descendente; el
+    último parámetro es el LIMIT. scripts/check_indices_analitica.py revisa su plan."""
+    # Corregido: JOIN con users para obtener el email
+    return f"""
+        SELECT {COLUMNAS_EVENTO}, c.nombre as cliente_nombre, c.telefono, u.email
+        FROM eventos e
+        JOIN clientes c ON e.id_cliente = c.id_cliente
+        JOIN users u ON c.user_id = u.id
+        {where}
+        ORDER BY e.fecha_evento DESC, e.id_evento DESC
+        LIMIT %s
+    """
+
 # OBTENER TODOS LOS EVENTOS PARA ADMIN
 @app.route('/api/admin/eventos', methods=['GET'])
+@solo_lectura
 def get_admin_eventos():
     if 'user' not in session or not session.get('is_admin'):
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
     try:
-        cursor = db.session.connection().connection.cursor()
-        # Corregido: JOIN con users para obtener el email
-        cursor.execute("""
-            SELECT e.*, c.nombre as cliente_nombre, c.telefono, u.email
-            FROM eventos e
-            JOIN clientes c ON e.id_cliente = c.id_cliente
-            JOIN users u ON c.user_id = u.id
-            ORDER BY e.fecha_evento DESC
-        """)
-        
-        columns = [desc[0] for desc in cursor.description]
-        eventos = []
-        
-        for row in cursor.fetchall():
-            evento = dict(zip(columns, row))
-            evento = serialize_database_row(evento)
-            
-            # Obtener detalles del evento
-            cursor.execute("""
-                SELECT de.*, a.nombre_articulo, a.tipo
-                FROM detalle_evento de
-                JOIN articulos a ON de.id_articulo = a.id_articulo
-                WHERE de.id_evento = %s
-            """, (evento['id_evento'],))
+        limit = get_page_limit()
+        cursor_valores = decode_cursor(request.args.get('cursor'))
+        since = parse_since(request.args)
+        fecha_desde = parse_fecha_filtro(request.args, 'fecha_desde')
+        fecha_hasta = parse_fecha_filtro(request.args, 'fecha_hasta')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        condiciones = []
+        params = []
+        
+        if request.args.get('estado'):
+            condiciones.append("e.estado = %s")
+            params.append(request.args.get('estado'))
+        if fecha_desde:
+            condiciones.append("e.fecha_evento >= %s")
+            params.append(fecha_desde)
+        if fecha_hasta:
+            condiciones.append("e.fecha_evento <= %s")
+            params.append(fecha_hasta)
+        if request.args.get('id_cliente'):
+            condiciones.append("e.id_cliente = %s")
+            params.append(request.args.get('id_cliente', type=int))
+        if request.args.get('id_evento'):
+            # Evento recién avisado por /api/admin/stream: puede no haber llegado a la réplica
+            g.solo_lectura = False
+            condiciones.append("e.id_evento = %s")
+            params.append(request.args.get('id_evento', type=int))
+        
+        cursor = cursor_json()
+        if since and cursor_vencido(cursor.connection, since):
+            return respuesta_resincronizar()
+        nuevo_cursor = sync_cursor(cursor.connection)
+        
+        if since:
+            # Todos los eventos cambiados; los que ya no cumplen los filtros se informan como eliminados
+            cursor.execute(f"""
+                SELECT {COLUMNAS_EVENTO}, c.nombre as cliente_nombre, c.telefono, u.email,
+                       ({' AND '.join(condiciones) or 'TRUE'}) AS visible
+                FROM eventos e
+                JOIN clientes c ON e.id_cliente = c.id_cliente
+                JOIN users u ON c.user_id = u.id
+                WHERE e.cambio >= %s::xid8
+                ORDER BY e.fecha_evento DESC, e.id_evento DESC
+            """, params + [since])
             
-            detalle_columns = [desc[0] for desc in cursor.description]
-            detalles = []
+            cambiados = cursor.fetchall()
+            eventos = [evento for evento in cambiados if evento['visible']]
+            eliminados = [evento['id_evento'] for evento in cambiados if not evento['visible']]
+            eliminados += ids_borrados(cursor.connection, 'eventos', since)
+            for evento in cambiados:
+                del evento['visible']
             
-            for detalle_row in cursor.fetchall():
-                detalle = dict(zip(detalle_columns, detalle_row))
-                detalle = serialize_database_row(detalle)
-                detalles.append(detalle)
+            cargar_detalles_eventos(cursor, eventos)
             
-            evento['detalles'] = detalles
-            eventos.append(evento)
+            return respuesta_json({
+                'success': True,
+                'eventos': eventos,
+                'eliminados': eliminados,
+                'sync_cursor': nuevo_cursor
+            })
         
-        return jsonify({
+        if cursor_valores:
+            condiciones.append("(e.fecha_evento, e.id_evento) < (%s, %s)")
+            params.extend(cursor_valores)
+        
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        params.append(limit + 1)
+        
+        cursor.execute(sql_pagina_eventos(where), params)
+        
+        eventos = cursor.fetchall()
+        
+        eventos, next_cursor = build_page(eventos, limit, lambda e: (e['fecha_evento'], e['id_evento']))
+        
+        # Obtener detalles de todos los eventos en una sola consulta
+        cargar_detalles_eventos(cursor, eventos)
+        
+        return respuesta_json({
             'success': True,
-            'eventos': eventos
+            'eventos': eventos,
+            'next_cursor': next_cursor,
+            'sync_cursor': nuevo_cursor
         })
         
     except Exception as e:
@@ -900,6 +2400,185 @@ def get_admin_eventos():
             'message': 'Error obteniendo eventos'
         }), 500
 
+# EXPORTAR TODOS LOS EVENTOS (STREAMING)
+@app.route('/api/admin/eventos/export', methods=['GET'])
+def exportar_eventos():
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+    
+    formato = request.args.get('formato', 'ndjson')
+    if formato not in ('ndjson', 'json'):
+        return jsonify({'success': False, 'message': 'Formato inválido (ndjson o json)'}), 400
+    
+    itersize = request.args.get('itersize', EXPORT_ITERSIZE, type=int)
+    itersize = max(1, min(itersize or EXPORT_ITERSIZE, 50000))
+    
+    def generar():
+        connection = db.session.connection().connection
+        # Cursor con nombre: las filas se quedan en el servidor y llegan por lotes
+        server_cursor = connection.cursor(name='export_eventos', row_factory=filas_json)
+        detalle_cursor = connection.cursor()
+        primero = True
+        
+        try:
+            server_cursor.itersize = itersize
+            server_cursor.execute(f"""
+                SELECT {COLUMNAS_EVENTO}, c.nombre as cliente_nombre, c.telefono, u.email
+                FROM eventos e
+                JOIN clientes c ON e.id_cliente = c.id_cliente
+                JOIN users u ON c.user_id = u.id
+                ORDER BY e.id_evento
+            """)
+            
+            if formato == 'json':
+                yield '['
+            
+            while True:
+                eventos = server_cursor.fetchmany(itersize)
+                if not eventos:
+                    break
+                
+                cargar_detalles_eventos(detalle_cursor, eventos)
+                
+                lineas = []
+                for evento in eventos:
+                    linea = json.dumps(evento, default=str, ensure_ascii=False)
+                    if formato == 'json':
+                        lineas.append(linea if primero else ',' + linea)
+                    else:
+                        lineas.append(linea + '\n')
+                    primero = False
+                yield ''.join(lineas)
+            
+            if formato == 'json':
+                yield ']'
+        finally:
+            server_cursor.close()
+            detalle_cursor.close()
+            db.session.rollback()
+    
+    mimetype = 'application/x-ndjson' if formato == 'ndjson' else 'application/json'
+    extension = 'ndjson' if formato == 'ndjson' else 'json'
+    response = Response(stream_with_context(generar()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=eventos_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    return response
+
+# EXPORTAR COMPROBANTES PDF EN LOTE (ZIP)
+@app.route('/api/admin/comprobantes', methods=['POST'])
+def exportar_comprobantes():
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    fecha_desde = data.get('fecha_desde')
+    fecha_hasta = data.get('fecha_hasta')
+    
+    if not ids and not (fecha_desde and fecha_hasta):
+        return jsonify({
+            'success': False,
+            'message': 'Indique una lista de ids o fecha_desde y fecha_hasta'
+        }), 400
+    
+    try:
+        if ids:
+            # Un string se recorrería carácter por carácter; True pasaría como 1 y 1.5 como 1
+            if not isinstance(ids, list) or any(
+                isinstance(i, bool) or (isinstance(i, float) and not i.is_integer()) for i in ids
+            ):
+                raise ValueError
+            ids = [int(i) for i in ids]
+            if not all(0 < i < 2 ** 31 for i in ids):
+                raise ValueError
+        else:
+            fecha_desde = date.fromisoformat(fecha_desde)
+            fecha_hasta = date.fromisoformat(fecha_hasta)
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({
+            'success': False,
+            'message': 'ids debe ser una lista de ids de evento y las fechas tener el formato AAAA-MM-DD'
+        }), 400
+    
+    try:
+        cursor = cursor_json()
+        if ids:
+            cursor.execute(f"""
+                SELECT {COLUMNAS_EVENTO}, c.nombre, c.telefono, u.email
+                FROM eventos e
+                JOIN clientes c ON e.id_cliente = c.id_cliente
+                JOIN users u ON c.user_id = u.id
+                WHERE e.id_evento = ANY(%s)
+                ORDER BY e.id_evento
+                LIMIT %s
+            """, (ids, PDF_BULK_MAX + 1))
+        else:
+            cursor.execute(f"""
+                SELECT {COLUMNAS_EVENTO}, c.nombre, c.telefono, u.email
+                FROM eventos e
+                JOIN clientes c ON e.id_cliente = c.id_cliente
+                JOIN users u ON c.user_id = u.id
+                WHERE e.fecha_evento >= %s AND e.fecha_evento <= %s
+                ORDER BY e.id_evento
+                LIMIT %s
+            """, (fecha_desde, fecha_hasta, PDF_BULK_MAX + 1))
+        
+        eventos = cursor.fetchall()
+        
+        if len(eventos) > PDF_BULK_MAX:
+            return jsonify({
+                'success': False,
+                'message': f'Demasiados eventos (máximo {PDF_BULK_MAX} por exportación)'
+            }), 400
+        
+        if not eventos:
+            return jsonify({'success': False, 'message': 'No hay eventos para exportar'}), 404
+        
+        cargar_detalles_eventos(cursor, eventos)
+        
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Lista de ids inválida'}), 400
+        
+    except Exception as e:
+        print(f"Error preparando comprobantes: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error preparando comprobantes'}), 500
+    
+    def generar():
+        executor = get_pdf_executor()
+        stream = _ZipStream()
+        futures = {
+            executor.submit(construir_pdf_evento, evento, evento['detalles']): evento['id_evento']
+            for evento in eventos
+        }
+        
+        with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_STORED) as archivo_zip:
+            # Cada PDF se envía en cuanto termina, sin esperar al resto
+            for future in as_completed(futures):
+                evento_id = futures[future]
+                try:
+                    archivo_zip.writestr(f'evento_{evento_id}.pdf', future.result())
+                except Exception as e:
+                    print(f"Error generando PDF del evento {evento_id}: {str(e)}")
+                    archivo_zip.writestr(f'evento_{evento_id}_error.txt', str(e))
+                yield stream.vaciar()
+        
+        yield stream.vaciar()
+    
+    response = Response(generar(), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename=comprobantes_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+    return response
+
+# ESTADO DEL POOL DE CONEXIONES
+@app.route('/api/admin/pool', methods=['GET'])
+def get_pool_admin():
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+    
+    return jsonify({
+        'success': True,
+        'pool': get_pool_metricas(),
+        'replica': get_estado_replica()
+    })
+
 # MARCAR EVENTO COMO EMBODEGADO
 @app.route('/api/admin/eventos/<int:evento_id>/embodeagar', methods=['POST'])
 def marcar_embodegado(evento_id):
@@ -909,23 +2588,12 @@ def marcar_embodegado(evento_id):
     try:
         cursor = db.session.connection().connection.cursor()
         
-        # Obtener detalles del evento
+        # Restituir stock: liberar las reservas del evento
         cursor.execute("""
-            SELECT de.id_articulo, de.cantidad
-            FROM detalle_evento de
-            WHERE de.id_evento = %s
+            DELETE FROM reservas_articulo
+            WHERE id_evento = %s
         """, (evento_id,))
         
-        detalles = cursor.fetchall()
-        
-        # Restituir stock de artículos
-        for id_articulo, cantidad in detalles:
-            cursor.execute("""
-                UPDATE articulos 
-                SET cantidad_total = cantidad_total + %s
-                WHERE id_articulo = %s
-            """, (cantidad, id_articulo))
-        
         # Actualizar estado del evento
         cursor.execute("""
             UPDATE eventos 
@@ -933,7 +2601,10 @@ def marcar_embodegado(evento_id):
             WHERE id_evento = %s
         """, (evento_id,))
         
+        version_catalogo = invalidar_catalogo(cursor)
+        notificar_admin(cursor, 'evento_actualizado', {'id_evento': evento_id, 'estado': 'completado'})
         db.session.commit()
+        catalogo_confirmado(version_catalogo)
         
         return jsonify({
             'success': True,
@@ -952,22 +2623,22 @@ def get_fechas_ocupadas():
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
     
     try:
-        cursor = db.session.connection().connection.cursor()
-        cursor.execute("""
-            SELECT fecha_evento, COUNT(*) as eventos_dia
-            FROM eventos 
-            WHERE estado IN ('reservado', 'confirmado')
-            GROUP BY fecha_evento
-        """)
-        
-        fechas_ocupadas = []
-        for fecha, count in cursor.fetchall():
-            fechas_ocupadas.append({
-                'fecha': str(fecha),
-                'eventos': count
-            })
+        # Sin mes ni rango: el próximo año (los cierres semanales no tienen fin)
+        if request.args.get('mes') or request.args.get('fecha_desde') or request.args.get('fecha'):
+            desde, hasta = parse_periodo_ocupacion(request.args)
+        else:
+            desde = date.today()
+            hasta = desde + timedelta(days=OCUPACION_MAX_DIAS - 1)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        fechas_ocupadas = [
+            {'fecha': dia['fecha'], 'eventos': dia['eventos'], 'bloqueado': dia['bloqueado']}
+            for dia in consultar_ocupacion(desde, hasta)
+        ]
         
-        return jsonify({
+        return respuesta_json({
             'success': True,
             'fechas': fechas_ocupadas
         })
@@ -976,34 +2647,85 @@ def get_fechas_ocupadas():
         print(f"Error obteniendo fechas ocupadas: {str(e)}")
         return jsonify({'success': False, 'message': 'Error obteniendo fechas'}), 500
 
-# BLOQUEAR/DESBLOQUEAR FECHA
+# BLOQUEAR/DESBLOQUEAR FECHAS
+# Bloquear: una sentencia que fusiona el rango con los bloqueos solapados o contiguos
+BLOQUEAR_FECHAS_SQL = """
+    WITH nuevo AS (
+        SELECT daterange(%(desde)s::date, COALESCE(%(hasta)s::date, 'infinity'), '[]') AS periodo
+    ),
+    fusionados AS (
+        DELETE FROM fechas_bloqueadas b
+        USING nuevo n
+        WHERE COALESCE(b.dia_semana, -1) = COALESCE(%(dia_semana)s::smallint, -1)
+          AND (b.periodo && n.periodo OR b.periodo -|- n.periodo)
+        RETURNING b.periodo, b.motivo
+    )
+    INSERT INTO fechas_bloqueadas (periodo, dia_semana, motivo)
+    SELECT daterange(MIN(lower(p.periodo)), MAX(upper(p.periodo))),
+           %(dia_semana)s::smallint,
+           COALESCE(%(motivo)s, MAX(p.motivo))
+    FROM (
+        SELECT periodo, NULL::varchar AS motivo FROM nuevo
+        UNION ALL
+        SELECT periodo, motivo FROM fusionados
+    ) p
+"""
+
+# Desbloquear: una sentencia que recorta los bloqueos afectados y conserva lo que queda fuera del rango
+DESBLOQUEAR_FECHAS_SQL = """
+    WITH quitar AS (
+        SELECT daterange(%(desde)s::date, COALESCE(%(hasta)s::date, 'infinity'), '[]') AS periodo
+    ),
+    afectados AS (
+        DELETE FROM fechas_bloqueadas b
+        USING quitar q
+        WHERE b.periodo && q.periodo
+          AND (%(dia_semana)s::smallint IS NULL OR b.dia_semana = %(dia_semana)s::smallint)
+        RETURNING b.periodo, b.dia_semana, b.motivo
+    )
+    INSERT INTO fechas_bloqueadas (periodo, dia_semana, motivo)
+    SELECT r.resto, a.dia_semana, a.motivo
+    FROM afectados a
+    CROSS JOIN quitar q
+    CROSS JOIN LATERAL (VALUES
+        (a.periodo * daterange(NULL, lower(q.periodo))),
+        (a.periodo * daterange(upper(q.periodo), NULL))
+    ) AS r(resto)
+    WHERE NOT isempty(r.resto)
+"""
+
+def parse_bloqueo(data):
+    """Validar fecha/fecha_desde, fecha_hasta, sin_fin y dia_semana del cuerpo de la petición"""
+    try:
+        desde = date.fromisoformat(data.get('fecha_desde') or data.get('fecha') or '')
+        hasta = None if data.get('sin_fin') else date.fromisoformat(data.get('fecha_hasta') or desde.isoformat())
+    except ValueError:
+        raise ValueError('Fecha inválida, use el formato AAAA-MM-DD')
+    if hasta is not None and hasta < desde:
+        raise ValueError('fecha_hasta no puede ser anterior a fecha_desde')
+    
+    dia_semana = data.get('dia_semana')
+    if dia_semana is not None:
+        if not isinstance(dia_semana, int) or not 0 <= dia_semana <= 6:
+            raise ValueError('dia_semana debe ser un número de 0 (domingo) a 6 (sábado)')
+    return {'desde': desde, 'hasta': hasta, 'dia_semana': dia_semana, 'motivo': data.get('motivo')}
+
 @app.route('/api/admin/bloquear-fecha', methods=['POST'])
 def bloquear_fecha():
+    """Bloquear o desbloquear un día, un rango (fecha_desde/fecha_hasta) o un cierre semanal (dia_semana)"""
     if 'user' not in session or not session.get('is_admin'):
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
     
+    data = request.get_json() or {}
+    bloquear = data.get('bloquear', True)
+    try:
+        params = parse_bloqueo(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
     try:
-        data = request.get_json()
-        fecha = data.get('fecha')
-        bloquear = data.get('bloquear', True)
-        
-        # Aquí podrías crear una tabla de fechas bloqueadas
-        # Por simplicidad, usaremos un evento especial con cliente_id NULL
         cursor = db.session.connection().connection.cursor()
-        
-        if bloquear:
-            # Crear evento de bloqueo
-            cursor.execute("""
-                INSERT INTO eventos (id_cliente, fecha_evento, estado, monto_total)
-                VALUES (NULL, %s, 'bloqueado', 0)
-            """, (fecha,))
-        else:
-            # Eliminar eventos de bloqueo
-            cursor.execute("""
-                DELETE FROM eventos 
-                WHERE fecha_evento = %s AND estado = 'bloqueado' AND id_cliente IS NULL
-            """, (fecha,))
-        
+        cursor.execute(BLOQUEAR_FECHAS_SQL if bloquear else DESBLOQUEAR_FECHAS_SQL, params)
         db.session.commit()
         
         return jsonify({
@@ -1016,6 +2738,38 @@ def bloquear_fecha():
         print(f"Error bloqueando fecha: {str(e)}")
         return jsonify({'success': False, 'message': 'Error procesando solicitud'}), 500
 
+@app.route('/api/admin/fechas-bloqueadas', methods=['GET'])
+def get_fechas_bloqueadas():
+    """Bloqueos que tocan el mes o rango pedido (fecha_hasta null: cierre sin fin)"""
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+    
+    try:
+        desde, hasta = parse_periodo_ocupacion(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        cursor = cursor_json()
+        cursor.execute("""
+            SELECT id_bloqueo,
+                   lower(periodo) AS fecha_desde,
+                   CASE WHEN upper(periodo) = 'infinity' THEN NULL ELSE upper(periodo) - 1 END AS fecha_hasta,
+                   dia_semana, motivo, creado_en
+            FROM fechas_bloqueadas
+            WHERE periodo && daterange(%s, %s, '[]')
+            ORDER BY lower(periodo), dia_semana NULLS FIRST
+        """, (desde, hasta))
+        
+        return respuesta_json({
+            'success': True,
+            'bloqueos': cursor.fetchall()
+        })
+        
+    except Exception as e:
+        print(f"Error obteniendo fechas bloqueadas: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error obteniendo fechas bloqueadas'}), 500
+
 # GESTIÓN DE STOCK
 @app.route('/api/admin/stock', methods=['GET'])
 def get_stock_admin():
@@ -1023,8 +2777,16 @@ def get_stock_admin():
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
     
     try:
-        cursor = db.session.connection().connection.cursor()
-        cursor.execute("""
+        since = parse_since(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        cursor = cursor_json()
+        if since and cursor_vencido(cursor.connection, since):
+            return respuesta_resincronizar()
+        nuevo_cursor = sync_cursor(cursor.connection)
+        cursor.execute(f"""
             SELECT id_articulo, nombre_articulo, tipo, cantidad_total, precio_unitario,
                    CASE 
                        WHEN cantidad_total < 10 THEN 'bajo'
@@ -1032,21 +2794,21 @@ def get_stock_admin():
                        ELSE 'alto'
                    END as nivel_stock
             FROM articulos
+            {'WHERE cambio >= %s::xid8' if since else ''}
             ORDER BY cantidad_total ASC
-        """)
+        """, (since,) if since else None)
         
-        columns = [desc[0] for desc in cursor.description]
-        articulos = []
+        articulos = cursor.fetchall()
         
-        for row in cursor.fetchall():
-            articulo = dict(zip(columns, row))
-            articulo = serialize_database_row(articulo)
-            articulos.append(articulo)
-        
-        return jsonify({
+        respuesta = {
             'success': True,
-            'articulos': articulos
-        })
+            'articulos': articulos,
+            'sync_cursor': nuevo_cursor
+        }
+        if since:
+            respuesta['eliminados'] = ids_borrados(cursor.connection, 'articulos', since)
+        
+        return respuesta_json(respuesta)
         
     except Exception as e:
         print(f"Error obteniendo stock: {str(e)}")
@@ -1069,7 +2831,10 @@ def actualizar_stock(articulo_id):
             WHERE id_articulo = %s
         """, (nueva_cantidad, articulo_id))
         
+        version_catalogo = invalidar_catalogo(cursor)
+        notificar_admin(cursor, 'stock', {'id_articulo': articulo_id, 'cantidad_total': nueva_cantidad})
         db.session.commit()
+        catalogo_confirmado(version_catalogo)
         
         return jsonify({
             'success': True,
@@ -1081,36 +2846,262 @@ def actualizar_stock(articulo_id):
         print(f"Error actualizando stock: {str(e)}")
         return jsonify({'success': False, 'message': 'Error actualizando stock'}), 500
 
+# Clave donde csv.DictReader deja los valores de más en filas con más campos que el encabezado
+CSV_CAMPOS_SOBRANTES = '_sobrantes'
+
+def leer_lote_stock():
+    """Leer las filas del lote como [(fila, datos)] desde JSON o CSV.
+    
+    JSON: lista (o {'articulos': lista}) de objetos. CSV: archivo en el campo
+    'archivo' o cuerpo text/csv, con encabezado id_articulo,cantidad,precio_unitario
+    separado por coma o punto y coma. 'fila' es la línea del CSV o la posición en la lista.
+    """
+    archivo = request.files.get('archivo')
+    if archivo is not None or request.mimetype == 'text/csv':
+        try:
+            texto = archivo.read().decode('utf-8-sig') if archivo is not None else request.get_data().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ValueError('El CSV debe estar en UTF-8')
+        
+        primera_linea = texto.split('\n', 1)[0]
+        lector = csv.DictReader(
+            io.StringIO(texto),
+            delimiter=';' if primera_linea.count(';') > primera_linea.count(',') else ',',
+            restkey=CSV_CAMPOS_SOBRANTES
+        )
+        if not lector.fieldnames or 'id_articulo' not in [campo.strip() for campo in lector.fieldnames]:
+            raise ValueError('El CSV debe tener encabezado id_articulo,cantidad,precio_unitario')
+        
+        filas = []
+        for datos in lector:
+            # Un separador al final de la línea deja un campo vacío de más: se ignora;
+            # valores de verdad en columnas sin encabezado marcan la fila como mal formada
+            sobrantes = [valor.strip() for valor in datos.pop(CSV_CAMPOS_SOBRANTES, []) if valor.strip()]
+            fila = {(clave or '').strip(): (valor or '').strip() for clave, valor in datos.items()}
+            if sobrantes:
+                fila[CSV_CAMPOS_SOBRANTES] = sobrantes
+            filas.append((lector.line_num, fila))
+        return filas
+    
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('articulos')
+    if not isinstance(data, list):
+        raise ValueError('Se esperaba una lista de artículos o un archivo CSV')
+    return list(enumerate(data, start=1))
+
+def validar_fila_stock(datos):
+    """Devolver (id_articulo, cantidad, precio_unitario); cantidad o precio pueden ser None"""
+    if not isinstance(datos, dict):
+        raise ValueError('Fila inválida')
+    if datos.get(CSV_CAMPOS_SOBRANTES):
+        raise ValueError('La fila tiene más columnas que el encabezado')
+    
+    def valor(campo):
+        v = datos.get(campo)
+        return None if v is None or v == '' else v
+    
+    def entero(v, mensaje):
+        # int() acepta True y trunca 2.7: en JSON solo valen enteros (o 5.0) y en CSV dígitos
+        if isinstance(v, bool) or (isinstance(v, float) and not v.is_integer()):
+            raise ValueError(mensaje)
+        try:
+            return int(v)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(mensaje)
+    
+    id_articulo = entero(valor('id_articulo'), 'id_articulo inválido')
+    if not 0 < id_articulo < 2 ** 31:
+        raise ValueError('id_articulo inválido')
+    
+    cantidad = valor('cantidad')
+    if cantidad is not None:
+        cantidad = entero(cantidad, 'cantidad inválida')
+        if cantidad < 0:
+            raise ValueError('La cantidad no puede ser negativa')
+        if cantidad >= 2 ** 31:
+            raise ValueError('cantidad inválida')
+    
+    precio = valor('precio_unitario')
+    if precio is not None:
+        try:
+            precio = Decimal(str(precio).replace(',', '.')).quantize(Decimal('0.01'))
+        except ArithmeticError:
+            raise ValueError('precio_unitario inválido')
+        # NUMERIC(10, 2): hasta 8 dígitos enteros
+        if not precio.is_finite() or not 0 <= precio < 10 ** 8:
+            raise ValueError('precio_unitario inválido')
+    
+    if cantidad is None and precio is None:
+        raise ValueError('Indique cantidad o precio_unitario')
+    return id_articulo, cantidad, precio
+
+# AJUSTE DE STOCK POR LOTE (JSON O CSV)
+@app.route('/api/admin/stock/lote', methods=['POST'])
+def actualizar_stock_lote():
+    """Aplicar un conteo de inventario en una sola transacción.
+    
+    Las filas válidas se cargan con COPY en una tabla temporal y se aplican con un
+    único UPDATE ... FROM; el catálogo se invalida una vez. Devuelve el resultado
+    de cada fila.
+    """
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+    
+    try:
+        filas = leer_lote_stock()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if not filas:
+        return jsonify({'success': False, 'message': 'El lote está vacío'}), 400
+    if len(filas) > STOCK_LOTE_MAX:
+        return jsonify({'success': False, 'message': f'Máximo {STOCK_LOTE_MAX} filas por lote'}), 400
+    
+    resultados = {}
+    validas = []
+    vistos = {}
+    for fila, datos in filas:
+        try:
+            id_articulo, cantidad, precio = validar_fila_stock(datos)
+        except ValueError as e:
+            resultados[fila] = {'fila': fila, 'id_articulo': datos.get('id_articulo') if isinstance(datos, dict) else None,
+                                'estado': 'error', 'mensaje': str(e)}
+            continue
+        if id_articulo in vistos:
+            resultados[fila] = {'fila': fila, 'id_articulo': id_articulo, 'estado': 'error',
+                                'mensaje': f'Artículo repetido en el lote (fila {vistos[id_articulo]})'}
+            continue
+        vistos[id_articulo] = fila
+        validas.append((fila, id_articulo, cantidad, precio))
+    
+    actualizados = 0
+    try:
+        if validas:
+            cursor = db.session.connection().connection.cursor()
+            cursor.execute("""
+                CREATE TEMP TABLE stock_lote (
+                    fila INTEGER NOT NULL,
+                    id_articulo INTEGER NOT NULL,
+                    cantidad INTEGER,
+                    precio_unitario NUMERIC(10, 2)
+                ) ON COMMIT DROP
+            """)
+            with cursor.copy("COPY stock_lote (fila, id_articulo, cantidad, precio_unitario) FROM STDIN") as copy:
+                for fila in validas:
+                    copy.write_row(fila)
+            
+            cursor.execute("""
+                WITH aplicados AS (
+                    UPDATE articulos a
+                    SET cantidad_total = COALESCE(l.cantidad, a.cantidad_total),
+                        precio_unitario = COALESCE(l.precio_unitario, a.precio_unitario)
+                    FROM stock_lote l
+                    WHERE a.id_articulo = l.id_articulo
+                    RETURNING a.id_articulo, a.cantidad_total, a.precio_unitario
+                )
+                SELECT l.fila, l.id_articulo, ap.cantidad_total, ap.precio_unitario
+                FROM stock_lote l
+                LEFT JOIN aplicados ap ON ap.id_articulo = l.id_articulo
+            """)
+            
+            for fila, id_articulo, cantidad_total, precio_unitario in cursor.fetchall():
+                if cantidad_total is None:
+                    resultados[fila] = {'fila': fila, 'id_articulo': id_articulo, 'estado': 'error',
+                                        'mensaje': 'Artículo no encontrado'}
+                else:
+                    actualizados += 1
+                    resultados[fila] = {'fila': fila, 'id_articulo': id_articulo, 'estado': 'actualizado',
+                                        'cantidad_total': cantidad_total, 'precio_unitario': float(precio_unitario)}
+            
+            if actualizados:
+                version_catalogo = invalidar_catalogo(cursor)
+                notificar_admin(cursor, 'stock_lote', {'actualizados': actualizados})
+            db.session.commit()
+            if actualizados:
+                catalogo_confirmado(version_catalogo)
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error actualizando stock por lote: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error actualizando stock'}), 500
+    
+    reporte = [resultados[fila] for fila, _ in filas]
+    
+    return jsonify({
+        'success': True,
+        'message': f'{actualizados} de {len(reporte)} artículos actualizados',
+        'actualizados': actualizados,
+        'errores': len(reporte) - actualizados,
+        'resultados': reporte
+    })
+
 # GESTIÓN DE CLIENTES PARA ADMIN
 @app.route('/api/admin/clientes', methods=['GET'])
+@solo_lectura
 def get_admin_clientes():
     if 'user' not in session or not session.get('is_admin'):
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
     
     try:
-        cursor = db.session.connection().connection.cursor()
-        cursor.execute("""
-            SELECT c.*, u.username, u.email, u.created_at as fecha_registro,
-                   COUNT(e.id_evento) as total_eventos,
-                   COALESCE(SUM(e.monto_total), 0) as total_gastado
-            FROM clientes c
-            JOIN users u ON c.user_id = u.id
-            LEFT JOIN eventos e ON c.id_cliente = e.id_cliente
-            GROUP BY c.id_cliente, u.id
-            ORDER BY u.created_at DESC
-        """)
-        
-        columns = [desc[0] for desc in cursor.description]
-        clientes = []
-        
-        for row in cursor.fetchall():
-            cliente = dict(zip(columns, row))
-            cliente = serialize_database_row(cliente)
-            clientes.append(cliente)
-        
-        return jsonify({
+        limit = get_page_limit()
+        cursor_valores = decode_cursor(request.args.get('cursor'))
+        fecha_desde = parse_fecha_filtro(request.args, 'fecha_desde')
+        fecha_hasta = parse_fecha_filtro(request.args, 'fecha_hasta')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        condiciones = []
+        params = []
+        
+        if cursor_valores:
+            condiciones.append("(u.created_at, c.id_cliente) < (%s, %s)")
+            params.extend(cursor_valores)
+        if fecha_desde:
+            condiciones.append("u.created_at >= %s")
+            params.append(fecha_desde)
+        if fecha_hasta:
+            condiciones.append("u.created_at < %s::date + 1")
+            params.append(fecha_hasta)
+        if request.args.get('id_cliente'):
+            condiciones.append("c.id_cliente = %s")
+            params.append(request.args.get('id_cliente', type=int))
+        
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        params.append(limit + 1)
+        
+        cursor = cursor_json()
+        # Primero la página de clientes (recorre idx_users_created_at_id) y solo
+        # después los totales de eventos de esas filas
+        cursor.execute(f"""
+            SELECT p.*,
+                   t.total_eventos,
+                   COALESCE(t.total_gastado, 0) as total_gastado
+            FROM (
+                SELECT c.*, u.username, u.email, u.created_at as fecha_registro
+                FROM clientes c
+                JOIN users u ON c.user_id = u.id
+                {where}
+                ORDER BY u.created_at DESC, c.id_cliente DESC
+                LIMIT %s
+            ) p
+            CROSS JOIN LATERAL (
+                SELECT COUNT(*) as total_eventos, SUM(e.monto_total) as total_gastado
+                FROM eventos e
+                WHERE e.id_cliente = p.id_cliente
+            ) t
+            ORDER BY p.fecha_registro DESC, p.id_cliente DESC
+        """, params)
+        
+        clientes = cursor.fetchall()
+        
+        clientes, next_cursor = build_page(clientes, limit, lambda c: (c['fecha_registro'], c['id_cliente']))
+        
+        return respuesta_json({
             'success': True,
-            'clientes': clientes
+            'clientes': clientes,
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
@@ -1118,51 +3109,54 @@ def get_admin_clientes():
         return jsonify({'success': False, 'message': 'Error obteniendo clientes'}), 500
 
 # GRÁFICOS Y MÉTRICAS
+# Eventos e ingresos por mes (últimos 6 meses): rango sobre fecha_evento, agrupado con
+# date_trunc, para usar idx_eventos_fecha_id / idx_eventos_estado_fecha
+GRAFICOS_EVENTOS_MES_SQL = """
+    SELECT date_trunc('month', fecha_evento)::date AS mes_inicio, COUNT(*) as total
+    FROM eventos 
+    WHERE fecha_evento >= (CURRENT_DATE - INTERVAL '6 months')::date
+    GROUP BY mes_inicio
+    ORDER BY mes_inicio
+"""
+
+GRAFICOS_ARTICULOS_POPULARES_SQL = """
+    SELECT a.nombre_articulo, SUM(de.cantidad) as total_usado
+    FROM detalle_evento de
+    JOIN articulos a ON de.id_articulo = a.id_articulo
+    GROUP BY a.id_articulo, a.nombre_articulo
+    ORDER BY total_usado DESC
+    LIMIT 5
+"""
+
+GRAFICOS_INGRESOS_MES_SQL = """
+    SELECT date_trunc('month', fecha_evento)::date AS mes_inicio, SUM(monto_total) as ingresos
+    FROM eventos 
+    WHERE estado IN ('confirmado', 'completado')
+    AND fecha_evento >= (CURRENT_DATE - INTERVAL '6 months')::date
+    GROUP BY mes_inicio
+    ORDER BY mes_inicio
+"""
+
 @app.route('/api/admin/graficos', methods=['GET'])
+@solo_lectura
 def get_admin_graficos():
     if 'user' not in session or not session.get('is_admin'):
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
     
     try:
-        cursor = db.session.connection().connection.cursor()
+        cursor = get_conexion().cursor()
         
         # Eventos por mes (últimos 6 meses)
-        cursor.execute("""
-            SELECT 
-                EXTRACT(MONTH FROM fecha_evento) as mes,
-                EXTRACT(YEAR FROM fecha_evento) as anio,
-                COUNT(*) as total
-            FROM eventos 
-            WHERE fecha_evento >= CURRENT_DATE - INTERVAL '6 months'
-            GROUP BY EXTRACT(YEAR FROM fecha_evento), EXTRACT(MONTH FROM fecha_evento)
-            ORDER BY anio, mes
-        """)
-        eventos_por_mes = [{'mes': int(row[0]), 'anio': int(row[1]), 'total': row[2]} for row in cursor.fetchall()]
+        cursor.execute(GRAFICOS_EVENTOS_MES_SQL)
+        eventos_por_mes = [{'mes': row[0].month, 'anio': row[0].year, 'total': row[1]} for row in cursor.fetchall()]
         
         # Artículos más usados
-        cursor.execute("""
-            SELECT a.nombre_articulo, SUM(de.cantidad) as total_usado
-            FROM detalle_evento de
-            JOIN articulos a ON de.id_articulo = a.id_articulo
-            GROUP BY a.id_articulo, a.nombre_articulo
-            ORDER BY total_usado DESC
-            LIMIT 5
-        """)
+        cursor.execute(GRAFICOS_ARTICULOS_POPULARES_SQL)
         articulos_populares = [{'nombre': row[0], 'cantidad': row[1]} for row in cursor.fetchall()]
         
         # Ingresos por mes
-        cursor.execute("""
-            SELECT 
-                EXTRACT(MONTH FROM fecha_evento) as mes,
-                EXTRACT(YEAR FROM fecha_evento) as anio,
-                SUM(monto_total) as ingresos
-            FROM eventos 
-            WHERE estado IN ('confirmado', 'completado')
-            AND fecha_evento >= CURRENT_DATE - INTERVAL '6 months'
-            GROUP BY EXTRACT(YEAR FROM fecha_evento), EXTRACT(MONTH FROM fecha_evento)
-            ORDER BY anio, mes
-        """)
-        ingresos_por_mes = [{'mes': int(row[0]), 'anio': int(row[1]), 'ingresos': float(row[2] or 0)} for row in cursor.fetchall()]
+        cursor.execute(GRAFICOS_INGRESOS_MES_SQL)
+        ingresos_por_mes = [{'mes': row[0].month, 'anio': row[0].year, 'ingresos': float(row[1] or 0)} for row in cursor.fetchall()]
         
         return jsonify({
             'success': True,
@@ -1177,30 +3171,125 @@ def get_admin_graficos():
         print(f"Error obteniendo gráficos: {str(e)}")
         return jsonify({'success': False, 'message': 'Error obteniendo gráficos'}), 500
 
-# APARTAR STOCK CUANDO SE CREA EVENTO (Modificar la función create_evento existente)
-def apartar_stock_evento(evento_id, servicios_articulos):
-    """Apartar stock cuando se crea un evento"""
-    try:
-        cursor = db.session.connection().connection.cursor()
-        
-        for item in servicios_articulos:
-            if item.get('tipo') == 'articulo':
-                # Reducir stock disponible
-                cursor.execute("""
-                    UPDATE articulos 
-                    SET cantidad_total = cantidad_total - %s
-                    WHERE id_articulo = %s AND cantidad_total >= %s
-                """, (item['cantidad'], item['id_articulo'], item['cantidad']))
-                
-                # Verificar si se pudo apartar
-                if cursor.rowcount == 0:
-                    raise Exception(f"Stock insuficiente para {item['nombre']}")
-        
-        return True
-        
-    except Exception as e:
-        print(f"Error apartando stock: {str(e)}")
-        raise e
+# APARTAR STOCK CUANDO SE CREA EVENTO
+def validar_servicios_evento(servicios):
+    """Comprobar el carrito de un evento; devuelve las líneas con cantidad entera positiva"""
+    if not isinstance(servicios, list):
+        raise ValueError('servicios debe ser una lista')
+    
+    validados = []
+    for servicio in servicios:
+        if not isinstance(servicio, dict):
+            raise ValueError('Línea de servicio inválida')
+        cantidad = servicio.get('cantidad', 1)
+        nombre = servicio.get('nombre') or servicio.get('id_articulo')
+        # int() aceptaría True o truncaría 2.5
+        if isinstance(cantidad, bool) or not isinstance(cantidad, (int, float)) or \
+                (isinstance(cantidad, float) and not cantidad.is_integer()):
+            raise ValueError(f'Cantidad inválida para {nombre}: debe ser un número entero')
+        if not 0 < cantidad < 2 ** 31:
+            raise ValueError(f'Cantidad inválida para {nombre}: debe ser mayor que cero')
+        validados.append({**servicio, 'cantidad': int(cantidad)})
+    return validados
+
+def apartar_stock_evento(cursor, servicios_articulos, evento_id, fecha_desde, fecha_hasta):
+    """Apartar el stock de todo el carrito para un rango de fechas.
+    
+    Bloquea los artículos en orden de id (serializa reservas concurrentes sin
+    deadlocks) y, con una sola sentencia, registra todas las líneas en
+    reservas_articulo solo si todas alcanzan en cada día del rango.
+    Devuelve la lista de artículos sin stock suficiente; vacía si se apartó todo.
+    """
+    items = [item for item in servicios_articulos if item.get('tipo') == 'articulo']
+    if not items:
+        return []
+    
+    ids = [item.get('id_articulo') for item in items]
+    cursor.execute("""
+        SELECT id_articulo FROM articulos
+        WHERE id_articulo = ANY(%s)
+        ORDER BY id_articulo
+        FOR UPDATE
+    """, (ids,))
+    
+    # Sentencia aparte: su snapshot ya ve las reservas confirmadas mientras se esperaba el bloqueo
+    cursor.execute(f"""
+        WITH pedido AS (
+            SELECT p.id_articulo, SUM(p.cantidad)::int AS cantidad
+            FROM unnest(%(ids)s::int[], %(cantidades)s::int[]) AS p(id_articulo, cantidad)
+            GROUP BY p.id_articulo
+        ),
+        ocupacion AS ({OCUPACION_ARTICULOS_SQL}),
+        estado AS (
+            SELECT p.id_articulo, p.cantidad, a.nombre_articulo,
+                   COALESCE(a.cantidad_total - COALESCE(o.usado, 0), 0) AS disponible
+            FROM pedido p
+            LEFT JOIN articulos a ON a.id_articulo = p.id_articulo
+            LEFT JOIN ocupacion o ON o.id_articulo = p.id_articulo
+        ),
+        reservados AS (
+            INSERT INTO reservas_articulo (id_articulo, id_evento, periodo, cantidad)
+            SELECT e.id_articulo, %(evento)s, daterange(%(desde)s::date, %(hasta)s::date, '[]'), e.cantidad
+            FROM estado e
+            WHERE NOT EXISTS (SELECT 1 FROM estado WHERE disponible < cantidad)
+            RETURNING id_reserva
+        )
+        SELECT id_articulo, nombre_articulo, cantidad, disponible
+        FROM estado
+        WHERE disponible < cantidad
+        ORDER BY id_articulo
+    """, {
+        'ids': ids,
+        'cantidades': [item.get('cantidad', 1) for item in items],
+        'articulos': ids,
+        'evento': evento_id,
+        'desde': fecha_desde,
+        'hasta': fecha_hasta
+    })
+    
+    nombres = {item.get('id_articulo'): item.get('nombre') for item in items}
+    return [
+        {
+            'id_articulo': id_articulo,
+            'nombre': nombre_articulo or nombres.get(id_articulo),
+            'solicitado': cantidad,
+            'disponible': disponible
+        }
+        for id_articulo, nombre_articulo, cantidad, disponible in cursor.fetchall()
+    ]
+
+# CONSULTAS LENTAS CAPTURADAS
+@app.route('/api/admin/consultas-lentas', methods=['GET'])
+def get_consultas_lentas():
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+    
+    with _consultas_lentas_lock:
+        consultas = list(reversed(_consultas_lentas))
+    
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'umbral_ms': SLOW_QUERY_MS,
+        'consultas': consultas
+    })
+
+# ===============================================
+# ENDPOINT DE MÉTRICAS
+# ===============================================
+
+@app.route('/metrics')
+def metrics():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return Response('No autorizado\n', status=401, mimetype='text/plain')
+    
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
 
 # ===============================================
 # MANEJO DE ERRORES
@@ -1220,6 +3309,173 @@ def handle_db_error(error):
 # INICIALIZACIÓN
 # ===============================================
 
+# Directorio con las migraciones NNNN_nombre.sql, aplicadas en orden de versión
+MIGRACIONES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# Las migraciones corren una vez por despliegue ('release: flask --app app migrar'
+# en el Procfile). Migrar al arrancar hace que cada worker compita por el bloqueo
+# y que un worker reiniciado a mitad de un CREATE INDEX CONCURRENTLY deje el
+# índice inválido; solo conviene en desarrollo.
+DB_MIGRATE_ON_START = os.environ.get('DB_MIGRATE_ON_START', '0') == '1'
+
+# (tabla, columna) que deben ser la primera columna de un índice válido
+INDICES_REQUERIDOS = [
+    ('users', 'username'),
+    ('users', 'email'),
+    ('users', 'created_at'),
+    ('clientes', 'user_id'),
+    ('eventos', 'id_cliente'),
+    ('eventos', 'fecha_evento'),
+    ('detalle_evento', 'id_evento'),
+    ('pagos', 'id_evento'),
+    ('reservas_articulo', 'id_evento'),
+    ('eventos', 'cambio'),
+    ('articulos', 'cambio'),
+]
+
+def listar_migraciones():
+    """Devolver [(version, nombre, ruta)] de las migraciones en orden"""
+    migraciones = []
+    for ruta in glob.glob(os.path.join(MIGRACIONES_DIR, '*.sql')):
+        coincidencia = re.match(r'(\d+)_(.+)\.sql$', os.path.basename(ruta))
+        if coincidencia:
+            migraciones.append((int(coincidencia.group(1)), coincidencia.group(2), ruta))
+    return sorted(migraciones)
+
+def sentencias_sql(sql):
+    """Separar un archivo en sentencias (solo para migraciones sin transacción, sin bloques $$)"""
+    sin_comentarios = '\n'.join(linea for linea in sql.splitlines() if not linea.lstrip().startswith('--'))
+    return [sentencia.strip() for sentencia in sin_comentarios.split(';') if sentencia.strip()]
+
+def borrar_indices_invalidos(conexion, sentencias):
+    """Borrar los índices de estas sentencias que quedaron inválidos por un CONCURRENTLY interrumpido.
+    
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS no reconstruye un índice inválido
+    que ya existe con ese nombre: hay que borrarlo antes de reintentar.
+    """
+    nombres = [
+        coincidencia.group(1)
+        for coincidencia in (
+            re.search(r'INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)', sentencia, re.IGNORECASE)
+            for sentencia in sentencias
+        )
+        if coincidencia
+    ]
+    if not nombres:
+        return
+    invalidos = conexion.execute("""
+        SELECT c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = ANY(%s)
+          AND pg_table_is_visible(c.oid)
+          AND NOT i.indisvalid
+    """, (nombres,)).fetchall()
+    for (nombre,) in invalidos:
+        print(f"Borrando índice inválido {nombre} para volver a crearlo")
+        conexion.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{nombre}"')
+
+def aplicar_migraciones():
+    """Aplicar las migraciones pendientes y registrarlas en schema_migrations.
+    
+    Usa una conexión propia en autocommit: cada migración corre en su propia
+    transacción, salvo las marcadas con '-- sin transaccion' en la primera línea
+    (p. ej. CREATE INDEX CONCURRENTLY), que se ejecutan sentencia por sentencia.
+    Un bloqueo consultivo evita que varios workers migren a la vez.
+    """
+    aplicadas = []
+    with psycopg.connect(get_raw_database_url(), autocommit=True) as conexion:
+        conexion.execute("SELECT pg_advisory_lock(hashtext('schema_migrations'))")
+        try:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    nombre VARCHAR(200) NOT NULL,
+                    aplicada_en TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """)
+            hechas = {fila[0] for fila in conexion.execute("SELECT version FROM schema_migrations")}
+            
+            for version, nombre, ruta in listar_migraciones():
+                if version in hechas:
+                    continue
+                with open(ruta, encoding='utf-8') as archivo:
+                    sql = archivo.read()
+                
+                if sql.startswith('-- sin transaccion'):
+                    sentencias = sentencias_sql(sql)
+                    borrar_indices_invalidos(conexion, sentencias)
+                    for sentencia in sentencias:
+                        conexion.execute(sentencia)
+                    conexion.execute(
+                        "INSERT INTO schema_migrations (version, nombre) VALUES (%s, %s)", (version, nombre)
+                    )
+                else:
+                    with conexion.transaction():
+                        conexion.execute(sql)
+                        conexion.execute(
+                            "INSERT INTO schema_migrations (version, nombre) VALUES (%s, %s)", (version, nombre)
+                        )
+                aplicadas.append(f'{version:04d}_{nombre}')
+                print(f"Migración aplicada: {version:04d}_{nombre}")
+        finally:
+            conexion.execute("SELECT pg_advisory_unlock(hashtext('schema_migrations'))")
+    return aplicadas
+
+def verificar_indices():
+    """Comprobar que existen (y son válidos) los índices que usan las consultas frecuentes"""
+    try:
+        cursor = db.session.connection().connection.cursor()
+        cursor.execute("""
+            SELECT r.tabla, r.columna
+            FROM unnest(%s::text[], %s::text[]) AS r(tabla, columna)
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM pg_index i
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                WHERE i.indrelid = to_regclass(r.tabla)
+                  AND a.attname = r.columna
+                  AND i.indisvalid
+            )
+        """, ([t for t, _ in INDICES_REQUERIDOS], [c for _, c in INDICES_REQUERIDOS]))
+        faltantes = [f'{tabla}({columna})' for tabla, columna in cursor.fetchall()]
+        
+        # Índices que quedaron a medio crear: ocupan espacio y frenan escrituras sin servir a consultas
+        cursor.execute("""
+            SELECT c.relname, t.relname
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_class t ON t.oid = i.indrelid
+            WHERE NOT i.indisvalid
+              AND pg_table_is_visible(c.oid)
+        """)
+        invalidos = [f'{indice} ON {tabla}' for indice, tabla in cursor.fetchall()]
+        db.session.commit()
+        
+        if invalidos:
+            print(f"ADVERTENCIA: índices INVALID (CREATE INDEX CONCURRENTLY interrumpido): "
+                  f"{', '.join(invalidos)}. Ejecute 'flask --app app migrar' para reconstruirlos.")
+        if faltantes:
+            print(f"ADVERTENCIA: faltan índices requeridos: {', '.join(faltantes)}. "
+                  f"Ejecute 'flask --app app migrar'.")
+        return not faltantes and not invalidos
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error verificando índices: {str(e)}")
+        return False
+
+@app.cli.command('migrar')
+def migrar_command():
+    """Aplicar las migraciones pendientes de migrations/"""
+    aplicadas = aplicar_migraciones()
+    print(f"{len(aplicadas)} migraciones aplicadas" if aplicadas else "La base de datos está al día")
+    with app.app_context():
+        verificar_indices()
+
+@app.cli.command('podar-sincronizacion')
+def podar_sincronizacion_command():
+    """Borrar los registros_borrados más viejos que SYNC_RETENCION_DIAS"""
+    print(f"{podar_registros_borrados(forzar=True)} registros borrados podados")
+
 def verify_database_connection():
     """Verificar conexión a base de datos"""
     try:
@@ -1235,7 +3491,15 @@ def verify_database_connection():
 # Inicializar aplicación
 try:
     with app.app_context():
-        if verify_database_connection():
+        if multiprocessing.parent_process() is not None:
+            pass  # Proceso del pool de PDF: importa el módulo solo para renderizar
+        elif verify_database_connection():
+            if DB_MIGRATE_ON_START:
+                try:
+                    aplicar_migraciones()
+                except Exception as e:
+                    print(f"Error aplicando migraciones: {str(e)}")
+            verificar_indices()
             print("Base de datos lista para usar")
         else:
             print("Error en conexión a base de datos")
@@ -0,0 +1,74 @@
+# Configuración de gunicorn para Alquifiestas
+#
+# Por defecto usa workers gthread: cada proceso atiende varias peticiones a la
+# vez con hilos, así un PDF o una consulta de analítica lenta no bloquea todo el
+# worker. GUNICORN_WORKER_CLASS=sync vuelve al modo anterior.
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5050)}"
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8 if worker_class == 'gthread' else 1))
+# Con gthread la concurrencia la dan los hilos: pocos procesos bastan
+workers = int(os.environ.get(
+    'WEB_CONCURRENCY',
+    min(multiprocessing.cpu_count() + 1, 4) if worker_class == 'gthread' else multiprocessing.cpu_count() * 2 + 1
+))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Reiniciar workers periódicamente para acotar el crecimiento de memoria
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+
+# GUNICORN_ACCESSLOG vacío desactiva el log de accesos
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-') or None
+
+# Presupuesto de conexiones a PostgreSQL (max_connections es 100 por defecto):
+#   workers × (DB_POOL_SIZE + DB_MAX_OVERFLOW + una por cada hilo de fondo con LISTEN)
+# Cada hilo de petición usa una conexión del pool, así que el pool cubre los
+# hilos y el overflow no hace falta. Con los valores por defecto en 4 núcleos:
+# 4 × (8 + 0) = 32 más los hilos de fondo, con margen para psql y migraciones.
+# Si se suben WEB_CONCURRENCY o GUNICORN_THREADS hay que revisar la cuenta.
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+os.environ.setdefault('DB_MAX_OVERFLOW', '0')
+
+# Directorio compartido para las métricas de Prometheus de todos los workers
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'alquifiestas_metrics'))
+
+
+def on_starting(server):
+    # Empezar cada arranque con métricas limpias
+    directorio = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.makedirs(directorio, exist_ok=True)
+
+    # Generar los recursos estáticos optimizados si el despliegue no trae el build
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    if not os.path.exists(os.path.join(raiz, 'static', 'dist', 'manifest.json')):
+        resultado = subprocess.run([sys.executable, os.path.join(raiz, 'scripts', 'build_assets.py')], cwd=raiz)
+        if resultado.returncode != 0:
+            server.log.warning('build_assets.py falló; se sirven los archivos originales de static/')
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    # Con preload_app el proceso maestro ya abrió conexiones al importar app.py;
+    # se descartan para que cada worker abra las suyas
+    if preload_app:
+        from app import app, db
+        with app.app_context():
+            db.engine.dispose(close=False)
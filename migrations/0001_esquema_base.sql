@@ -0,0 +1,72 @@
+-- Esquema base de la aplicación.
+-- IF NOT EXISTS: en bases existentes, creadas antes de las migraciones, no hace nada.
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(80) NOT NULL UNIQUE,
+    email VARCHAR(120) NOT NULL UNIQUE,
+    password VARCHAR(255) NOT NULL,
+    full_name VARCHAR(150),
+    is_admin BOOLEAN NOT NULL DEFAULT FALSE,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_login TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS clientes (
+    id_cliente SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users (id) ON DELETE CASCADE,
+    nombre VARCHAR(150) NOT NULL,
+    telefono VARCHAR(30),
+    direccion VARCHAR(255)
+);
+
+CREATE TABLE IF NOT EXISTS administradores (
+    id_admin SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users (id) ON DELETE CASCADE,
+    nombre VARCHAR(150) NOT NULL,
+    telefono VARCHAR(30),
+    direccion VARCHAR(255)
+);
+
+CREATE TABLE IF NOT EXISTS servicios (
+    id_servicio SERIAL PRIMARY KEY,
+    nombre_servicio VARCHAR(150) NOT NULL,
+    descripcion TEXT,
+    precio NUMERIC(10, 2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS articulos (
+    id_articulo SERIAL PRIMARY KEY,
+    nombre_articulo VARCHAR(150) NOT NULL,
+    tipo VARCHAR(50),
+    cantidad_total INTEGER NOT NULL DEFAULT 0 CHECK (cantidad_total >= 0),
+    precio_unitario NUMERIC(10, 2) NOT NULL DEFAULT 0
+);
+
+-- id_cliente admite NULL: los bloqueos de fecha del administrador no tienen cliente
+CREATE TABLE IF NOT EXISTS eventos (
+    id_evento SERIAL PRIMARY KEY,
+    id_cliente INTEGER REFERENCES clientes (id_cliente) ON DELETE CASCADE,
+    fecha_evento DATE NOT NULL,
+    hora_inicio TIME,
+    hora_fin TIME,
+    estado VARCHAR(20) NOT NULL DEFAULT 'reservado',
+    monto_total NUMERIC(12, 2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS detalle_evento (
+    id_detalle SERIAL PRIMARY KEY,
+    id_evento INTEGER NOT NULL REFERENCES eventos (id_evento) ON DELETE CASCADE,
+    id_articulo INTEGER NOT NULL REFERENCES articulos (id_articulo),
+    cantidad INTEGER NOT NULL DEFAULT 1 CHECK (cantidad > 0),
+    precio_unitario NUMERIC(10, 2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS pagos (
+    id_pago SERIAL PRIMARY KEY,
+    id_evento INTEGER NOT NULL REFERENCES eventos (id_evento) ON DELETE CASCADE,
+    monto NUMERIC(12, 2) NOT NULL,
+    metodo VARCHAR(30) NOT NULL DEFAULT 'efectivo',
+    fecha_pago TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,8 @@
+-- Versión del catálogo: la caché de /api/servicios y /api/articulos se invalida al subirla
+
+CREATE TABLE IF NOT EXISTS catalogo_version (
+    id SMALLINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO catalogo_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
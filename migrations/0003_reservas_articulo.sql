@@ -0,0 +1,42 @@
+-- Registro de reservas con fecha y migración del stock apartado por eventos activos.
+-- La carga inicial solo corre si la tabla no existía: devuelve a cantidad_total lo
+-- que los eventos reservados/confirmados habían descontado y lo registra como reservas.
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+DO $$
+BEGIN
+    IF to_regclass('reservas_articulo') IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    CREATE TABLE reservas_articulo (
+        id_reserva BIGSERIAL PRIMARY KEY,
+        id_articulo INTEGER NOT NULL REFERENCES articulos (id_articulo),
+        id_evento INTEGER NOT NULL REFERENCES eventos (id_evento) ON DELETE CASCADE,
+        periodo DATERANGE NOT NULL,
+        cantidad INTEGER NOT NULL CHECK (cantidad > 0)
+    );
+    CREATE INDEX idx_reservas_articulo_periodo ON reservas_articulo USING gist (id_articulo, periodo);
+    CREATE INDEX idx_reservas_articulo_evento ON reservas_articulo (id_evento);
+
+    INSERT INTO reservas_articulo (id_articulo, id_evento, periodo, cantidad)
+    SELECT de.id_articulo, e.id_evento,
+           daterange(e.fecha_evento, e.fecha_evento, '[]'), SUM(de.cantidad)
+    FROM detalle_evento de
+    JOIN eventos e ON e.id_evento = de.id_evento
+    JOIN articulos a ON a.id_articulo = de.id_articulo
+    WHERE e.estado IN ('reservado', 'confirmado')
+    GROUP BY de.id_articulo, e.id_evento, e.fecha_evento
+    HAVING SUM(de.cantidad) > 0;
+
+    UPDATE articulos a
+    SET cantidad_total = a.cantidad_total + r.apartado
+    FROM (
+        SELECT id_articulo, SUM(cantidad) AS apartado
+        FROM reservas_articulo
+        GROUP BY id_articulo
+    ) r
+    WHERE a.id_articulo = r.id_articulo;
+END
+$$;
@@ -0,0 +1,48 @@
+-- Resumen diario de eventos por estado, mantenido por trigger, para /api/admin/stats
+
+CREATE OR REPLACE FUNCTION actualizar_resumen_diario() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.fecha_evento IS NOT NULL AND OLD.estado IS NOT NULL THEN
+        UPDATE eventos_resumen_diario
+        SET total_eventos = total_eventos - 1,
+            monto_total = monto_total - COALESCE(OLD.monto_total, 0)
+        WHERE fecha = OLD.fecha_evento AND estado = OLD.estado;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.fecha_evento IS NOT NULL AND NEW.estado IS NOT NULL THEN
+        INSERT INTO eventos_resumen_diario (fecha, estado, total_eventos, monto_total)
+        VALUES (NEW.fecha_evento, NEW.estado, 1, COALESCE(NEW.monto_total, 0))
+        ON CONFLICT (fecha, estado) DO UPDATE
+        SET total_eventos = eventos_resumen_diario.total_eventos + 1,
+            monto_total = eventos_resumen_diario.monto_total + EXCLUDED.monto_total;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF to_regclass('eventos_resumen_diario') IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    CREATE TABLE eventos_resumen_diario (
+        fecha DATE NOT NULL,
+        estado VARCHAR(20) NOT NULL,
+        total_eventos INTEGER NOT NULL DEFAULT 0,
+        monto_total NUMERIC(12, 2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (fecha, estado)
+    );
+
+    -- Bloquear escrituras en eventos mientras se hace la carga inicial
+    LOCK TABLE eventos IN SHARE ROW EXCLUSIVE MODE;
+    CREATE TRIGGER trg_eventos_resumen_diario
+    AFTER INSERT OR DELETE OR UPDATE OF fecha_evento, estado, monto_total ON eventos
+    FOR EACH ROW EXECUTE FUNCTION actualizar_resumen_diario();
+
+    INSERT INTO eventos_resumen_diario (fecha, estado, total_eventos, monto_total)
+    SELECT fecha_evento, estado, COUNT(*), COALESCE(SUM(monto_total), 0)
+    FROM eventos
+    WHERE fecha_evento IS NOT NULL AND estado IS NOT NULL
+    GROUP BY fecha_evento, estado;
+END
+$$;
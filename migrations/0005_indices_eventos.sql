@@ -0,0 +1,5 @@
+-- Índices para los filtros y agrupaciones por fecha de eventos.
+-- (fecha_evento, id_evento) sirve a los rangos de fechas y a la paginación por cursor.
+
+CREATE INDEX IF NOT EXISTS idx_eventos_fecha_id ON eventos (fecha_evento, id_evento);
+CREATE INDEX IF NOT EXISTS idx_eventos_estado_fecha ON eventos (estado, fecha_evento);
@@ -0,0 +1,17 @@
+-- sin transaccion
+-- Índices de las claves foráneas y búsquedas usadas por las consultas frecuentes.
+-- CONCURRENTLY para no bloquear escrituras en bases con datos; por eso esta
+-- migración corre fuera de una transacción, una sentencia a la vez.
+--
+-- Los índices únicos de users usan el nombre que PostgreSQL da a una restricción
+-- UNIQUE de columna: si la tabla ya la tiene, IF NOT EXISTS la reconoce.
+-- Si una sentencia falla queda un índice inválido; al volver a correr las
+-- migraciones, aplicar_migraciones lo borra y lo crea de nuevo.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS users_username_key ON users (username);
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS users_email_key ON users (email);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clientes_user_id ON clientes (user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_administradores_user_id ON administradores (user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_eventos_id_cliente ON eventos (id_cliente, fecha_evento);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_detalle_evento_id_evento ON detalle_evento (id_evento);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pagos_id_evento ON pagos (id_evento);
@@ -0,0 +1,25 @@
+-- Fechas bloqueadas por el administrador: rangos de días y cierres semanales.
+-- dia_semana NULL bloquea todo el periodo; 0-6 (domingo = 0, como EXTRACT(DOW))
+-- bloquea solo ese día de la semana dentro del periodo. Los cierres sin fin usan
+-- 'infinity' como límite superior.
+-- La restricción de exclusión impide periodos solapados con el mismo dia_semana y
+-- su índice GiST resuelve "¿está bloqueada esta fecha?" en O(log n).
+
+CREATE TABLE IF NOT EXISTS fechas_bloqueadas (
+    id_bloqueo SERIAL PRIMARY KEY,
+    periodo DATERANGE NOT NULL CHECK (NOT isempty(periodo)),
+    dia_semana SMALLINT CHECK (dia_semana BETWEEN 0 AND 6),
+    motivo VARCHAR(200),
+    creado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fechas_bloqueadas_sin_solape
+        EXCLUDE USING gist (periodo WITH &&, (COALESCE(dia_semana, -1)) WITH =)
+);
+
+-- Migrar los bloqueos que se guardaban como eventos sin cliente
+INSERT INTO fechas_bloqueadas (periodo, motivo)
+SELECT DISTINCT daterange(fecha_evento, fecha_evento, '[]'), 'Bloqueo anterior'
+FROM eventos
+WHERE estado = 'bloqueado' AND id_cliente IS NULL
+ON CONFLICT DO NOTHING;
+
+DELETE FROM eventos WHERE estado = 'bloqueado' AND id_cliente IS NULL;
@@ -0,0 +1,68 @@
+-- Seguimiento de cambios para la sincronización incremental (?since=).
+-- Cada fila guarda en "cambio" el id de la transacción que la escribió y los
+-- borrados quedan en registros_borrados. El cursor que entrega la API es el xmin
+-- del snapshot de la lectura: una transacción que confirma tarde nunca queda por
+-- detrás de un cursor ya entregado. Las filas existentes quedan con 0.
+
+ALTER TABLE eventos ADD COLUMN IF NOT EXISTS cambio xid8 NOT NULL DEFAULT '0';
+ALTER TABLE eventos ALTER COLUMN cambio SET DEFAULT pg_current_xact_id();
+ALTER TABLE articulos ADD COLUMN IF NOT EXISTS cambio xid8 NOT NULL DEFAULT '0';
+ALTER TABLE articulos ALTER COLUMN cambio SET DEFAULT pg_current_xact_id();
+ALTER TABLE reservas_articulo ADD COLUMN IF NOT EXISTS cambio xid8 NOT NULL DEFAULT '0';
+ALTER TABLE reservas_articulo ALTER COLUMN cambio SET DEFAULT pg_current_xact_id();
+
+CREATE INDEX IF NOT EXISTS idx_eventos_cambio ON eventos (cambio);
+CREATE INDEX IF NOT EXISTS idx_articulos_cambio ON articulos (cambio);
+CREATE INDEX IF NOT EXISTS idx_reservas_articulo_cambio ON reservas_articulo (cambio);
+
+-- id es id_evento o id_articulo; para reservas_articulo, el artículo cuyas fechas se liberaron
+CREATE TABLE IF NOT EXISTS registros_borrados (
+    id_borrado BIGSERIAL PRIMARY KEY,
+    tabla VARCHAR(30) NOT NULL,
+    id INTEGER NOT NULL,
+    id_cliente INTEGER,
+    periodo DATERANGE,
+    cambio xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    borrado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_registros_borrados_cambio ON registros_borrados (tabla, cambio);
+
+CREATE OR REPLACE FUNCTION marcar_cambio() RETURNS trigger AS $$
+BEGIN
+    NEW.cambio := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION registrar_borrado() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'eventos' THEN
+        INSERT INTO registros_borrados (tabla, id, id_cliente) VALUES (TG_TABLE_NAME, OLD.id_evento, OLD.id_cliente);
+    ELSIF TG_TABLE_NAME = 'articulos' THEN
+        INSERT INTO registros_borrados (tabla, id) VALUES (TG_TABLE_NAME, OLD.id_articulo);
+    ELSE
+        INSERT INTO registros_borrados (tabla, id, periodo) VALUES (TG_TABLE_NAME, OLD.id_articulo, OLD.periodo);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_eventos_cambio ON eventos;
+CREATE TRIGGER trg_eventos_cambio BEFORE UPDATE ON eventos
+FOR EACH ROW EXECUTE FUNCTION marcar_cambio();
+
+DROP TRIGGER IF EXISTS trg_articulos_cambio ON articulos;
+CREATE TRIGGER trg_articulos_cambio BEFORE UPDATE ON articulos
+FOR EACH ROW EXECUTE FUNCTION marcar_cambio();
+
+DROP TRIGGER IF EXISTS trg_eventos_borrado ON eventos;
+CREATE TRIGGER trg_eventos_borrado AFTER DELETE ON eventos
+FOR EACH ROW EXECUTE FUNCTION registrar_borrado();
+
+DROP TRIGGER IF EXISTS trg_articulos_borrado ON articulos;
+CREATE TRIGGER trg_articulos_borrado AFTER DELETE ON articulos
+FOR EACH ROW EXECUTE FUNCTION registrar_borrado();
+
+DROP TRIGGER IF EXISTS trg_reservas_articulo_borrado ON reservas_articulo;
+CREATE TRIGGER trg_reservas_articulo_borrado AFTER DELETE ON reservas_articulo
+FOR EACH ROW EXECUTE FUNCTION registrar_borrado();
@@ -0,0 +1,13 @@
+-- Retención de registros_borrados: se podan los de más de SYNC_RETENCION_DIAS.
+-- sincronizacion_horizonte guarda el mayor "cambio" ya podado (NULL si nunca se
+-- podó); un cursor ?since= menor o igual ya no ve todos los borrados y la API le
+-- responde que debe resincronizar.
+
+CREATE TABLE IF NOT EXISTS sincronizacion_horizonte (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    cambio xid8,
+    actualizado_en TIMESTAMP
+);
+INSERT INTO sincronizacion_horizonte (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS idx_registros_borrados_borrado_en ON registros_borrados (borrado_en);
@@ -0,0 +1,7 @@
+-- sin transaccion
+-- Paginación por cursor de /api/users y /api/admin/clientes: ORDER BY
+-- created_at DESC, id DESC y (created_at, id) < cursor se resuelven recorriendo
+-- este índice hacia atrás, sin ordenar toda la tabla en cada página.
+-- CONCURRENTLY para no bloquear registros de usuarios mientras se construye.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_created_at_id ON users (created_at, id);
@@ -0,0 +1,76 @@
+"""Medir comprobantes PDF por segundo según el número de procesos de render.
+
+Renderiza con construir_pdf_evento (el mismo código que /api/generar_pdf y la
+exportación masiva) eventos sintéticos en un ProcessPoolExecutor con el mismo
+método de arranque que get_pdf_executor, para cada cantidad de procesos pedida.
+No necesita base de datos.
+
+Uso:
+    python scripts/benchmark_pdf.py --pdfs 400 --workers 1,2,4,8
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Evitar que la importación intente conectarse a la base remota
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost:1/benchmark')
+
+from app import construir_pdf_evento  # noqa: E402
+
+
+def evento_sintetico(i, articulos):
+    evento = {
+        'id_evento': i,
+        'nombre': f'Cliente {i}',
+        'telefono': '5555-0000',
+        'email': f'cliente{i}@correo.com',
+        'fecha_evento': '2025-12-20',
+        'hora_inicio': '10:00:00',
+        'hora_fin': '18:00:00',
+        'estado': 'confirmado',
+        'monto_total': 0,
+    }
+    detalles = [
+        {'nombre_articulo': f'Artículo {n}', 'cantidad': 1 + n % 20, 'precio_unitario': 5 + n}
+        for n in range(articulos)
+    ]
+    evento['monto_total'] = sum(d['cantidad'] * d['precio_unitario'] for d in detalles)
+    return evento, detalles
+
+
+def medir(workers, trabajos):
+    metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(metodo)) as executor:
+        # Calentar: arrancar los procesos e importar reportlab antes de medir
+        list(executor.map(construir_pdf_evento, *zip(*trabajos[:workers])))
+        inicio = time.perf_counter()
+        futures = [executor.submit(construir_pdf_evento, evento, detalles) for evento, detalles in trabajos]
+        total_bytes = sum(len(future.result()) for future in as_completed(futures))
+        duracion = time.perf_counter() - inicio
+    return len(trabajos) / duracion, total_bytes / len(trabajos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pdfs', type=int, default=400)
+    parser.add_argument('--articulos', type=int, default=12, help='líneas de detalle por evento')
+    parser.add_argument('--workers', default=','.join(str(n) for n in (1, 2, 4, os.cpu_count() or 1)))
+    args = parser.parse_args()
+
+    trabajos = [evento_sintetico(i, args.articulos) for i in range(1, args.pdfs + 1)]
+    workers = sorted({int(n) for n in args.workers.split(',') if n})
+
+    print(f"{'procesos':>9}{'PDF/s':>10}{'aceleración':>13}{'KB/PDF':>9}")
+    base = None
+    for n in workers:
+        por_segundo, tamano = medir(n, trabajos)
+        base = base or por_segundo
+        print(f'{n:>9}{por_segundo:>10.1f}{por_segundo / base:>12.2f}x{tamano / 1024:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
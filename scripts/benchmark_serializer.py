@@ -0,0 +1,107 @@
+"""Microbenchmark del serializador de filas: isinstance por valor + jsonify vs plan por columna.
+
+No necesita base de datos: genera filas con la forma de get_admin_eventos y
+get_admin_clientes y simula cursor.description con los OID de PostgreSQL.
+
+Uso:
+    python scripts/benchmark_serializer.py --rows 20000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Evitar que la importación intente conectarse a la base remota
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost:1/benchmark')
+
+from flask import jsonify  # noqa: E402
+
+from app import app, filas_json, respuesta_json, serialize_database_row  # noqa: E402
+
+Columna = namedtuple('Columna', 'name type_code')
+
+
+class CursorSimulado:
+    def __init__(self, description):
+        self.description = description
+
+
+EVENTOS = [
+    Columna('id_evento', 23), Columna('id_cliente', 23), Columna('fecha_evento', 1082),
+    Columna('hora_inicio', 1083), Columna('hora_fin', 1083), Columna('estado', 1043),
+    Columna('monto_total', 1700), Columna('cliente_nombre', 1043), Columna('telefono', 1043),
+    Columna('email', 1043),
+]
+
+CLIENTES = [
+    Columna('id_cliente', 23), Columna('user_id', 23), Columna('nombre', 1043),
+    Columna('telefono', 1043), Columna('direccion', 1043), Columna('username', 1043),
+    Columna('email', 1043), Columna('fecha_registro', 1114), Columna('total_eventos', 20),
+    Columna('total_gastado', 1700),
+]
+
+
+def filas_eventos(n):
+    base = date(2024, 1, 1)
+    return [
+        (i, i % 500, base + timedelta(days=i % 700), dtime(10, 0), dtime(18, 30), 'confirmado',
+         Decimal('1250.50'), f'Cliente {i % 500}', '5555-0000', f'cliente{i % 500}@correo.com')
+        for i in range(n)
+    ]
+
+
+def filas_clientes(n):
+    base = datetime(2023, 1, 1, 12, 0)
+    return [
+        (i, i, f'Cliente {i}', '5555-0000', 'Zona 1', f'usuario{i}', f'usuario{i}@correo.com',
+         base + timedelta(hours=i), i % 40, Decimal('9800.75'))
+        for i in range(n)
+    ]
+
+
+def ruta_anterior(description, rows, clave):
+    columns = [desc.name for desc in description]
+    items = [serialize_database_row(dict(zip(columns, row))) for row in rows]
+    return jsonify({'success': True, clave: items}).get_data()
+
+
+def ruta_nueva(description, rows, clave):
+    fila = filas_json(CursorSimulado(description))
+    return respuesta_json({'success': True, clave: [fila(row) for row in rows]}).get_data()
+
+
+def cronometrar(funcion, repeat):
+    mejores = []
+    for _ in range(repeat):
+        inicio = time.process_time()
+        funcion()
+        mejores.append(time.process_time() - inicio)
+    return min(mejores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    casos = [
+        ('get_admin_eventos', EVENTOS, filas_eventos(args.rows), 'eventos'),
+        ('get_admin_clientes', CLIENTES, filas_clientes(args.rows), 'clientes'),
+    ]
+
+    with app.test_request_context():
+        print(f"{'endpoint':<22}{'anterior ms':>14}{'nuevo ms':>12}{'ahorro':>10}")
+        for nombre, description, rows, clave in casos:
+            anterior = cronometrar(lambda: ruta_anterior(description, rows, clave), args.repeat)
+            nuevo = cronometrar(lambda: ruta_nueva(description, rows, clave), args.repeat)
+            ahorro = (1 - nuevo / anterior) * 100 if anterior else 0.0
+            print(f'{nombre:<22}{anterior * 1000:>14.1f}{nuevo * 1000:>12.1f}{ahorro:>9.1f}%')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Comparar las consultas de /api/admin/stats sobre un volumen sintético de eventos.
+
+- anterior: las consultas separadas del código original (total, por estado,
+  mes actual con EXTRACT e ingresos), cada una un escaneo de eventos;
+- escaneo: STATS_EVENTOS_SQL, un solo escaneo agregado con FILTER;
+- resumen: STATS_RESUMEN_SQL, sobre la tabla eventos_resumen_diario.
+
+Los datos se generan en un esquema temporal (bench_stats) de la base de
+DATABASE_URL y se borran al terminar; las tablas reales no se tocan. Los conteos
+de clientes y artículos son iguales en los tres casos y no se miden.
+
+Uso:
+    DATABASE_URL=postgresql://... python scripts/benchmark_stats.py --eventos 1000000 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import psycopg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.environ.get('DATABASE_URL'):
+    sys.exit('Defina DATABASE_URL con una base de pruebas')
+
+from app import STATS_EVENTOS_SQL, STATS_RESUMEN_SQL  # noqa: E402
+
+ESQUEMA = 'bench_stats'
+
+ANTERIOR = [
+    "SELECT COUNT(*) FROM eventos",
+    "SELECT estado, COUNT(*) FROM eventos GROUP BY estado",
+    """
+    SELECT COUNT(*) FROM eventos
+    WHERE EXTRACT(MONTH FROM fecha_evento) = EXTRACT(MONTH FROM CURRENT_DATE)
+    AND EXTRACT(YEAR FROM fecha_evento) = EXTRACT(YEAR FROM CURRENT_DATE)
+    """,
+    "SELECT SUM(monto_total) FROM eventos WHERE estado IN ('confirmado', 'completado')",
+]
+
+
+def preparar(conn, eventos):
+    """Crear eventos sintéticos (10 años hasta hoy) y su resumen diario"""
+    conn.execute(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE")
+    conn.execute(f"CREATE SCHEMA {ESQUEMA}")
+    conn.execute(f"SET search_path TO {ESQUEMA}")
+    conn.execute("""
+        CREATE TABLE eventos (
+            id_evento SERIAL PRIMARY KEY,
+            id_cliente INTEGER,
+            fecha_evento DATE,
+            hora_inicio TIME,
+            hora_fin TIME,
+            estado VARCHAR(20),
+            monto_total NUMERIC(10, 2)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO eventos (id_cliente, fecha_evento, hora_inicio, hora_fin, estado, monto_total)
+        SELECT g %% 5000,
+               CURRENT_DATE - (g %% 3650),
+               '10:00', '18:00',
+               (ARRAY['reservado', 'confirmado', 'completado', 'cancelado'])[1 + g %% 4],
+               100 + g %% 900
+        FROM generate_series(1, %s) AS g
+    """, (eventos,))
+    conn.execute("""
+        CREATE TABLE eventos_resumen_diario AS
+        SELECT fecha_evento AS fecha, estado, COUNT(*)::int AS total_eventos,
+               SUM(monto_total)::numeric(12, 2) AS monto_total
+        FROM eventos
+        GROUP BY fecha_evento, estado
+    """)
+    conn.execute("ALTER TABLE eventos_resumen_diario ADD PRIMARY KEY (fecha, estado)")
+    conn.execute("ANALYZE eventos")
+    conn.execute("ANALYZE eventos_resumen_diario")
+
+
+def cronometrar(conn, consultas, repeat):
+    tiempos = []
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        for sql in consultas:
+            conn.execute(sql).fetchall()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--eventos', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--conservar', action='store_true', help=f'no borrar el esquema {ESQUEMA}')
+    args = parser.parse_args()
+
+    url = os.environ['DATABASE_URL'].replace('postgresql+psycopg://', 'postgresql://', 1)
+    with psycopg.connect(url, autocommit=True) as conn:
+        try:
+            inicio = time.perf_counter()
+            preparar(conn, args.eventos)
+            print(f'{args.eventos} eventos generados en {time.perf_counter() - inicio:.1f} s')
+
+            casos = [
+                ('anterior', ANTERIOR),
+                ('escaneo', [STATS_EVENTOS_SQL]),
+                ('resumen', [STATS_RESUMEN_SQL]),
+            ]
+            print(f"{'consulta':<12}{'mejor ms':>12}{'mediana ms':>12}")
+            for nombre, consultas in casos:
+                mejor, mediana = cronometrar(conn, consultas, args.repeat)
+                print(f'{nombre:<12}{mejor * 1000:>12.1f}{mediana * 1000:>12.1f}')
+        finally:
+            if not args.conservar:
+                conn.execute(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Comparar modos de worker de gunicorn (sync vs gthread) en los endpoints principales.
+
+Levanta la aplicación con gunicorn.conf.py una vez por modo, inicia sesión con
+un usuario administrador y lanza peticiones concurrentes contra cada endpoint.
+Reporta peticiones por segundo y latencias p50/p99.
+
+Uso:
+    DATABASE_URL=postgresql://... python scripts/benchmark_workers.py \
+        --username admin --password secreto --modes sync,gthread \
+        --requests 500 --concurrency 32
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = [
+    '/api/servicios',
+    '/api/articulos',
+    '/api/admin/stats',
+    '/api/admin/eventos',
+    '/api/admin/clientes',
+    '/api/admin/graficos',
+]
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def esperar_puerto(port, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def iniciar_sesion(base_url, username, password):
+    """Devolver la cabecera Cookie de una sesión autenticada"""
+    cookies = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cookies))
+    peticion = urllib.request.Request(
+        f'{base_url}/login',
+        data=json.dumps({'username': username, 'password': password}).encode(),
+        headers={'Content-Type': 'application/json'},
+    )
+    with opener.open(peticion, timeout=30) as respuesta:
+        respuesta.read()
+    return '; '.join(f'{c.name}={c.value}' for c in cookies)
+
+
+def medir(url, cookie):
+    peticion = urllib.request.Request(url, headers={'Cookie': cookie})
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(peticion, timeout=60) as respuesta:
+            respuesta.read()
+            ok = respuesta.status < 400
+    except Exception:
+        ok = False
+    return time.perf_counter() - inicio, ok
+
+
+def medir_endpoint(base_url, endpoint, cookie, total, concurrencia):
+    url = f'{base_url}{endpoint}'
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+        resultados = list(executor.map(lambda _: medir(url, cookie), range(total)))
+    duracion = time.perf_counter() - inicio
+    latencias = [latencia for latencia, _ in resultados]
+    return {
+        'rps': total / duracion if duracion else 0.0,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+        'errores': sum(1 for _, ok in resultados if not ok),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='sync,gthread')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--json', action='store_true', help='imprimir los resultados como JSON')
+    args = parser.parse_args()
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    endpoints = [e for e in args.endpoints.split(',') if e]
+    resultados = []
+
+    for modo in args.modes.split(','):
+        env = dict(
+            os.environ,
+            PORT=str(args.port),
+            GUNICORN_WORKER_CLASS=modo,
+            WEB_CONCURRENCY=str(args.workers),
+            GUNICORN_THREADS=str(args.threads if modo == 'gthread' else 1),
+            GUNICORN_ACCESSLOG='',
+        )
+        proceso = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+            cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            if not esperar_puerto(args.port):
+                print(f'[{modo}] gunicorn no respondió en el puerto {args.port}', file=sys.stderr)
+                continue
+            cookie = iniciar_sesion(base_url, args.username, args.password)
+            for endpoint in endpoints:
+                # Calentar cachés y conexiones antes de medir
+                medir_endpoint(base_url, endpoint, cookie, args.concurrency, args.concurrency)
+                metrica = medir_endpoint(base_url, endpoint, cookie, args.requests, args.concurrency)
+                resultados.append(dict(modo=modo, endpoint=endpoint, **metrica))
+        finally:
+            proceso.terminate()
+            proceso.wait(timeout=30)
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"{'modo':<10}{'endpoint':<24}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errores':>9}")
+    for r in resultados:
+        print(f"{r['modo']:<10}{r['endpoint']:<24}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errores']:>9}")
+
+
+if __name__ == '__main__':
+    main()
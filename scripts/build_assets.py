@@ -0,0 +1,152 @@
+"""Generar los recursos estáticos optimizados en static/dist.
+
+- Imágenes JPEG/PNG: variantes redimensionadas en WebP y en el formato original
+  para srcset (sin agrandar nunca la imagen de origen).
+- SVG, CSS y JS: copia con huella y versión precomprimida .gz.
+- Todo archivo lleva el hash de su contenido en el nombre, así se puede servir
+  con Cache-Control: immutable; static/dist/manifest.json traduce el nombre
+  original al generado y es lo que leen asset_url() e imagen_responsive().
+
+El build es determinista: con las mismas fuentes produce los mismos nombres.
+Pillow llega con reportlab y está fijado en requirements.txt.
+
+Uso:
+    python scripts/build_assets.py
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+
+from PIL import Image, ImageOps
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(RAIZ, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+
+# Anchos de las variantes; los que superan el original se recortan a su ancho
+ANCHOS_DEFECTO = (480, 960, 1600)
+ANCHOS = {
+    'alquifiestas.png': (160, 322),
+}
+CALIDAD_JPEG = 80
+CALIDAD_WEBP = 75
+
+IMAGENES = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG'}
+COMPRIMIBLES = {'.svg', '.css', '.js'}
+
+
+def huella(datos):
+    return hashlib.sha256(datos).hexdigest()[:10]
+
+
+def escribir(base, extension, datos, generados):
+    """Guardar datos como base.<hash>.ext y devolver el nombre generado"""
+    nombre = f'{base}.{huella(datos)}{extension}'
+    ruta = os.path.join(DIST_DIR, nombre)
+    if not os.path.exists(ruta):
+        with open(ruta + '.tmp', 'wb') as archivo:
+            archivo.write(datos)
+        os.replace(ruta + '.tmp', ruta)
+    generados.add(nombre)
+    return nombre
+
+
+def codificar(imagen, formato):
+    salida = io.BytesIO()
+    if formato == 'WEBP':
+        imagen.save(salida, 'WEBP', quality=CALIDAD_WEBP, method=6)
+    elif formato == 'JPEG':
+        imagen.convert('RGB').save(salida, 'JPEG', quality=CALIDAD_JPEG, optimize=True, progressive=True)
+    else:
+        imagen.save(salida, 'PNG', optimize=True)
+    return salida.getvalue()
+
+
+def procesar_imagen(nombre, ruta, generados):
+    base, extension = os.path.splitext(nombre)
+    formato = IMAGENES[extension.lower()]
+    with Image.open(ruta) as original:
+        imagen = ImageOps.exif_transpose(original)
+        imagen.load()
+    ancho, alto = imagen.size
+
+    anchos = sorted({min(w, ancho) for w in ANCHOS.get(nombre, ANCHOS_DEFECTO)})
+    srcset = {'webp': [], 'fallback': []}
+    for w in anchos:
+        variante = imagen if w == ancho else imagen.resize((w, round(alto * w / ancho)), Image.LANCZOS)
+        srcset['webp'].append([escribir(f'{base}-{w}', '.webp', codificar(variante, 'WEBP'), generados), w])
+        srcset['fallback'].append([escribir(f'{base}-{w}', extension.lower(), codificar(variante, formato), generados), w])
+
+    mayor = anchos[-1]
+    return {
+        'src': srcset['fallback'][-1][0],
+        'tipo': Image.MIME[formato],
+        'width': mayor,
+        'height': round(alto * mayor / ancho),
+        'srcset': srcset,
+    }
+
+
+def procesar_archivo(nombre, ruta, generados):
+    base, extension = os.path.splitext(nombre)
+    with open(ruta, 'rb') as archivo:
+        datos = archivo.read()
+    generado = escribir(base, extension, datos, generados)
+    if extension.lower() in COMPRIMIBLES:
+        # mtime=0 para que el .gz sea idéntico entre builds
+        comprimido = gzip.compress(datos, compresslevel=9, mtime=0)
+        if len(comprimido) < len(datos):
+            with open(os.path.join(DIST_DIR, generado + '.gz'), 'wb') as archivo:
+                archivo.write(comprimido)
+            generados.add(generado + '.gz')
+    return {'src': generado}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conservar', action='store_true', help='no borrar archivos de builds anteriores')
+    args = parser.parse_args()
+
+    os.makedirs(DIST_DIR, exist_ok=True)
+    manifest, generados = {}, set()
+    total_origen = total_generado = total_movil = 0
+
+    for nombre in sorted(os.listdir(STATIC_DIR)):
+        ruta = os.path.join(STATIC_DIR, nombre)
+        if not os.path.isfile(ruta) or nombre.startswith('.'):
+            continue
+        extension = os.path.splitext(nombre)[1].lower()
+        if extension in IMAGENES:
+            manifest[nombre] = procesar_imagen(nombre, ruta, generados)
+        else:
+            manifest[nombre] = procesar_archivo(nombre, ruta, generados)
+        total_origen += os.path.getsize(ruta)
+        total_generado += os.path.getsize(os.path.join(DIST_DIR, manifest[nombre]['src']))
+        # Lo que descarga un móvil: la variante WebP más pequeña, o el .gz si existe
+        movil = manifest[nombre]['srcset']['webp'][0][0] if 'srcset' in manifest[nombre] else manifest[nombre]['src']
+        if os.path.exists(os.path.join(DIST_DIR, movil + '.gz')):
+            movil += '.gz'
+        total_movil += os.path.getsize(os.path.join(DIST_DIR, movil))
+        print(f"{nombre} -> {manifest[nombre]['src']}")
+
+    ruta_manifest = os.path.join(DIST_DIR, 'manifest.json')
+    with open(ruta_manifest + '.tmp', 'w', encoding='utf-8') as archivo:
+        json.dump(manifest, archivo, indent=2, sort_keys=True)
+    os.replace(ruta_manifest + '.tmp', ruta_manifest)
+
+    if not args.conservar:
+        for nombre in os.listdir(DIST_DIR):
+            if nombre != 'manifest.json' and nombre not in generados:
+                os.remove(os.path.join(DIST_DIR, nombre))
+
+    print(f'{len(manifest)} recursos: originales {total_origen / 1024:.0f} KB, '
+          f'variante mayor {total_generado / 1024:.0f} KB, móvil {total_movil / 1024:.0f} KB')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
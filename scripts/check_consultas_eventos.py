@@ -0,0 +1,163 @@
+"""Comprobar que /api/mis_eventos y /api/admin/eventos no hacen una consulta por evento.
+
+Crea un cliente temporal con 1 evento, cuenta las sentencias que ejecuta cada
+endpoint, le agrega más eventos y vuelve a contar: la cifra no debe crecer con
+el número de eventos. Los datos temporales se borran al terminar.
+
+Usa la base de DATABASE_URL (obligatoria, para no tocar la de producción).
+
+Uso:
+    DATABASE_URL=postgresql://... python scripts/check_consultas_eventos.py --eventos 200
+"""
+import argparse
+import os
+import sys
+import uuid
+from datetime import date, time, timedelta
+
+import psycopg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.environ.get('DATABASE_URL'):
+    sys.exit('Defina DATABASE_URL con una base de pruebas')
+
+from app import app  # noqa: E402
+
+
+class ContadorSentencias:
+    """Contar las sentencias que pasan por psycopg.Cursor.execute"""
+
+    def __init__(self):
+        self.total = 0
+        self._original = psycopg.Cursor.execute
+
+    def __enter__(self):
+        contador = self
+        original = self._original
+
+        def execute(cursor, *args, **kwargs):
+            contador.total += 1
+            return original(cursor, *args, **kwargs)
+
+        psycopg.Cursor.execute = execute
+        return self
+
+    def __exit__(self, *exc):
+        psycopg.Cursor.execute = self._original
+
+
+def conectar():
+    url = os.environ['DATABASE_URL'].replace('postgresql+psycopg://', 'postgresql://', 1)
+    return psycopg.connect(url)
+
+
+def crear_datos(conn, marca):
+    """Usuario, cliente y artículo temporales; devuelve (user_id, id_cliente, id_articulo)"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO users (username, email, password, full_name, is_admin)
+            VALUES (%s, %s, 'x', 'Prueba consultas', FALSE)
+            RETURNING id
+        """, (marca, f'{marca}@prueba.local'))
+        user_id = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO clientes (user_id, nombre, telefono, direccion)
+            VALUES (%s, 'Prueba consultas', '0000-0000', 'N/A')
+            RETURNING id_cliente
+        """, (user_id,))
+        id_cliente = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO articulos (nombre_articulo, tipo, cantidad_total, precio_unitario)
+            VALUES (%s, 'prueba', 1000, 10)
+            RETURNING id_articulo
+        """, (marca,))
+        id_articulo = cursor.fetchone()[0]
+    conn.commit()
+    return user_id, id_cliente, id_articulo
+
+
+def agregar_eventos(conn, id_cliente, id_articulo, cantidad, inicio):
+    with conn.cursor() as cursor:
+        for i in range(cantidad):
+            cursor.execute("""
+                INSERT INTO eventos (id_cliente, fecha_evento, hora_inicio, hora_fin, estado, monto_total)
+                VALUES (%s, %s, %s, %s, 'completado', 20)
+                RETURNING id_evento
+            """, (id_cliente, date(2000, 1, 1) + timedelta(days=inicio + i), time(10), time(18)))
+            id_evento = cursor.fetchone()[0]
+            cursor.execute("""
+                INSERT INTO detalle_evento (id_evento, id_articulo, cantidad, precio_unitario)
+                VALUES (%s, %s, 2, 10)
+            """, (id_evento, id_articulo))
+    conn.commit()
+
+
+def borrar_datos(conn, user_id, id_cliente, id_articulo):
+    conn.rollback()
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            DELETE FROM detalle_evento
+            WHERE id_evento IN (SELECT id_evento FROM eventos WHERE id_cliente = %s)
+        """, (id_cliente,))
+        cursor.execute("DELETE FROM eventos WHERE id_cliente = %s", (id_cliente,))
+        cursor.execute("DELETE FROM clientes WHERE id_cliente = %s", (id_cliente,))
+        cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        cursor.execute("DELETE FROM articulos WHERE id_articulo = %s", (id_articulo,))
+    conn.commit()
+
+
+def contar(cliente_http, url, sesion):
+    """Devolver (sentencias, eventos devueltos) de una petición con la sesión indicada"""
+    with cliente_http.session_transaction() as s:
+        s.clear()
+        s.update(sesion)
+    with ContadorSentencias() as contador:
+        respuesta = cliente_http.get(url)
+    datos = respuesta.get_json()
+    if respuesta.status_code != 200 or not datos.get('success'):
+        raise RuntimeError(f'{url} respondió {respuesta.status_code}: {datos}')
+    return contador.total, len(datos['eventos'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--eventos', type=int, default=200, help='eventos del segundo conteo')
+    args = parser.parse_args()
+
+    marca = f'consultas_{uuid.uuid4().hex[:8]}'
+    conn = conectar()
+    user_id, id_cliente, id_articulo = crear_datos(conn, marca)
+
+    cliente_sesion = {'user': marca, 'user_id': user_id, 'user_name': marca,
+                      'is_admin': False, 'is_client': True, 'cliente_id': id_cliente}
+    admin_sesion = {'user': marca, 'user_id': user_id, 'user_name': marca,
+                    'is_admin': True, 'is_client': False}
+    casos = [
+        ('/api/mis_eventos', '/api/mis_eventos', cliente_sesion),
+        ('/api/admin/eventos', f'/api/admin/eventos?id_cliente={id_cliente}&limit=500', admin_sesion),
+    ]
+
+    fallos = 0
+    try:
+        cliente_http = app.test_client()
+        agregar_eventos(conn, id_cliente, id_articulo, 1, 0)
+        antes = {nombre: contar(cliente_http, url, sesion) for nombre, url, sesion in casos}
+        agregar_eventos(conn, id_cliente, id_articulo, args.eventos - 1, 1)
+        despues = {nombre: contar(cliente_http, url, sesion) for nombre, url, sesion in casos}
+
+        print(f"{'endpoint':<22}{'eventos':>9}{'consultas':>11}{'eventos':>9}{'consultas':>11}")
+        for nombre, _, _ in casos:
+            (consultas_1, eventos_1), (consultas_n, eventos_n) = antes[nombre], despues[nombre]
+            estado = 'ok' if consultas_n == consultas_1 else 'FALLA'
+            fallos += estado != 'ok'
+            print(f'{nombre:<22}{eventos_1:>9}{consultas_1:>11}{eventos_n:>9}{consultas_n:>11}  {estado}')
+    finally:
+        borrar_datos(conn, user_id, id_cliente, id_articulo)
+        conn.close()
+
+    return 1 if fallos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Comprobar con EXPLAIN que las consultas de analítica usan los índices de eventos.
+
+Corre EXPLAIN (FORMAT JSON) de las consultas por fecha de /api/admin/graficos y
+/api/admin/eventos (importadas de app.py) y falla si el plan no pasa por el índice
+esperado; de las de /api/admin/stats solo muestra los índices usados. Pensado
+para una base local con datos (p. ej. después de scripts/seed_data.py): con
+pocas filas el planificador prefiere leer la tabla completa, y --forzar
+desactiva enable_seqscan para comprobar al menos que el índice sirve al predicado.
+
+Uso:
+    DATABASE_URL=postgresql://... python scripts/check_indices_analitica.py
+"""
+import argparse
+import os
+import sys
+from datetime import date, timedelta
+
+import psycopg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.environ.get('DATABASE_URL'):
+    sys.exit('Defina DATABASE_URL con una base de pruebas')
+
+# Las mismas consultas que ejecutan los endpoints, importadas para no desviarse de ellas
+from app import (  # noqa: E402
+    GRAFICOS_EVENTOS_MES_SQL, GRAFICOS_INGRESOS_MES_SQL, STATS_EVENTOS_SQL, STATS_RESUMEN_SQL,
+    sql_pagina_eventos,
+)
+
+HOY = date.today()
+
+# (nombre, sql, parámetros, índice esperado); None solo muestra el plan (las
+# estadísticas recorren todas las filas y no dependen de un índice)
+CONSULTAS = [
+    ('graficos: eventos por mes', GRAFICOS_EVENTOS_MES_SQL, (), 'idx_eventos_fecha_id'),
+    ('graficos: ingresos por mes', GRAFICOS_INGRESOS_MES_SQL, (), 'idx_eventos_estado_fecha'),
+    ('eventos: rango de fechas',
+     sql_pagina_eventos("WHERE e.fecha_evento >= %s AND e.fecha_evento <= %s"),
+     (HOY, HOY + timedelta(days=30), 51), 'idx_eventos_fecha_id'),
+    ('eventos: página por cursor',
+     sql_pagina_eventos("WHERE (e.fecha_evento, e.id_evento) < (%s, %s)"),
+     (HOY, 2147483647, 51), 'idx_eventos_fecha_id'),
+    ('stats: eventos', STATS_EVENTOS_SQL, (), None),
+    ('stats: resumen', STATS_RESUMEN_SQL, (), None),
+]
+
+
+def indices_del_plan(nodo):
+    """Nombres de índice usados en un nodo de plan y sus hijos"""
+    indices = {nodo['Index Name']} if 'Index Name' in nodo else set()
+    for hijo in nodo.get('Plans', []):
+        indices |= indices_del_plan(hijo)
+    return indices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--forzar', action='store_true', help='desactivar enable_seqscan')
+    args = parser.parse_args()
+
+    url = os.environ['DATABASE_URL'].replace('postgresql+psycopg://', 'postgresql://', 1)
+    fallos = 0
+    with psycopg.connect(url) as conn:
+        filas = conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+        print(f'eventos: {filas} filas')
+        if args.forzar:
+            conn.execute("SET enable_seqscan = off")
+
+        # EXPLAIN no admite parámetros del servidor: ClientCursor los incrusta en el texto
+        cursor = psycopg.ClientCursor(conn)
+        for nombre, sql, parametros, esperado in CONSULTAS:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", parametros)
+            usados = indices_del_plan(cursor.fetchone()[0][0]['Plan'])
+            if esperado is None:
+                estado = 'info'
+            else:
+                estado = 'ok' if esperado in usados else 'FALLA'
+                fallos += estado != 'ok'
+            print(f"{nombre:<30}{esperado or '-':<28}{estado:<7}usa: {', '.join(sorted(usados)) or 'ninguno'}")
+        conn.rollback()
+
+    return 1 if fallos else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
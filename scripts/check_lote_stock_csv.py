@@ -0,0 +1,61 @@
+"""Comprobar la lectura del CSV de /api/admin/stock/lote sin tocar la base de datos.
+
+Pasa varios CSV por leer_lote_stock y validar_fila_stock (el mismo código del
+endpoint) y verifica el resultado de cada fila: en particular que una fila con
+más campos que el encabezado (p. ej. un ';' o ',' al final) no rompa la
+importación con un error 500.
+
+Uso:
+    python scripts/check_lote_stock_csv.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Evitar que la importación intente conectarse a la base remota
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost:1/check')
+
+from app import app, leer_lote_stock, validar_fila_stock  # noqa: E402
+
+# (nombre, csv, {línea: (id_articulo, cantidad) esperado o 'error'})
+CASOS = [
+    ('coma', 'id_articulo,cantidad\n1,5\n2,7\n', {2: (1, 5), 3: (2, 7)}),
+    ('punto y coma', 'id_articulo;cantidad\n1;5\n', {2: (1, 5)}),
+    ('separador final', 'id_articulo;cantidad\n1;5;\n2;7,\n', {2: (1, 5), 3: 'error'}),
+    ('separador final con coma', 'id_articulo,cantidad\n1,5,\n2,7,,\n', {2: (1, 5), 3: (2, 7)}),
+    ('columnas de más', 'id_articulo,cantidad\n1,5,9\n2,6\n', {2: 'error', 3: (2, 6)}),
+    ('columnas de menos', 'id_articulo,cantidad\n1\n', {2: 'error'}),
+    ('cantidad con decimales', 'id_articulo,cantidad\n1,2.5\n', {2: 'error'}),
+]
+
+
+def resultados(texto):
+    """{línea: (id_articulo, cantidad) o 'error'} tal como los vería el endpoint"""
+    with app.test_request_context('/api/admin/stock/lote', method='POST',
+                                  data=texto.encode(), content_type='text/csv'):
+        filas = leer_lote_stock()
+    obtenidos = {}
+    for linea, datos in filas:
+        try:
+            id_articulo, cantidad, _ = validar_fila_stock(datos)
+            obtenidos[linea] = (id_articulo, cantidad)
+        except ValueError:
+            obtenidos[linea] = 'error'
+    return obtenidos
+
+
+def main():
+    fallos = 0
+    for nombre, texto, esperado in CASOS:
+        try:
+            obtenido = resultados(texto)
+        except Exception as e:
+            obtenido = f'{type(e).__name__}: {e}'
+        estado = 'ok' if obtenido == esperado else 'FALLA'
+        fallos += estado != 'ok'
+        print(f'{nombre:<28}{estado:<7}{obtenido}')
+    return 1 if fallos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""Escenario de carga reproducible sobre una instancia en marcha de Alquifiestas.
+
+Usuarios virtuales (hilos) con sesión propia y conexión persistente recorren el
+flujo real de la aplicación durante un tiempo fijo:
+
+- clientes: iniciar sesión, ver servicios y artículos disponibles para una
+  fecha, reservar un evento (POST /api/eventos), pagarlo (POST /api/pagos) y
+  consultar sus eventos;
+- administradores: estadísticas, eventos, clientes, gráficos, stock y fechas
+  ocupadas del panel.
+
+Los usuarios son los que crea scripts/seed_data.py (carga_cliente_N y
+carga_admin). Con la misma --seed la secuencia de acciones de cada usuario
+virtual es la misma, así los resultados se pueden comparar entre commits.
+
+El reporte incluye peticiones por segundo, errores y latencias p50/p95/p99 por
+endpoint; --salida lo guarda como JSON junto con el commit actual y --comparar
+muestra la variación contra un reporte anterior.
+
+Uso:
+    python scripts/seed_data.py --limpiar --clientes 2000 --eventos 50000
+    python scripts/load_test.py --base-url http://127.0.0.1:5050 --usuarios 40 \
+        --duracion 60 --salida carga_$(git rev-parse --short HEAD).json
+    python scripts/load_test.py ... --comparar carga_anterior.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+class Resultados:
+    """Latencias y errores por endpoint, compartidos entre hilos"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.activo = False
+
+    def registrar(self, nombre, duracion, ok):
+        if not self.activo:
+            return
+        with self.lock:
+            self.latencias[nombre].append(duracion)
+            if not ok:
+                self.errores[nombre] += 1
+
+    def resumen(self, duracion):
+        endpoints = {}
+        for nombre in sorted(self.latencias):
+            latencias = self.latencias[nombre]
+            endpoints[nombre] = {
+                'peticiones': len(latencias),
+                'errores': self.errores[nombre],
+                'rps': len(latencias) / duracion if duracion else 0.0,
+                'p50_ms': percentil(latencias, 50) * 1000,
+                'p95_ms': percentil(latencias, 95) * 1000,
+                'p99_ms': percentil(latencias, 99) * 1000,
+            }
+        total = sum(len(v) for v in self.latencias.values())
+        return {
+            'total': {
+                'peticiones': total,
+                'errores': sum(self.errores.values()),
+                'rps': total / duracion if duracion else 0.0,
+            },
+            'endpoints': endpoints,
+        }
+
+
+class UsuarioVirtual:
+    """Un navegador: conexión keep-alive, cookie de sesión y un generador aleatorio propio"""
+
+    def __init__(self, base_url, resultados, rng):
+        partes = urlsplit(base_url)
+        self.host = partes.hostname
+        self.port = partes.port or (443 if partes.scheme == 'https' else 80)
+        self.https = partes.scheme == 'https'
+        self.resultados = resultados
+        self.rng = rng
+        self.cookie = ''
+        self.conexion = None
+
+    def conectar(self):
+        clase = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self.conexion = clase(self.host, self.port, timeout=60)
+
+    def peticion(self, metodo, ruta, nombre, cuerpo=None, params=None):
+        """Ejecutar una petición y registrar su latencia bajo 'nombre'; devuelve (status, json)"""
+        if params:
+            ruta = f'{ruta}?{urlencode(params)}'
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        datos = None
+        if cuerpo is not None:
+            datos = json.dumps(cuerpo).encode()
+            headers['Content-Type'] = 'application/json'
+        inicio = time.perf_counter()
+        status, contenido = 0, None
+        try:
+            if self.conexion is None:
+                self.conectar()
+            self.conexion.request(metodo, ruta, body=datos, headers=headers)
+            respuesta = self.conexion.getresponse()
+            crudo = respuesta.read()
+            status = respuesta.status
+            for valor in respuesta.headers.get_all('Set-Cookie') or []:
+                par = valor.split(';', 1)[0]
+                if par.startswith('session='):
+                    self.cookie = par
+            if respuesta.headers.get_content_type() == 'application/json':
+                contenido = json.loads(crudo)
+        except (OSError, http.client.HTTPException, ValueError):
+            # Conexión cerrada por el servidor (p. ej. max_requests): reconectar en la siguiente
+            if self.conexion is not None:
+                self.conexion.close()
+            self.conexion = None
+        self.resultados.registrar(f'{metodo} {nombre}', time.perf_counter() - inicio, 0 < status < 400)
+        return status, contenido
+
+    def login(self, username, password):
+        status, contenido = self.peticion('POST', '/login', '/login', {'username': username, 'password': password})
+        return status == 200 and bool(contenido and contenido.get('success'))
+
+
+class Cliente(UsuarioVirtual):
+    def __init__(self, base_url, resultados, rng, dias_futuros):
+        super().__init__(base_url, resultados, rng)
+        self.dias_futuros = dias_futuros
+
+    def iteracion(self):
+        self.peticion('GET', '/api/servicios', '/api/servicios')
+        fecha = (date.today() + timedelta(days=self.rng.randint(7, self.dias_futuros))).isoformat()
+        _, contenido = self.peticion('GET', '/api/articulos', '/api/articulos', params={'fecha': fecha})
+        articulos = [a for a in (contenido or {}).get('articulos', []) if (a.get('disponible') or 0) > 0]
+
+        # Solo una parte de las visitas termina en reserva, y no todas las reservas se pagan
+        if articulos and self.rng.random() < 0.4:
+            elegidos = self.rng.sample(articulos, min(len(articulos), self.rng.randint(1, 3)))
+            servicios = []
+            for articulo in elegidos:
+                cantidad = max(1, min(int(articulo['disponible']), self.rng.randint(1, 20)))
+                servicios.append({
+                    'tipo': 'articulo',
+                    'id_articulo': articulo['id_articulo'],
+                    'cantidad': cantidad,
+                    'precio_unitario': float(articulo['precio_unitario']),
+                })
+            monto = round(sum(s['cantidad'] * s['precio_unitario'] for s in servicios), 2)
+            status, contenido = self.peticion('POST', '/api/eventos', '/api/eventos', {
+                'fecha_evento': fecha,
+                'hora_inicio': '14:00',
+                'hora_fin': '20:00',
+                'monto_total': monto,
+                'servicios': servicios,
+            })
+            if status == 201 and contenido and self.rng.random() < 0.6:
+                self.peticion('POST', '/api/pagos', '/api/pagos', {
+                    'id_evento': contenido['evento_id'],
+                    'monto': monto,
+                    'metodo': self.rng.choice(['efectivo', 'tarjeta', 'transferencia']),
+                })
+
+        self.peticion('GET', '/api/mis_eventos', '/api/mis_eventos')
+
+
+class Administrador(UsuarioVirtual):
+    def iteracion(self):
+        self.peticion('GET', '/api/admin/stats', '/api/admin/stats')
+        _, contenido = self.peticion('GET', '/api/admin/eventos', '/api/admin/eventos')
+        # A veces se pide la página siguiente o se filtra por estado
+        if contenido and contenido.get('next_cursor') and self.rng.random() < 0.3:
+            self.peticion('GET', '/api/admin/eventos', '/api/admin/eventos',
+                          params={'cursor': contenido['next_cursor']})
+        if self.rng.random() < 0.3:
+            self.peticion('GET', '/api/admin/eventos', '/api/admin/eventos',
+                          params={'estado': self.rng.choice(['reservado', 'confirmado', 'completado'])})
+        self.peticion('GET', '/api/admin/clientes', '/api/admin/clientes')
+        self.peticion('GET', '/api/admin/graficos', '/api/admin/graficos')
+        self.peticion('GET', '/api/admin/stock', '/api/admin/stock')
+        self.peticion('GET', '/api/admin/fechas-ocupadas', '/api/admin/fechas-ocupadas')
+
+
+def ejecutar(usuario, credenciales, limite, pausa):
+    if not usuario.login(*credenciales):
+        print(f'No se pudo iniciar sesión como {credenciales[0]}', file=sys.stderr)
+        return
+    while time.monotonic() < limite:
+        usuario.iteracion()
+        if pausa:
+            time.sleep(usuario.rng.uniform(0, 2 * pausa))
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir(reporte, anterior=None):
+    previos = (anterior or {}).get('endpoints', {})
+    print(f"{'endpoint':<34}{'req':>8}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          + (f"{'Δ p95':>9}" if anterior else ''))
+    for nombre, r in reporte['endpoints'].items():
+        linea = (f"{nombre:<34}{r['peticiones']:>8}{r['errores']:>6}{r['rps']:>9.1f}"
+                 f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}")
+        previo = previos.get(nombre)
+        if previo and previo['p95_ms']:
+            linea += f"{(r['p95_ms'] / previo['p95_ms'] - 1) * 100:>+8.1f}%"
+        print(linea)
+    total = reporte['total']
+    print(f"{'total':<34}{total['peticiones']:>8}{total['errores']:>6}{total['rps']:>9.1f}")
+    if anterior:
+        print(f"Comparado con {anterior.get('commit') or 'reporte anterior'}: "
+              f"{anterior['total']['rps']:.1f} req/s -> {total['rps']:.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:5050')
+    parser.add_argument('--usuarios', type=int, default=40, help='usuarios virtuales concurrentes')
+    parser.add_argument('--proporcion-admin', type=float, default=0.1)
+    parser.add_argument('--clientes-sembrados', type=int, default=2000, help='--clientes usado en seed_data.py')
+    parser.add_argument('--password', default='carga123')
+    parser.add_argument('--duracion', type=float, default=60, help='segundos medidos')
+    parser.add_argument('--calentamiento', type=float, default=10, help='segundos iniciales sin medir')
+    parser.add_argument('--pausa', type=float, default=0.0, help='pausa media entre iteraciones, en segundos')
+    parser.add_argument('--dias-futuros', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--salida', help='guardar el reporte como JSON')
+    parser.add_argument('--comparar', help='reporte JSON anterior contra el que comparar')
+    args = parser.parse_args()
+
+    resultados = Resultados()
+    admins = max(1, round(args.usuarios * args.proporcion_admin)) if args.proporcion_admin > 0 else 0
+    limite = time.monotonic() + args.calentamiento + args.duracion
+
+    hilos = []
+    for i in range(args.usuarios):
+        rng = random.Random(args.seed * 100003 + i)
+        if i < admins:
+            usuario = Administrador(args.base_url, resultados, rng)
+            credenciales = ('carga_admin', args.password)
+        else:
+            usuario = Cliente(args.base_url, resultados, rng, args.dias_futuros)
+            credenciales = (f'carga_cliente_{rng.randrange(args.clientes_sembrados)}', args.password)
+        hilo = threading.Thread(target=ejecutar, args=(usuario, credenciales, limite, args.pausa), daemon=True)
+        hilos.append(hilo)
+        hilo.start()
+
+    time.sleep(args.calentamiento)
+    resultados.activo = True
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    reporte = {
+        'commit': commit_actual(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'parametros': {k: v for k, v in vars(args).items() if k not in ('salida', 'comparar', 'password')},
+        'duracion_s': duracion,
+        **resultados.resumen(duracion),
+    }
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            anterior = json.load(archivo)
+    imprimir(reporte, anterior)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(reporte, archivo, indent=2)
+        print(f'Reporte guardado en {args.salida}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""Llenar una base PostgreSQL local con datos sintéticos realistas para pruebas de carga.
+
+Genera usuarios, clientes, artículos, eventos, detalle_evento y pagos con
+distribuciones parecidas a las reales:
+
+- pocos clientes concentran muchos eventos (distribución de Zipf),
+- más eventos en fin de semana y en temporada alta (noviembre-diciembre),
+- eventos pasados mayormente completados, futuros reservados o confirmados,
+- unos pocos artículos (sillas, mesas) aparecen en la mayoría de los eventos.
+
+Todos los usuarios creados usan el prefijo 'carga_' y la contraseña indicada
+(por defecto 'carga123'); el administrador es 'carga_admin'. Con --limpiar se
+borran antes los datos generados por una corrida anterior.
+
+El esquema debe existir: en una base vacía, correr antes 'flask --app app migrar'.
+
+Uso:
+    python scripts/seed_data.py --database-url postgresql://localhost/alquifiestas \
+        --clientes 5000 --articulos 60 --eventos 200000 --seed 42
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import psycopg
+
+PREFIJO = 'carga_'
+PATRON = PREFIJO.replace('_', '\\_') + '%'
+
+NOMBRES_ARTICULOS = [
+    ('Silla plegable', 'mobiliario', 8), ('Silla Tiffany', 'mobiliario', 25), ('Mesa redonda', 'mobiliario', 60),
+    ('Mesa rectangular', 'mobiliario', 55), ('Mantel blanco', 'manteleria', 15), ('Mantel de color', 'manteleria', 18),
+    ('Cubremantel', 'manteleria', 12), ('Toldo 6x12', 'toldos', 650), ('Toldo 10x20', 'toldos', 1200),
+    ('Pista de baile', 'pistas', 900), ('Equipo de sonido', 'sonido', 750), ('Iluminación LED', 'iluminacion', 400),
+    ('Cristalería (juego)', 'cristaleria', 35), ('Vajilla (juego)', 'vajilla', 30), ('Calentador de comida', 'cocina', 120),
+    ('Inflable infantil', 'infantil', 500), ('Brincolín', 'infantil', 450), ('Planta eléctrica', 'equipo', 1500),
+]
+
+ESTADOS_FUTURO = [('reservado', 0.55), ('confirmado', 0.45)]
+ESTADOS_PASADO = [('completado', 0.85), ('confirmado', 0.10), ('reservado', 0.05)]
+METODOS_PAGO = [('efectivo', 0.5), ('tarjeta', 0.35), ('transferencia', 0.15)]
+
+
+def elegir(rng, opciones):
+    valores, pesos = zip(*opciones)
+    return rng.choices(valores, weights=pesos, k=1)[0]
+
+
+def pesos_zipf(n, s=1.1):
+    return [1 / (i ** s) for i in range(1, n + 1)]
+
+
+def fecha_realista(rng, inicio, dias):
+    """Fecha con más peso en fines de semana y en noviembre-diciembre"""
+    while True:
+        fecha = inicio + timedelta(days=rng.randrange(dias))
+        peso = 1.0
+        if fecha.weekday() >= 5:
+            peso *= 3.0
+        elif fecha.weekday() == 4:
+            peso *= 1.8
+        if fecha.month in (11, 12):
+            peso *= 2.2
+        elif fecha.month in (6, 7):
+            peso *= 1.3
+        if rng.random() < peso / 6.6:
+            return fecha
+
+
+def siguiente_id(cursor, tabla, columna):
+    cursor.execute(f"SELECT COALESCE(MAX({columna}), 0) + 1 FROM {tabla}")
+    return cursor.fetchone()[0]
+
+
+def ajustar_secuencia(cursor, tabla, columna):
+    cursor.execute(f"""
+        SELECT setval(pg_get_serial_sequence('{tabla}', '{columna}'),
+                      (SELECT COALESCE(MAX({columna}), 1) FROM {tabla}))
+        WHERE pg_get_serial_sequence('{tabla}', '{columna}') IS NOT NULL
+    """)
+
+
+def copiar(cursor, tabla, columnas, filas):
+    with cursor.copy(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN") as copy:
+        for fila in filas:
+            copy.write_row(fila)
+
+
+def limpiar(cursor):
+    print('Borrando datos de corridas anteriores...')
+    cursor.execute("""
+        DELETE FROM pagos WHERE id_evento IN (
+            SELECT e.id_evento FROM eventos e
+            JOIN clientes c ON c.id_cliente = e.id_cliente
+            JOIN users u ON u.id = c.user_id
+            WHERE u.username LIKE %s
+        )
+    """, (PATRON,))
+    cursor.execute("""
+        DELETE FROM detalle_evento WHERE id_evento IN (
+            SELECT e.id_evento FROM eventos e
+            JOIN clientes c ON c.id_cliente = e.id_cliente
+            JOIN users u ON u.id = c.user_id
+            WHERE u.username LIKE %s
+        )
+    """, (PATRON,))
+    cursor.execute("""
+        DELETE FROM eventos WHERE id_cliente IN (
+            SELECT c.id_cliente FROM clientes c
+            JOIN users u ON u.id = c.user_id
+            WHERE u.username LIKE %s
+        )
+    """, (PATRON,))
+    cursor.execute("DELETE FROM clientes WHERE user_id IN (SELECT id FROM users WHERE username LIKE %s)", (PATRON,))
+    cursor.execute("DELETE FROM users WHERE username LIKE %s", (PATRON,))
+    cursor.execute("""
+        DELETE FROM articulos a WHERE a.nombre_articulo LIKE %s
+        AND NOT EXISTS (SELECT 1 FROM detalle_evento de WHERE de.id_articulo = a.id_articulo)
+    """, (PATRON,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    parser.add_argument('--clientes', type=int, default=2000)
+    parser.add_argument('--admins', type=int, default=1)
+    parser.add_argument('--articulos', type=int, default=40)
+    parser.add_argument('--eventos', type=int, default=50000)
+    parser.add_argument('--lineas-por-evento', type=float, default=3.0, help='promedio de líneas de detalle')
+    parser.add_argument('--anios-pasados', type=int, default=3)
+    parser.add_argument('--dias-futuros', type=int, default=365)
+    parser.add_argument('--password', default='carga123')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--limpiar', action='store_true', help='borrar antes los datos carga_ existentes')
+    args = parser.parse_args()
+
+    if not args.database_url:
+        sys.exit('Indique --database-url o DATABASE_URL')
+    url = args.database_url.replace('postgresql+psycopg://', 'postgresql://', 1)
+
+    rng = random.Random(args.seed)
+    inicio_total = time.perf_counter()
+    hoy = date.today()
+    inicio_fechas = hoy - timedelta(days=365 * args.anios_pasados)
+    dias_rango = 365 * args.anios_pasados + args.dias_futuros
+
+    with psycopg.connect(url) as conn, conn.cursor() as cursor:
+        if args.limpiar:
+            limpiar(cursor)
+
+        # Usuarios y clientes
+        primer_user = siguiente_id(cursor, 'users', 'id')
+        primer_cliente = siguiente_id(cursor, 'clientes', 'id_cliente')
+        usuarios, clientes = [], []
+        registro_inicio = datetime.now() - timedelta(days=365 * args.anios_pasados)
+        for i in range(args.admins + args.clientes):
+            user_id = primer_user + i
+            es_admin = i < args.admins
+            username = f'{PREFIJO}admin' if i == 0 else (f'{PREFIJO}admin_{i}' if es_admin else f'{PREFIJO}cliente_{i - args.admins}')
+            nombre = f'Usuario Carga {i}'
+            creado = registro_inicio + timedelta(seconds=rng.randrange(365 * args.anios_pasados * 86400))
+            usuarios.append((user_id, username, f'{username}@carga.test', args.password, nombre, es_admin, True, creado))
+            if not es_admin:
+                clientes.append((primer_cliente + len(clientes), user_id, nombre,
+                                 f'5{rng.randrange(1000000, 9999999)}', f'Zona {rng.randrange(1, 22)}'))
+        copiar(cursor, 'users', ['id', 'username', 'email', 'password', 'full_name', 'is_admin', 'is_active', 'created_at'], usuarios)
+        copiar(cursor, 'clientes', ['id_cliente', 'user_id', 'nombre', 'telefono', 'direccion'], clientes)
+        print(f'{len(usuarios)} usuarios, {len(clientes)} clientes')
+
+        # Artículos
+        primer_articulo = siguiente_id(cursor, 'articulos', 'id_articulo')
+        articulos = []
+        for i in range(args.articulos):
+            nombre, tipo, precio = NOMBRES_ARTICULOS[i % len(NOMBRES_ARTICULOS)]
+            # Artículos baratos (sillas, manteles) en cantidades grandes; equipos caros en pocas unidades
+            cantidad = max(2, int(rng.lognormvariate(6.0 if precio < 100 else 2.5, 0.5)))
+            articulos.append((primer_articulo + i, f'{PREFIJO}{nombre} {i // len(NOMBRES_ARTICULOS) + 1}',
+                              tipo, cantidad, Decimal(precio) * Decimal(rng.choice(['0.9', '1.0', '1.1']))))
+        copiar(cursor, 'articulos', ['id_articulo', 'nombre_articulo', 'tipo', 'cantidad_total', 'precio_unitario'], articulos)
+        print(f'{len(articulos)} artículos')
+
+        # Eventos, detalles y pagos
+        primer_evento = siguiente_id(cursor, 'eventos', 'id_evento')
+        pesos_clientes = pesos_zipf(len(clientes))
+        pesos_articulos = pesos_zipf(len(articulos), s=0.9)
+        eventos, detalles, pagos = [], [], []
+        ids_clientes = [c[0] for c in clientes]
+        for i in range(args.eventos):
+            evento_id = primer_evento + i
+            fecha = fecha_realista(rng, inicio_fechas, dias_rango)
+            estado = elegir(rng, ESTADOS_PASADO if fecha < hoy else ESTADOS_FUTURO)
+            hora_inicio = rng.choice([10, 12, 14, 16, 18])
+            lineas = max(1, min(len(articulos), int(rng.expovariate(1 / args.lineas_por_evento)) + 1))
+            elegidos = set(rng.choices(range(len(articulos)), weights=pesos_articulos, k=lineas))
+            monto = Decimal(0)
+            for indice in elegidos:
+                articulo = articulos[indice]
+                cantidad = max(1, int(rng.lognormvariate(3.2 if articulo[4] < 100 else 0.2, 0.6)))
+                detalles.append((evento_id, articulo[0], cantidad, articulo[4]))
+                monto += articulo[4] * cantidad
+            eventos.append((evento_id, rng.choices(ids_clientes, weights=pesos_clientes, k=1)[0], fecha,
+                            f'{hora_inicio:02d}:00:00', f'{hora_inicio + rng.choice([4, 5, 6]):02d}:00:00', estado, monto))
+            if estado in ('confirmado', 'completado'):
+                pagos.append((evento_id, monto, elegir(rng, METODOS_PAGO)))
+        copiar(cursor, 'eventos', ['id_evento', 'id_cliente', 'fecha_evento', 'hora_inicio', 'hora_fin', 'estado', 'monto_total'], eventos)
+        copiar(cursor, 'detalle_evento', ['id_evento', 'id_articulo', 'cantidad', 'precio_unitario'], detalles)
+        copiar(cursor, 'pagos', ['id_evento', 'monto', 'metodo'], pagos)
+        print(f'{len(eventos)} eventos, {len(detalles)} detalles, {len(pagos)} pagos')
+
+        for tabla, columna in (('users', 'id'), ('clientes', 'id_cliente'), ('articulos', 'id_articulo'), ('eventos', 'id_evento')):
+            ajustar_secuencia(cursor, tabla, columna)
+
+        # Reservas con fecha para los eventos activos generados
+        cursor.execute("SELECT to_regclass('reservas_articulo') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            cursor.execute("""
+                INSERT INTO reservas_articulo (id_articulo, id_evento, periodo, cantidad)
+                SELECT de.id_articulo, e.id_evento, daterange(e.fecha_evento, e.fecha_evento, '[]'), SUM(de.cantidad)
+                FROM detalle_evento de
+                JOIN eventos e ON e.id_evento = de.id_evento
+                WHERE e.id_evento >= %s AND e.estado IN ('reservado', 'confirmado')
+                GROUP BY de.id_articulo, e.id_evento, e.fecha_evento
+            """, (primer_evento,))
+        cursor.execute("SELECT to_regclass('catalogo_version') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            cursor.execute("UPDATE catalogo_version SET version = version + 1 WHERE id = 1 RETURNING version")
+            cursor.execute("SELECT pg_notify('catalogo', %s)", (str(cursor.fetchone()[0]),))
+
+        conn.commit()
+        cursor.execute("ANALYZE")
+
+    print(f'Listo en {time.perf_counter() - inicio_total:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
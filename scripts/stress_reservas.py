@@ -0,0 +1,192 @@
+"""Prueba de estrés de reservas concurrentes sobre un mismo artículo.
+
+Crea un artículo con stock limitado y varios clientes temporales, y los clientes
+reservan ese artículo para la misma fecha al mismo tiempo (POST /api/eventos)
+hasta agotar los intentos. Al final comprueba en la base que lo reservado no
+supera el stock (sin sobreventa) y reporta reservas por segundo. Corriéndolo en
+el commit anterior y en el actual se comparan ambos modos de apartar stock.
+
+Necesita la aplicación en marcha y DATABASE_URL apuntando a la misma base; los
+datos temporales se borran al terminar.
+
+Uso:
+    DATABASE_URL=postgresql://... python scripts/stress_reservas.py \
+        --base-url http://127.0.0.1:5050 --clientes 32 --intentos 2000 --stock 500
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import psycopg
+
+PASSWORD = 'estres123'
+
+
+def conectar():
+    url = os.environ['DATABASE_URL'].replace('postgresql+psycopg://', 'postgresql://', 1)
+    return psycopg.connect(url)
+
+
+def crear_datos(conn, marca, clientes, stock):
+    """Artículo y clientes temporales; devuelve (id_articulo, [(username, user_id)])"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO articulos (nombre_articulo, tipo, cantidad_total, precio_unitario)
+            VALUES (%s, 'prueba', %s, 10)
+            RETURNING id_articulo
+        """, (marca, stock))
+        id_articulo = cursor.fetchone()[0]
+        usuarios = []
+        for i in range(clientes):
+            username = f'{marca}_{i}'
+            cursor.execute("""
+                INSERT INTO users (username, email, password, full_name, is_admin)
+                VALUES (%s, %s, %s, 'Prueba estrés', FALSE)
+                RETURNING id
+            """, (username, f'{username}@prueba.local', PASSWORD))
+            user_id = cursor.fetchone()[0]
+            cursor.execute("""
+                INSERT INTO clientes (user_id, nombre, telefono, direccion)
+                VALUES (%s, 'Prueba estrés', '0000-0000', 'N/A')
+            """, (user_id,))
+            usuarios.append((username, user_id))
+    conn.commit()
+    return id_articulo, usuarios
+
+
+def borrar_datos(conn, id_articulo, usuarios):
+    conn.rollback()
+    ids = [user_id for _, user_id in usuarios]
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            DELETE FROM detalle_evento WHERE id_evento IN (
+                SELECT e.id_evento FROM eventos e
+                JOIN clientes c ON c.id_cliente = e.id_cliente
+                WHERE c.user_id = ANY(%s)
+            )
+        """, (ids,))
+        cursor.execute("""
+            DELETE FROM eventos WHERE id_cliente IN (SELECT id_cliente FROM clientes WHERE user_id = ANY(%s))
+        """, (ids,))
+        cursor.execute("DELETE FROM clientes WHERE user_id = ANY(%s)", (ids,))
+        cursor.execute("DELETE FROM users WHERE id = ANY(%s)", (ids,))
+        cursor.execute("DELETE FROM reservas_articulo WHERE id_articulo = %s", (id_articulo,))
+        cursor.execute("DELETE FROM articulos WHERE id_articulo = %s", (id_articulo,))
+    conn.commit()
+
+
+def iniciar_sesion(base_url, username):
+    """Devolver un opener con la cookie de sesión del cliente"""
+    cookies = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cookies))
+    peticion = urllib.request.Request(
+        f'{base_url}/login',
+        data=json.dumps({'username': username, 'password': PASSWORD}).encode(),
+        headers={'Content-Type': 'application/json'},
+    )
+    with opener.open(peticion, timeout=30) as respuesta:
+        respuesta.read()
+    return opener
+
+
+def reservar(opener, base_url, id_articulo, fecha, cantidad):
+    """Devolver 'ok', 'sin_stock' o 'error'"""
+    cuerpo = {
+        'fecha_evento': fecha.isoformat(),
+        'hora_inicio': '10:00',
+        'hora_fin': '18:00',
+        'monto_total': 10 * cantidad,
+        # tipo 'articulo': solo esas líneas pasan por apartar_stock_evento
+        'servicios': [{'tipo': 'articulo', 'id_articulo': id_articulo, 'cantidad': cantidad, 'precio_unitario': 10}],
+    }
+    peticion = urllib.request.Request(
+        f'{base_url}/api/eventos',
+        data=json.dumps(cuerpo).encode(),
+        headers={'Content-Type': 'application/json'},
+    )
+    try:
+        with opener.open(peticion, timeout=60) as respuesta:
+            respuesta.read()
+            return 'ok'
+    except urllib.error.HTTPError as e:
+        return 'sin_stock' if e.code == 400 else 'error'
+    except Exception:
+        return 'error'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:5050')
+    parser.add_argument('--clientes', type=int, default=32, help='clientes concurrentes')
+    parser.add_argument('--intentos', type=int, default=2000, help='reservas a intentar en total')
+    parser.add_argument('--stock', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('Defina DATABASE_URL con la base que usa la aplicación')
+
+    random.seed(args.seed)
+    marca = f'estres_{uuid.uuid4().hex[:8]}'
+    fecha = date.today() + timedelta(days=random.randint(300, 600))
+    cantidades = [random.randint(1, 3) for _ in range(args.intentos)]
+
+    conn = conectar()
+    id_articulo, usuarios = crear_datos(conn, marca, args.clientes, args.stock)
+    try:
+        openers = [iniciar_sesion(args.base_url, username) for username, _ in usuarios]
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clientes) as executor:
+            resultados = list(executor.map(
+                lambda i: reservar(openers[i % len(openers)], args.base_url, id_articulo, fecha, cantidades[i]),
+                range(args.intentos),
+            ))
+        duracion = time.perf_counter() - inicio
+
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT COALESCE(SUM(de.cantidad), 0)
+                FROM detalle_evento de
+                JOIN eventos e ON e.id_evento = de.id_evento
+                WHERE de.id_articulo = %s AND e.fecha_evento = %s
+            """, (id_articulo, fecha))
+            reservado = cursor.fetchone()[0]
+            cursor.execute("""
+                SELECT COUNT(*), COALESCE(SUM(cantidad), 0)
+                FROM reservas_articulo
+                WHERE id_articulo = %s
+            """, (id_articulo,))
+            reservas, apartado = cursor.fetchone()
+    finally:
+        borrar_datos(conn, id_articulo, usuarios)
+        conn.close()
+
+    ok = resultados.count('ok')
+    print(f'intentos {args.intentos}, reservas {ok}, sin stock {resultados.count("sin_stock")}, '
+          f'errores {resultados.count("error")}')
+    print(f'{ok / duracion:.1f} reservas/s, {args.intentos / duracion:.1f} intentos/s en {duracion:.1f} s')
+    print(f'reservado {reservado} de {args.stock} unidades, {reservas} filas en reservas_articulo ({apartado} unidades)')
+    if ok and not reservas:
+        print('FALLA: las reservas no pasaron por reservas_articulo; la prueba no ejercitó el apartado de stock')
+        return 1
+    if apartado != reservado:
+        print('FALLA: reservas_articulo no coincide con detalle_evento')
+        return 1
+    if reservado > args.stock:
+        print('FALLA: sobreventa')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())